@@ -1,220 +1,67 @@
-
-from flask import Flask, make_response, request
-from flask_migrate import Migrate
-from flask_restful import Api, Resource
-from flask_cors import CORS
-from flask_jwt_extended import JWTManager, jwt_required, get_jwt, get_jwt_identity, create_access_token, create_refresh_token
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
-from flask_bcrypt import Bcrypt
-from models import db, TokenBlocklist, User, Post
-from blueprints.comments import comments_bp
-from blueprints.profile import profile_bp
-from blueprints.posts import posts_bp
+import click
+from flask import Flask, make_response
+from extensions import migrate, cors, jwt, limiter
+from models import db
+from blueprints import register_blueprints
 from config import Config
-import validators
-from datetime import datetime
-
-# Create the app
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Initialize extensions
-db.init_app(app)
-migrate = Migrate(app, db)
-api = Api(app, prefix='/api')  # Add /api prefix to all resources
-CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173"}})
-jwt = JWTManager(app)
-bcrypt = Bcrypt(app)
-limiter = Limiter(get_remote_address, app=app, default_limits=["200 per day", "50 per hour"])  # Fixed Limiter initialization
-
-# Register blueprints
-app.register_blueprint(comments_bp, url_prefix='/api')
-app.register_blueprint(profile_bp, url_prefix='/api')
-app.register_blueprint(posts_bp, url_prefix='/api')
-
-# Resource classes
-class RegisterUser(Resource):
-    @limiter.limit("5 per minute")
-    def post(self):
-        data = request.get_json()
-        username = data.get('username')
-        email = data.get('email')
-        password = data.get('password')
-        
-        if not all([username, email, password]):
-            return make_response({'error': 'Username, email, and password are required'}, 400)
-        
-        if not validators.email(email):
-            return make_response({'error': 'Invalid email format'}, 400)
-        
-        if len(password) < 8:
-            return make_response({'error': 'Password must be at least 8 characters long'}, 400)
-        
-        if User.query.filter_by(username=username).first():  # Simplified to use query
-            return make_response({'error': 'Username already in use'}, 400)
-        
-        if User.query.filter_by(email=email).first():
-            return make_response({'error': 'Email already in use'}, 400)
-        
-        new_user = User(username=username, email=email)
-        new_user.set_password(password)
-        db.session.add(new_user)
-        db.session.commit()
-        
-        access_token = create_access_token(identity=new_user.id)
-        refresh_token = create_refresh_token(identity=new_user.id)
-        
-        return make_response({
-            'message': 'User created successfully',
-            'token': {
-                'access': access_token,
-                'refresh': refresh_token
-            }
-        }, 201)
-
-class LoginUser(Resource):
-    @limiter.limit("5 per minute")
-    def post(self):
-        data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
-        
-        if not all([username, password]):
-            return make_response({'error': 'Username and password are required'}, 400)
-        
-        user = User.query.filter_by(username=username).first()
-        if not user or not user.check_password(password):
-            return make_response({'error': 'Invalid username or password'}, 403)
-        
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
-        
-        return make_response({
-            'message': 'Login successful',
-            'token': {
-                'access': access_token,
-                'refresh': refresh_token
-            }
-        }, 200)
-
-class LogoutUser(Resource):
-    @jwt_required(verify_type=False)
-    @limiter.limit("5 per minute")
-    def post(self):
-        jwt = get_jwt()
-        jti = jwt['jti']
-        token_type = jwt['type']
-        
-        new_jti_obj = TokenBlocklist(jti=jti, created_at=datetime.utcnow())
-        db.session.add(new_jti_obj)
-        db.session.commit()
-        
-        return make_response({"message": f"{token_type} token revoked successfully"}, 200)
-
-class RefreshToken(Resource):
-    @jwt_required(refresh=True)
-    @limiter.limit("5 per minute")
-    def post(self):
-        identity = get_jwt_identity()
-        new_access_token = create_access_token(identity=identity)
-        
-        return make_response({'access_token': new_access_token}, 200)
-
-class PostEndpoint(Resource):
-    @jwt_required()
-    @limiter.limit("10 per minute")
-    def get(self):
-        user_id = get_jwt_identity()
-        posts = [post.to_dict() for post in Post.query.filter_by(user_id=user_id).all()]
-        return make_response(posts, 200)
-    
-    @jwt_required()
-    @limiter.limit("10 per minute")
-    def post(self):
-        data = request.get_json()
-        title = data.get('title')
-        content = data.get('content')
-        
-        if not all([title, content]):
-            return make_response({'error': 'Title and content are required'}, 400)
-        
-        new_post = Post(
-            title=title,
-            content=content,
-            user_id=get_jwt_identity(),
-            created_at=datetime.utcnow()
-        )
-        db.session.add(new_post)
-        db.session.commit()
-        
-        return make_response(new_post.to_dict(), 201)
-
-class PostEndpointById(Resource):
-    @jwt_required()
-    @limiter.limit("10 per minute")
-    def get(self, id):
-        post = Post.query.filter_by(id=id, user_id=get_jwt_identity()).first()
-        if not post:
-            return make_response({'error': 'Post not found or unauthorized'}, 404)
-        return make_response(post.to_dict(), 200)
-    
-    @jwt_required()
-    @limiter.limit("10 per minute")
-    def put(self, id):
-        post = Post.query.filter_by(id=id, user_id=get_jwt_identity()).first()
-        if not post:
-            return make_response({'error': 'Post not found or unauthorized'}, 404)
-        
-        data = request.get_json()
-        title = data.get('title')
-        content = data.get('content')
-        
-        if not all([title, content]):
-            return make_response({'error': 'Title and content are required'}, 400)
-        
-        post.title = title
-        post.content = content
-        post.created_at = datetime.utcnow()  # Update timestamp
-        db.session.commit()
-        
-        return make_response(post.to_dict(), 200)
-    
-    @jwt_required()
-    @limiter.limit("10 per minute")
-    def delete(self, id):
-        post = Post.query.filter_by(id=id, user_id=get_jwt_identity()).first()
-        if not post:
-            return make_response({'error': 'Post not found or unauthorized'}, 404)
-        
-        db.session.delete(post)
-        db.session.commit()
-        
-        return make_response({'message': 'Deleted successfully'}, 200)
-
-# Register API resources
-api.add_resource(PostEndpoint, '/posts')
-api.add_resource(PostEndpointById, '/posts/<int:id>')
-api.add_resource(RegisterUser, '/register')
-api.add_resource(LoginUser, '/login')
-api.add_resource(LogoutUser, '/logout')
-api.add_resource(RefreshToken, '/refresh')
+from blocklist import blocklist
+from hashing import password_hasher
+from cache import response_cache
+from compression import response_compression
+from database import configure_engines, attach_pragmas
+from metrics import metrics
+from counters import reconcile_command
+from jobs import job_queue, jobs_cli
+from json_provider import json_provider
+import ratelimit_storage  # registers the sqlite:// rate-limit storage scheme
+
+def create_app(config=Config):
+    """Build and configure an app instance.
+
+    Nothing here connects to the database; create the schema with
+    ``flask db upgrade`` (or ``flask init-db`` for a throwaway database).
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.json = json_provider(app)
+
+    # Initialize extensions
+    configure_engines(app)
+    db.init_app(app)
+    attach_pragmas(app, db)
+    migrate.init_app(app, db)
+    cors.init_app(app, resources={r"/api/*": {"origins": "http://localhost:5173"}}, expose_headers=["X-Next-Cursor", "X-Next-Page"])
+    jwt.init_app(app)
+    limiter.init_app(app)
+    blocklist.init_app(app)
+    password_hasher.init_app(app)
+    response_cache.init_app(app)
+    response_compression.init_app(app)
+    metrics.init_app(app, db)
+    job_queue.init_app(app)
+
+    register_blueprints(app, url_prefix='/api')
+    register_error_handlers(app)
+    app.cli.command('init-db')(init_db)
+    app.cli.add_command(reconcile_command)
+    app.cli.add_command(jobs_cli)
+    return app
 
 # Error handlers
-@app.errorhandler(404)
 def not_found(e):
     return make_response({"error": "Resource not found"}, 404)
 
-@app.errorhandler(405)
 def method_not_allowed(e):
     return make_response({"error": "Method not allowed"}, 405)
 
+def register_error_handlers(app):
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(405, method_not_allowed)
+
 # JWT blocklist loader
 @jwt.token_in_blocklist_loader
 def token_in_blocklist(jwt_header, jwt_data):
-    jti = jwt_data['jti']
-    token = db.session.query(TokenBlocklist).filter(TokenBlocklist.jti == jti).scalar()
-    return token is not None
+    return blocklist.is_revoked(jwt_data['jti'], jwt_data['sub'], jwt_data.get('gen'))
 
 # JWT error handlers
 @jwt.expired_token_loader
@@ -229,9 +76,11 @@ def jwt_invalid_token(error):
 def jwt_missing_token(error):
     return make_response({'error': 'Missing token'}, 401)
 
-# Create database tables
-with app.app_context():
+def init_db():
+    """Create any missing tables directly from the models."""
     db.create_all()
+    click.echo("Database tables created.")
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    create_app().run(debug=True, port=5000)
+
@@ -0,0 +1,345 @@
+"""ASGI entry point: async read endpoints, everything else through the WSGI app.
+
+    uvicorn --factory asgi:create_asgi_app --workers 4
+
+GET (and HEAD) on /api/posts, /api/comments/<post_id>, /api/profile and
+/api/search run as coroutines on an async SQLAlchemy engine (aiosqlite or
+asyncpg), so a connection waiting on the database costs no thread. Every
+other request is handed to the Flask app on a pool of ASGI_WSGI_THREADS
+threads, where slow work such as password hashing or a write waiting for
+the SQLite lock only ties up that pool. Both paths share the models, query
+builders, JWT checks, rate limits, error handlers, response cache and
+metrics, so the /api contract is the same as under a WSGI server. The
+synchronous parts of an async request (rate limit and JWT blocklist checks,
+a SQLite response cache) run on the event loop's default executor.
+"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from flask import Response, current_app, make_response, request, request_finished, request_started
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.exceptions import HTTPException, NotFound
+
+from app import create_app
+from blueprints.comments import (thread_args, thread_page, thread_page_limit, thread_response, thread_statement,
+                                 thread_version_of, thread_version_query, whole_thread_requested)
+from blueprints.posts import search_response
+from blueprints.profile import profile_from_claims, profile_version_of, profile_version_query
+from cache import response_cache, thread_key
+from conditional import precondition, tag
+from config import Config
+from database import REPLICA_BIND, READ_METHODS, pool_options, set_sqlite_pragmas
+from metrics import metrics
+from models import db, Comment, Post, User
+from pagination import NDJSON_MIMETYPE, InvalidCursor, after_cursor, decode_cursor, page_limit, page_response, wants_ndjson
+from search import result_row, search_statement, terms
+from serializers import POST_SUMMARY_COLUMNS, row_to_dict, select_thread
+from threads import count_replies, parent_query, reply_counts_query, with_reply_counts
+
+try:
+    import greenlet
+except ImportError:  # optional; needed only by the async engine
+    greenlet = None
+
+DEFAULTS = {
+    # Threads that run the synchronous (WSGI) endpoints in each process
+    'ASGI_WSGI_THREADS': 16,
+}
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+class StreamingResponse(Response):
+    """Headers now, body from the async iterator in ``chunks``."""
+
+    def __init__(self, chunks, **kwargs):
+        super().__init__(**kwargs)
+        self.chunks = chunks
+
+
+async def list_posts(session):
+    token = request.args.get('cursor')
+    try:
+        cursor = decode_cursor(token) if token else None
+    except InvalidCursor as e:
+        return make_response({'error': str(e)}, 400)
+
+    stmt = after_cursor(select(*POST_SUMMARY_COLUMNS).where(Post.user_id == get_jwt_identity()), Post, cursor)
+    if wants_ndjson():
+        if 'limit' in request.args:
+            stmt = stmt.limit(page_limit())
+        return StreamingResponse(ndjson_chunks(session, stmt, row_to_dict), mimetype=NDJSON_MIMETYPE)
+
+    limit = page_limit()
+    rows = (await session.execute(stmt.limit(limit + 1))).all()
+    return page_response(rows, limit, row_to_dict)
+
+
+async def ndjson_chunks(session, stmt, serialize):
+    dumps = current_app.json.dumps
+    result = await session.stream(stmt.execution_options(yield_per=current_app.config['STREAM_BATCH_SIZE']))
+    async for rows in result.partitions():
+        yield ''.join(dumps(serialize(row)) + '\n' for row in rows).encode()
+
+
+async def comment_thread(session, post_id):
+    current = thread_version_of(post_id, (await session.execute(thread_version_query(post_id))).first())
+    if current is None:
+        raise NotFound()
+    etag, last_modified, matched = precondition(current)
+    if matched:
+        return tag(make_response('', 304), etag, last_modified)
+
+    if not whole_thread_requested():
+        response = await partial_thread(session, post_id)
+        return tag(response, etag, last_modified) if response.status_code == 200 else response
+
+    async def load():
+        rows = [row._asdict() for row in await session.execute(select_thread(post_id))]
+        return with_reply_counts(rows, count_replies(rows))
+
+    thread = await response_cache.fetch_async(thread_key(post_id, current[0]), load)
+    return tag(make_response(thread, 200), etag, last_modified)
+
+
+async def partial_thread(session, post_id):
+    args, error = thread_args()
+    if error:
+        return error
+    parent_id, levels, after = args
+    parent = None
+    if parent_id is not None:
+        parent = (await session.execute(parent_query(post_id, parent_id))).first()
+        if parent is None:
+            return make_response({'error': 'Comment not found'}, 404)
+    stmt = thread_statement(post_id, parent, levels, after)
+
+    if wants_ndjson():
+        if 'limit' in request.args:
+            stmt = stmt.limit(page_limit())
+        return StreamingResponse(ndjson_chunks(session, stmt, row_to_dict), mimetype=NDJSON_MIMETYPE)
+
+    limit = thread_page_limit(after)
+    rows = (await session.execute(stmt.add_columns(Comment.path).limit(limit + 1 if limit else None))).all()
+    comments, next_cursor = thread_page(rows, limit)
+    if levels is None and limit is None:
+        counts = count_replies(comments)
+    else:
+        ids = [comment['id'] for comment in comments]
+        counts = dict((await session.execute(reply_counts_query(ids))).all()) if ids else {}
+    return thread_response(comments, counts, next_cursor)
+
+
+async def profile(session):
+    user_id = get_jwt_identity()
+    row = (await session.execute(profile_version_query(user_id))).first()
+    current = profile_version_of(row)
+    if current is None:
+        raise NotFound()
+    etag, last_modified, matched = precondition(current)
+    if matched:
+        return tag(make_response('', 304), etag, last_modified)
+    profile = profile_from_claims(get_jwt(), row)
+    if profile is None:
+        user = await session.get(User, user_id)
+        if user is None:
+            raise NotFound()
+        profile = user.to_dict()
+    return tag(make_response(profile, 200), etag, last_modified)
+
+
+async def search(session):
+    query = request.args.get('q', '')
+    limit = page_limit()
+    page = max(request.args.get('page', 1, type=int), 1)
+    stmt = search_statement(get_jwt_identity(), query, limit + 1, (page - 1) * limit, session.bind.dialect.name)
+    words = terms(query)
+    results = [result_row(row, words) for row in await session.execute(stmt)]
+    return search_response(results, limit, page)
+
+
+# Flask endpoint -> coroutine serving its GET
+ASYNC_VIEWS = {
+    'posts.postendpoint': list_posts,
+    'comments.commentendpoint': comment_thread,
+    'profile.profileendpoint': profile,
+    'posts.searchposts': search,
+}
+
+
+def async_engine(app):
+    """An async engine on the replica if there is one (these views only read), else the primary."""
+    with app.app_context():
+        sync_engine = db.engines.get(REPLICA_BIND) or db.engine
+    url = sync_engine.url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'No async driver for {backend} databases')
+    if backend == 'sqlite' and url.database in (None, '', ':memory:'):
+        raise RuntimeError('The async engine needs a file database; an in-memory one is private to its connection')
+
+    options = {} if backend == 'sqlite' else pool_options(app.config)
+    engine = create_async_engine(url.set(drivername=ASYNC_DRIVERS[backend]), **options)
+    if backend == 'sqlite' and app.config['SQLITE_PRAGMAS']:
+        event.listen(engine.sync_engine, 'connect', set_sqlite_pragmas(app.config['SQLITE_PRAGMAS']))
+    if app.config['METRICS_ENABLED']:
+        metrics.watch(engine.sync_engine)
+    return engine
+
+
+def build_environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'SERVER_NAME': scope['server'][0] if scope.get('server') else 'localhost',
+        'SERVER_PORT': str(scope['server'][1]) if scope.get('server') else '80',
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # The body is fully buffered, so it can be read without a Content-Length
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class AsyncApp:
+    """The ASGI application; ``app`` is the Flask app it shares everything with.
+
+    ``views`` maps endpoints to the coroutines that serve their GETs; pass
+    ``{}`` to run every request on the thread pool.
+    """
+
+    def __init__(self, app, views=ASYNC_VIEWS):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        if greenlet is None:
+            raise RuntimeError('The ASGI mode needs the greenlet package and an async driver (aiosqlite or asyncpg)')
+        self.app = app
+        self.views = views
+        self.engine = async_engine(app)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.executor = ThreadPoolExecutor(app.config['ASGI_WSGI_THREADS'], thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        body = await self.read_body(receive)
+        environ = build_environ(scope, body)
+        view, kwargs = None, {}
+        if scope['method'] in READ_METHODS:
+            try:
+                endpoint, kwargs = self.app.url_map.bind_to_environ(environ).match()
+                view = self.views.get(endpoint)
+            except HTTPException:
+                pass
+        if view is None:
+            return await self.call_wsgi(environ, send)
+        await self.call_async(view, kwargs, environ, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return BytesIO(b''.join(chunks))
+
+    async def call_async(self, view, kwargs, environ, send):
+        app = self.app
+        with app.request_context(environ):
+            request_started.send(app)
+            async with self.sessions() as session:
+                try:
+                    # Rate limits and the JWT blocklist can query the database
+                    response = await asyncio.to_thread(self.authorize)
+                    if response is None:
+                        response = await view(session, **kwargs)
+                except Exception as e:
+                    try:
+                        response = app.handle_user_exception(e)
+                    except Exception as e:
+                        response = app.handle_exception(e)
+                response = app.process_response(app.make_response(response))
+                request_finished.send(app, response=response)
+                await send({'type': 'http.response.start', 'status': response.status_code,
+                            'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                                        for name, value in response.headers.items()]})
+                if request.method == 'HEAD':
+                    await send({'type': 'http.response.body', 'body': b''})
+                elif isinstance(response, StreamingResponse):
+                    async for chunk in response.chunks:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    await send({'type': 'http.response.body', 'body': b''})
+                else:
+                    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    def authorize(self):
+        """The before_request handlers and JWT check; a response ends the request there."""
+        response = self.app.preprocess_request()
+        if response is None:
+            verify_jwt_in_request()
+        return response
+
+    async def call_wsgi(self, environ, send):
+        loop = asyncio.get_running_loop()
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            emit({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                  'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]})
+
+        def run():
+            # One pool thread runs the request and its whole body, so streamed
+            # responses stay streamed and keep their context on one thread
+            iterable = self.app.wsgi_app(environ, start_response)
+            try:
+                for chunk in iterable:
+                    if chunk:
+                        emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                emit({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+
+        await loop.run_in_executor(self.executor, run)
+
+
+def create_asgi_app(config=Config):
+    return AsyncApp(create_app(config))
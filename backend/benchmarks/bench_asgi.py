@@ -0,0 +1,153 @@
+"""Concurrent-connection capacity of the ASGI mode, async read views vs all on threads.
+
+Serves the app with uvicorn in a subprocess, once with every request on the
+ASGI_WSGI_THREADS pool (the sync mode, as under a threaded WSGI server) and
+once with the async read views. For each --connections level, that many
+keep-alive clients read comment threads and post lists while --logins
+clients hash passwords, and the read throughput, p50/p99 latency and
+failed requests are printed.
+
+    python -m benchmarks.bench_asgi --connections 16 64 256 --logins 8 --threads 8 --seconds 10
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from app import create_app
+from benchmarks.datagen import PASSWORD, generate
+from config import Config
+from models import db
+
+PORT = 8765
+
+
+class BenchConfig(Config):
+    RATELIMIT_ENABLED = False
+    JOBS_WORKER_THREADS = 0
+    SLOW_REQUEST_SECONDS = None
+
+
+def serve(mode, database, threads, port):
+    import uvicorn
+    from asgi import AsyncApp
+
+    config = type('Config', (BenchConfig,), {'SQLALCHEMY_DATABASE_URI': database, 'ASGI_WSGI_THREADS': threads})
+    app = create_app(config)
+    uvicorn.run(AsyncApp(app, views={}) if mode == 'sync' else AsyncApp(app),
+                port=port, log_level='error', backlog=4096, limit_concurrency=None)
+
+
+def request(conn, method, path, body=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/_metrics')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+
+def load(port, connections, logins, seconds, users, posts):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    _, body = request(conn, 'POST', '/api/login', {'username': 'user0', 'password': PASSWORD})
+    token = json.loads(body)['token']['access']
+    latencies, failures = [], []
+    deadline = time.monotonic() + seconds
+
+    def reader(index):
+        rng = random.Random(index)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.monotonic() < deadline:
+            path = f'/api/comments/{rng.randint(*posts)}' if rng.random() < 0.7 else '/api/posts'
+            started = time.perf_counter()
+            try:
+                status, _ = request(conn, 'GET', path, token=token)
+            except OSError:
+                failures.append(1)
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                failures.append(status)
+
+    def login(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.monotonic() < deadline:
+            try:
+                request(conn, 'POST', '/api/login', {'username': f'user{index % users}', 'password': PASSWORD})
+            except OSError:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(connections)]
+    threads += [threading.Thread(target=login, args=(i,)) for i in range(logins)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    pick = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float('nan')
+    return len(latencies) / seconds, pick(0.5), pick(0.99), len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--logins', type=int, default=8, help='concurrent clients logging in throughout')
+    parser.add_argument('--threads', type=int, default=8, help='ASGI_WSGI_THREADS')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.database, args.threads, PORT)
+
+    database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(type('Config', (BenchConfig,), {'SQLALCHEMY_DATABASE_URI': database}))
+    with app.app_context():
+        db.create_all()
+        user_ids, post_ids = generate(200, 2000, 10000, log=lambda line: None)
+    posts = (post_ids[0], post_ids[-1])
+
+    print(f"{'mode':<6} {'conns':>6} {'reads/s':>9} {'p50 ms':>8} {'p99 ms':>9} {'failed':>7}")
+    for mode in ('sync', 'async'):
+        server = subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_asgi', '--serve', mode,
+                                   '--database', database, '--threads', str(args.threads)],
+                                  start_new_session=True)
+        try:
+            wait_for(PORT)
+            for connections in args.connections:
+                rate, p50, p99, failed = load(PORT, connections, args.logins, args.seconds, len(user_ids), posts)
+                print(f'{mode:<6} {connections:>6} {rate:>9.1f} {p50:>8.1f} {p99:>9.1f} {failed:>7}')
+        finally:
+            server.terminate()
+            server.wait()
+            # The password hashing pool inherits the listening socket (and
+            # uvicorn's SIGTERM handler), so the rest of the group goes too
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(server.pid, signal.SIGKILL)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Post body storage and list payloads: plain vs compressed bodies, full bodies vs excerpts.
+
+Loads posts with a long-tailed body size (mostly a few hundred bytes, one
+in ten several kilobytes) into a file database, once with bodies stored
+plain (POST_COMPRESSION=none) and once compressed, and prints the database
+size, then for a page of GET /api/posts the bytes on the wire and latency
+with full bodies (as the endpoint used to return) and with excerpts, each
+without and with gzip, and the latency of GET /api/posts/<id> on the
+largest post with the response cache off.
+
+    python -m benchmarks.bench_content --posts 5000 --limit 100 --requests 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from sqlalchemy import text
+
+from app import create_app
+from benchmarks.datagen import sentence
+from bulk import insert_posts
+from config import Config
+from extensions import limiter
+from models import db, Post
+from pagination import keyset_response
+from serializers import POST_COLUMNS, row_to_dict
+
+
+class BenchConfig(Config):
+    RATELIMIT_ENABLED = False
+    RESPONSE_CACHE_URI = 'null://'
+    SLOW_REQUEST_SECONDS = None
+    JOBS_WORKER_THREADS = 0
+
+
+def body(rng):
+    sentences = rng.randint(40, 400) if rng.random() < 0.1 else rng.randint(2, 12)
+    return ' '.join(sentence(rng, rng.randint(6, 16)) for _ in range(sentences))
+
+
+def build_app(compression, posts, seed=0):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    config = type('Config', (BenchConfig,), {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+                                             'POST_COMPRESSION': compression})
+    app = create_app(config)
+
+    @app.route('/_bench/posts_full')
+    @limiter.exempt
+    @jwt_required()
+    def posts_full():
+        return keyset_response(db.session.query(*POST_COLUMNS).filter(Post.user_id == get_jwt_identity()),
+                               Post, row_to_dict)
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    token = client.post('/api/register', json={
+        'username': 'bench', 'email': 'bench@example.com', 'password': 'Password123'
+    }).json['token']['access']
+    rng = random.Random(seed)
+    with app.app_context():
+        for start in range(0, posts, 1000):
+            insert_posts([{'title': f'Post {i}', 'content': body(rng), 'user_id': 1}
+                          for i in range(start, min(posts, start + 1000))])
+            db.session.commit()
+        largest = db.session.query(Post.id).order_by(Post.content_length.desc()).limit(1).scalar()
+        db.session.execute(text('VACUUM'))
+    return app, client, {'Authorization': f'Bearer {token}'}, path, largest
+
+
+def timed(client, path, headers, requests):
+    response = client.get(path, headers=headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, headers=headers)
+    return len(response.data), (time.perf_counter() - started) / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'storage':<8} {'db MB':>7} {'page':<9} {'identity':>20} {'gzip':>20} {'GET largest':>12}")
+    for compression in ('none', 'auto'):
+        app, client, headers, path, largest = build_app(compression, args.posts)
+        size = os.path.getsize(path) / 2 ** 20
+        ms_one = timed(client, f'/api/posts/{largest}', headers, args.requests)[1]
+        for name, url in (('full', '/_bench/posts_full'), ('excerpts', '/api/posts')):
+            url = f'{url}?limit={args.limit}'
+            cells = []
+            for encoding in ('identity', 'gzip'):
+                size_bytes, ms = timed(client, url, {**headers, 'Accept-Encoding': encoding}, args.requests)
+                cells.append(f'{size_bytes / 1024:8.1f}KB {ms:7.2f}ms')
+            print(f'{compression:<8} {size:>7.1f} {name:<9} {cells[0]:>20} {cells[1]:>20} {ms_one:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Time to delete a post with many comments, and an account with many posts.
+
+Loads the rows with the bulk helpers on a throwaway SQLite file, then
+times DELETE /api/posts/<id> and DELETE /api/profile and counts the SQL
+statements each one runs.
+
+    python -m benchmarks.bench_delete --comments 10000 --posts 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from app import create_app
+from bulk import insert_comments, insert_posts
+from config import Config
+from models import db
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    RATELIMIT_ENABLED = False
+    SLOW_REQUEST_SECONDS = 0
+
+
+def timed(app, client, path, headers):
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    started = time.perf_counter()
+    response = client.delete(path, headers=headers)
+    elapsed = time.perf_counter() - started
+    event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200, response.json
+    return elapsed * 1000, len(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=10000)
+    parser.add_argument('--posts', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    token = client.post('/api/register', json={
+        'username': 'bench', 'email': 'bench@example.com', 'password': 'Password123'
+    }).json['token']['access']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    with app.app_context():
+        post_ids = insert_posts([{'title': f'Post {i}', 'content': 'x' * 200, 'user_id': 1}
+                                 for i in range(args.posts)])
+        insert_comments([{'content': 'Nice', 'post_id': post_ids[0], 'user_id': 1}
+                         for _ in range(args.comments)])
+        insert_comments([{'content': 'Nice', 'post_id': post_id, 'user_id': 1}
+                         for post_id in post_ids[1:] for _ in range(5)])
+        db.session.commit()
+
+    ms, statements = timed(app, client, f'/api/posts/{post_ids[0]}', headers)
+    print(f'delete post with {args.comments} comments: {ms:8.1f} ms, {statements} statements')
+    ms, statements = timed(app, client, '/api/profile', headers)
+    print(f'delete account with {args.posts - 1} posts:   {ms:8.1f} ms, {statements} statements')
+
+
+if __name__ == '__main__':
+    main()
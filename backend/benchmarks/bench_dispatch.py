@@ -0,0 +1,143 @@
+"""Per-request dispatch cost of every read endpoint and of the decorator stack.
+
+Besides the real API routes, four synthetic routes return the same tiny body
+through progressively more layers (plain Flask view, flask-restful Resource,
++ jwt_required, + limiter) so the cost of each layer can be read off
+directly. Results can be saved as a baseline and later checked against it.
+
+    python -m benchmarks.bench_dispatch --requests 2000 --save dispatch.json
+    python -m benchmarks.bench_dispatch --check dispatch.json --tolerance 0.25
+"""
+import argparse
+import json
+import sys
+import time
+
+from flask import make_response
+from flask_jwt_extended import jwt_required
+from flask_restful import Api, Resource
+
+from app import create_app
+from config import Config
+from extensions import limiter
+from models import db
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATELIMIT_DEFAULT = '1000000 per minute'
+
+
+# Only LimitedPing pays for the limiter; the other layers are exempt from
+# the default limits so each step adds exactly one thing.
+class RestfulPing(Resource):
+    @limiter.exempt
+    def get(self):
+        return make_response({'ok': True}, 200)
+
+
+class JWTPing(Resource):
+    @limiter.exempt
+    @jwt_required()
+    def get(self):
+        return make_response({'ok': True}, 200)
+
+
+class LimitedPing(Resource):
+    @jwt_required()
+    @limiter.limit('1000000 per minute')
+    def get(self):
+        return make_response({'ok': True}, 200)
+
+
+def build_app():
+    app = create_app(BenchConfig)
+
+    @app.route('/_bench/flask')
+    @limiter.exempt
+    def flask_ping():
+        return make_response({'ok': True}, 200)
+
+    api = Api(app, prefix='/_bench')
+    api.add_resource(RestfulPing, '/restful')
+    api.add_resource(JWTPing, '/jwt')
+    api.add_resource(LimitedPing, '/limiter')
+    return app
+
+
+def seed(client):
+    token = client.post('/api/register', json={
+        'username': 'bench', 'email': 'bench@example.com', 'password': 'Password123'
+    }).json['token']['access']
+    headers = {'Authorization': f'Bearer {token}'}
+    post_id = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=headers).json['id']
+    client.post(f'/api/comments/{post_id}', json={'content': 'Nice'}, headers=headers)
+    return headers, post_id
+
+
+def time_endpoint(client, path, headers, requests):
+    for _ in range(50):
+        client.get(path, headers=headers)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, (path, response.status_code)
+    samples.sort()
+    return {
+        'mean_us': sum(samples) / len(samples) * 1e6,
+        'p99_us': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--check', help='compare against a saved JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown of the mean before --check fails')
+    args = parser.parse_args()
+
+    app = build_app()
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    headers, post_id = seed(client)
+
+    endpoints = {
+        'flask view': '/_bench/flask',
+        '+ restful': '/_bench/restful',
+        '+ jwt_required': '/_bench/jwt',
+        '+ limiter': '/_bench/limiter',
+        'GET /api/posts': '/api/posts',
+        'GET /api/posts/<id>': f'/api/posts/{post_id}',
+        'GET /api/comments/<id>': f'/api/comments/{post_id}',
+        'GET /api/profile': '/api/profile',
+        'GET /api/search': '/api/search?q=hello',
+    }
+    results = {}
+    for label, path in endpoints.items():
+        results[label] = time_endpoint(client, path, headers, args.requests)
+        print(f"{label:<24} mean {results[label]['mean_us']:8.1f} us   p99 {results[label]['p99_us']:8.1f} us")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+        regressions = [
+            f"{label}: {results[label]['mean_us']:.1f} us vs {base['mean_us']:.1f} us"
+            for label, base in baseline.items()
+            if label in results and results[label]['mean_us'] > base['mean_us'] * (1 + args.tolerance)
+        ]
+        for line in regressions:
+            print('REGRESSION ' + line)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""GET /api/feed latency as the number of authors and posts grows.
+
+For each size, loads users and posts into an in-memory database and times
+the first page (cached head vs RESPONSE_CACHE_URI=null://) and a page deep
+in the feed reached through its cursor.
+
+    python -m benchmarks.bench_feed --sizes 1000 10000 100000 --users 100 --requests 200
+"""
+import argparse
+import time
+
+from app import create_app
+from bulk import insert_posts, insert_users
+from config import Config
+from models import db
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATELIMIT_ENABLED = False
+
+
+def build_app(cache_uri, users, posts):
+    config = type('Config', (BenchConfig,), {'RESPONSE_CACHE_URI': cache_uri})
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    token = client.post('/api/register', json={
+        'username': 'bench', 'email': 'bench@example.com', 'password': 'Password123'
+    }).json['token']['access']
+    with app.app_context():
+        ids = insert_users([{'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x'}
+                            for i in range(users)])
+        insert_posts([{'title': f'Post {i}', 'content': 'Lorem ipsum dolor sit amet.', 'user_id': ids[i % users]}
+                      for i in range(posts)])
+        db.session.commit()
+    return client, {'Authorization': f'Bearer {token}'}
+
+
+def latency(client, path, headers, requests):
+    for _ in range(10):
+        client.get(path, headers=headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return (time.perf_counter() - started) / requests * 1000
+
+
+def deep_cursor(client, headers, pages):
+    cursor = None
+    for _ in range(pages):
+        response = client.get('/api/feed' + (f'?cursor={cursor}' if cursor else ''), headers=headers)
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            break
+    return cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'posts':>8} {'cached':>10} {'uncached':>10} {'page 25':>10}")
+    for size in args.sizes:
+        client, headers = build_app('memory://', args.users, size)
+        cached = latency(client, '/api/feed', headers, args.requests)
+        cursor = deep_cursor(client, headers, 25)
+        deep = latency(client, f'/api/feed?cursor={cursor}', headers, args.requests) if cursor else float('nan')
+        client, headers = build_app('null://', args.users, size)
+        uncached = latency(client, '/api/feed', headers, args.requests)
+        print(f'{size:>8} {cached:8.2f}ms {uncached:8.2f}ms {deep:8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Query plans and latency of the hot filters with and without the indexes.
+
+Seeds a throwaway SQLite database, runs each query first against bare
+tables and then after creating the indexes declared in models.py, and
+prints the plan and mean latency for both.
+
+    python -m benchmarks.bench_indexes --posts 200000 --comments 500000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from models import db
+
+QUERIES = {
+    'posts by user': (
+        'SELECT id, title, created_at FROM post WHERE user_id = :user_id '
+        'ORDER BY created_at DESC, id DESC LIMIT 20'
+    ),
+    'comments by post': (
+        'SELECT id, content, created_at FROM comment WHERE post_id = :post_id '
+        'ORDER BY created_at, id'
+    ),
+    'comments by user': 'SELECT count(*) FROM comment WHERE user_id = :user_id',
+}
+
+
+def seed(conn, users, posts, comments):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    conn.execute(text(
+        'INSERT INTO user (id, username, email, password_hash, created_at) '
+        'VALUES (:id, :username, :email, :password_hash, :created_at)'
+    ), [{'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com',
+         'password_hash': 'x', 'created_at': start} for i in range(1, users + 1)])
+    conn.execute(text(
+        'INSERT INTO post (id, title, content, created_at, user_id) '
+        'VALUES (:id, :title, :content, :created_at, :user_id)'
+    ), [{'id': i, 'title': f'Post {i}', 'content': 'lorem ipsum ' * 20,
+         'created_at': start + timedelta(seconds=i), 'user_id': rng.randint(1, users)}
+        for i in range(1, posts + 1)])
+    conn.execute(text(
+        'INSERT INTO comment (id, content, created_at, user_id, post_id) '
+        'VALUES (:id, :content, :created_at, :user_id, :post_id)'
+    ), [{'id': i, 'content': 'nice post', 'created_at': start + timedelta(seconds=i),
+         'user_id': rng.randint(1, users), 'post_id': rng.randint(1, posts)}
+        for i in range(1, comments + 1)])
+
+
+def measure(conn, params, repeat):
+    results = {}
+    for name, sql in QUERIES.items():
+        plan = [row[-1] for row in conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params)]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(text(sql), params).fetchall()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        results[name] = (plan, elapsed)
+    return results
+
+
+def report(label, results):
+    print(f'== {label}')
+    for name, (plan, elapsed) in results.items():
+        print(f'  {name:<18} {elapsed:8.3f} ms   {" / ".join(plan)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--comments', type=int, default=300000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_engine(f'sqlite:///{path}')
+    indexes = [index for table in db.metadata.tables.values() for index in table.indexes]
+
+    with engine.begin() as conn:
+        db.metadata.create_all(conn)
+        for index in indexes:
+            index.drop(conn)
+        seed(conn, args.users, args.posts, args.comments)
+        conn.execute(text('ANALYZE'))
+
+    params = {'user_id': args.users // 2, 'post_id': args.posts // 2}
+    with engine.connect() as conn:
+        report('without indexes', measure(conn, params, args.repeat))
+
+    with engine.begin() as conn:
+        for index in indexes:
+            index.create(conn)
+        conn.execute(text('ANALYZE'))
+
+    with engine.connect() as conn:
+        report('with indexes', measure(conn, params, args.repeat))
+
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
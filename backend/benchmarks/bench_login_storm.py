@@ -0,0 +1,102 @@
+"""Login and read latency during a login storm, inline vs pooled hashing.
+
+Serves the app from a threaded local server on a throwaway SQLite file.
+For each hashing mode it runs login threads and GET /api/posts threads
+together for a fixed time, then prints p50/p99 latency for both.
+
+    python -m benchmarks.bench_login_storm --logins 16 --readers 4 --seconds 10
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from config import Config
+from hashing import password_hasher
+from models import db
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    RATELIMIT_ENABLED = False
+
+
+def call(base, path, payload=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(base + path, data=data, headers=headers)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000
+
+
+def storm(base, token, logins, readers, seconds):
+    login_times, read_times = [], []
+    deadline = time.monotonic() + seconds
+
+    def loop(fn, out):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            fn()
+            out.append(time.perf_counter() - started)
+
+    credentials = {'username': 'reader', 'password': 'Password123'}
+    threads = [threading.Thread(target=loop, args=(lambda: call(base, '/api/login', credentials), login_times))
+               for _ in range(logins)]
+    threads += [threading.Thread(target=loop, args=(lambda: call(base, '/api/posts', token=token), read_times))
+                for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return login_times, read_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=16)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--pool', type=int, default=2, help='process pool size for the pooled run')
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    token = call(base, '/api/register', {
+        'username': 'reader', 'email': 'reader@example.com', 'password': 'Password123'
+    })['token']['access']
+    call(base, '/api/posts', {'title': 'Hello', 'content': 'World'}, token)
+
+    for label, workers in (('inline', 0), (f'pool={args.pool}', args.pool)):
+        app.config['PASSWORD_HASH_WORKERS'] = workers
+        password_hasher.shutdown()
+        logins, reads = storm(base, token, args.logins, args.readers, args.seconds)
+        print(f'{label:<8} login p50 {percentile(logins, 50):7.1f} ms  p99 {percentile(logins, 99):7.1f} ms  '
+              f'({len(logins)} logins) | read p50 {percentile(reads, 50):6.1f} ms  '
+              f'p99 {percentile(reads, 99):6.1f} ms  ({len(reads)} reads)')
+
+    password_hasher.shutdown()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Per-request overhead of the rate-limit check for each storage backend.
+
+Drives a bare Flask route through the test client with no limiter, then
+with the limiter on in-memory and on SQLite storage, and prints the mean
+time each request takes and the overhead compared with no limiter.
+
+    python -m benchmarks.bench_ratelimit --requests 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+
+import ratelimit_storage  # noqa: F401  registers the sqlite:// scheme
+
+
+def build_app(storage_uri):
+    app = Flask(__name__)
+    if storage_uri is None:
+        app.config['RATELIMIT_ENABLED'] = False
+    else:
+        app.config['RATELIMIT_STORAGE_URI'] = storage_uri
+    limiter = Limiter(get_remote_address, app=app)
+
+    @app.route('/ping')
+    @limiter.limit('1000000 per minute')
+    def ping():
+        return 'pong'
+
+    # the route only holds a weak reference to the limiter
+    app.limiter = limiter
+    return app
+
+
+def run(app, requests):
+    client = app.test_client()
+    for _ in range(100):
+        client.get('/ping')
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get('/ping')
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'ratelimit.db')
+    backends = [
+        ('disabled', None),
+        ('memory', 'memory://'),
+        ('sqlite', f'sqlite:///{path}'),
+    ]
+    baseline = None
+    for name, uri in backends:
+        per_request = run(build_app(uri), args.requests)
+        baseline = per_request if baseline is None else baseline
+        print(f'{name:<10} {per_request:8.1f} us/request   +{per_request - baseline:6.1f} us')
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
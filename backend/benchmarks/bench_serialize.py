@@ -0,0 +1,105 @@
+"""List-endpoint throughput: ORM objects + to_dict() vs row projection, stdlib vs orjson.
+
+Loads posts into an in-memory database and compares three ways of serving
+a page of GET /api/posts:
+
+  to_dict + stdlib   the previous path: ORM objects, to_dict() per row and
+                     isoformat() per datetime, stdlib json encoder
+  rows + stdlib      column projection, Row._asdict(), stdlib encoder
+  rows + orjson      column projection, Row._asdict(), orjson to bytes
+
+It prints requests/s through the test client, then the encode-only cost
+of one page.
+
+    python -m benchmarks.bench_serialize --posts 2000 --limit 100 --requests 300
+"""
+import argparse
+import time
+
+from flask_jwt_extended import get_jwt_identity, jwt_required
+from sqlalchemy.orm import undefer
+
+from app import create_app
+from bulk import insert_posts
+from config import Config
+from extensions import limiter
+from json_provider import orjson
+from models import db, Post
+from pagination import keyset_response
+from serializers import row_to_dict, select_posts
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATELIMIT_ENABLED = False
+    POSTS_MAX_PAGE_SIZE = 1000
+
+
+def build_app(provider, posts):
+    config = type('Config', (BenchConfig,), {'JSON_PROVIDER': provider})
+    app = create_app(config)
+
+    @app.route('/_bench/posts_to_dict')
+    @limiter.exempt
+    @jwt_required()
+    def posts_to_dict():
+        return keyset_response(Post.query.options(undefer(Post.content)).filter_by(user_id=get_jwt_identity()), Post)
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    token = client.post('/api/register', json={
+        'username': 'bench', 'email': 'bench@example.com', 'password': 'Password123'
+    }).json['token']['access']
+    with app.app_context():
+        insert_posts([{'title': f'Post {i}', 'content': 'Lorem ipsum dolor sit amet. ' * 20, 'user_id': 1}
+                      for i in range(posts)])
+        db.session.commit()
+    return app, client, {'Authorization': f'Bearer {token}'}
+
+
+def throughput(client, path, headers, requests):
+    for _ in range(20):
+        client.get(path, headers=headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return requests / (time.perf_counter() - started)
+
+
+def encode_cost(app, limit, serialize, load, repeat=50):
+    with app.test_request_context():
+        rows = load().order_by(Post.created_at.desc()).limit(limit).all()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            app.json.response([serialize(row) for row in rows])
+        return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    variants = [('to_dict + stdlib', 'stdlib', '/_bench/posts_to_dict'),
+                ('rows + stdlib', 'stdlib', '/api/posts')]
+    if orjson is not None:
+        variants.append(('rows + orjson', 'orjson', '/api/posts'))
+    else:
+        print('orjson is not installed; skipping the orjson run')
+
+    for label, provider, path in variants:
+        app, client, headers = build_app(provider, args.posts)
+        rate = throughput(client, f'{path}?limit={args.limit}', headers, args.requests)
+        if path == '/api/posts':
+            cost = encode_cost(app, args.limit, row_to_dict, select_posts)
+        else:
+            cost = encode_cost(app, args.limit, lambda post: post.to_dict(), lambda: Post.query)
+        print(f'{label:<17} {rate:8.1f} req/s   encode {args.limit} rows {cost:6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
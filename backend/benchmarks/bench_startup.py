@@ -0,0 +1,46 @@
+"""Import time and app start-up time, checked against a budget.
+
+Each measurement runs in a fresh interpreter, the way a pre-fork server
+boots a worker. Exits non-zero if the median exceeds its budget, so it can
+gate changes in CI.
+
+    python -m benchmarks.bench_startup --runs 10 --import-budget-ms 800
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+IMPORT = 'import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)'
+CREATE = ('import time; import app; t = time.perf_counter(); app.create_app(); '
+          'print(time.perf_counter() - t)')
+
+
+def measure(code, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-W', 'ignore', '-c', code],
+                             check=True, capture_output=True, text=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--import-budget-ms', type=float, default=800)
+    parser.add_argument('--create-budget-ms', type=float, default=100)
+    args = parser.parse_args()
+
+    ok = True
+    for label, code, budget in (('import app', IMPORT, args.import_budget_ms),
+                                ('create_app()', CREATE, args.create_budget_ms)):
+        median = measure(code, args.runs)
+        within = median <= budget
+        ok = ok and within
+        print(f'{label:<14} median {median:7.1f} ms  budget {budget:7.1f} ms  {"ok" if within else "OVER"}')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
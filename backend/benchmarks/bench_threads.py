@@ -0,0 +1,111 @@
+"""GET /api/comments/<post_id> on nested threads: path range scans vs a recursive fetch.
+
+For each size, loads one post with that many comments in a random tree
+(10% top-level, the rest replies up to COMMENT_MAX_DEPTH) into an in-memory
+database with the response cache off, and times the whole thread, the
+first page of top-level comments with their reply counts, and the largest
+top-level subtree two levels deep. The last column walks the same thread
+the naive way, one children query per comment by parent_id.
+
+    python -m benchmarks.bench_threads --sizes 1000 10000 50000 --requests 50
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import event, func, select
+
+from app import create_app
+from bulk import insert_comments, insert_posts, insert_users
+from config import Config
+from models import db, Comment, User
+from serializers import COMMENT_COLUMNS
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATELIMIT_ENABLED = False
+    RESPONSE_CACHE_URI = 'null://'
+
+
+def build_app(size, seed=0):
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    token = client.post('/api/register', json={
+        'username': 'bench', 'email': 'bench@example.com', 'password': 'Password123'
+    }).json['token']['access']
+    rng = random.Random(seed)
+    max_depth = app.config['COMMENT_MAX_DEPTH']
+    with app.app_context():
+        users = insert_users([{'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x'}
+                              for i in range(100)])
+        post_id = insert_posts([{'title': 'Thread', 'content': 'Body', 'user_id': users[0]}])[0]
+        # Parents have to exist first, so the tree goes in a level at a time
+        level = insert_comments([{'content': 'Top', 'post_id': post_id, 'user_id': rng.choice(users)}
+                                 for _ in range(size // 10)])
+        remaining, depth = size - len(level), 1
+        while remaining and depth <= max_depth:
+            batch = remaining if depth == max_depth else rng.randint(remaining // 3, remaining)
+            level = insert_comments([{'content': 'Reply', 'post_id': post_id, 'user_id': rng.choice(users),
+                                      'parent_id': rng.choice(level)} for _ in range(batch)]) or level
+            remaining, depth = remaining - batch, depth + 1
+        db.session.commit()
+        biggest = db.session.execute(
+            select(Comment.parent_id).where(Comment.depth == 1)
+            .group_by(Comment.parent_id).order_by(func.count().desc()).limit(1)).scalar()
+    return app, client, {'Authorization': f'Bearer {token}'}, post_id, biggest
+
+
+def timed(app, requests, call):
+    statements = []
+    record = lambda *args: statements.append(1)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        call()
+        per_call = len(statements)
+        started = time.perf_counter()
+        for _ in range(requests):
+            call()
+        elapsed = (time.perf_counter() - started) / requests * 1000
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return elapsed, per_call
+
+
+def recursive_fetch(app, post_id):
+    with app.app_context():
+        def children(parent_id):
+            rows = db.session.execute(
+                select(*COMMENT_COLUMNS).join(User, Comment.user_id == User.id)
+                .where(Comment.post_id == post_id,
+                       Comment.parent_id.is_(None) if parent_id is None else Comment.parent_id == parent_id)
+                .order_by(Comment.id)).all()
+            return [{**row._asdict(), 'replies': children(row.id)} for row in rows]
+        return children(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'comments':>9} {'whole thread':>16} {'depth=1 page':>16} {'subtree 2 deep':>16} {'recursive':>18}")
+    for size in args.sizes:
+        app, client, headers, post_id, biggest = build_app(size)
+        url = f'/api/comments/{post_id}'
+        columns = []
+        for path in (url, f'{url}?depth=1&limit=20', f'{url}?parent={biggest}&depth=2'):
+            ms, statements = timed(app, args.requests, lambda: client.get(path, headers=headers))
+            columns.append(f'{ms:8.2f}ms/{statements:<3}')
+        ms, statements = timed(app, max(1, args.requests // 10), lambda: recursive_fetch(app, post_id))
+        print(f'{size:>9} ' + ' '.join(f'{column:>16}' for column in columns) + f' {ms:9.2f}ms/{statements:<6}')
+    print('(milliseconds per request / SQL statements per request)')
+
+
+if __name__ == '__main__':
+    main()
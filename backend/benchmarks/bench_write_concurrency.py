@@ -0,0 +1,102 @@
+"""Write throughput on SQLite with and without the engine profile.
+
+Writer threads insert a post and commit in a loop while reader threads page
+through the newest posts, all through the app's session on a throwaway
+database file. Runs once with no pragmas (rollback journal, the old
+default) and once with SQLITE_PRAGMAS, then prints commits/s, reads/s,
+commit latency and how many operations failed with "database is locked".
+
+    python -m benchmarks.bench_write_concurrency --writers 8 --readers 4 --seconds 5
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from config import Config
+from models import db, User, Post
+
+
+def build_app(pragmas, busy_timeout):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': busy_timeout}}
+        SQLITE_PRAGMAS = pragmas
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='writer', email='writer@example.com', password_hash='x'))
+        db.session.commit()
+    return app
+
+
+def percentile(samples, p):
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000
+
+
+def run(app, writers, readers, seconds):
+    deadline = time.monotonic() + seconds
+    commits, reads, errors = [], [], []
+
+    def write():
+        with app.app_context():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    db.session.add(Post(title='Load', content='x' * 500, user_id=1))
+                    db.session.commit()
+                    commits.append(time.perf_counter() - started)
+                except OperationalError:
+                    db.session.rollback()
+                    errors.append('write')
+
+    def read():
+        with app.app_context():
+            while time.monotonic() < deadline:
+                try:
+                    Post.query.filter_by(user_id=1).order_by(Post.created_at.desc()).limit(20).all()
+                    db.session.rollback()
+                    reads.append(1)
+                except OperationalError:
+                    db.session.rollback()
+                    errors.append('read')
+
+    threads = [threading.Thread(target=write) for _ in range(writers)]
+    threads += [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return commits, reads, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--timeout', type=float, default=5.0,
+                        help='sqlite3 busy timeout in seconds for the run without the profile')
+    args = parser.parse_args()
+
+    profiles = (
+        ('no pragmas', {}, args.timeout),
+        ('profile', Config.SQLITE_PRAGMAS, Config.SQLITE_PRAGMAS['busy_timeout'] / 1000),
+    )
+    for label, pragmas, timeout in profiles:
+        app = build_app(pragmas, timeout)
+        commits, reads, errors = run(app, args.writers, args.readers, args.seconds)
+        print(f'{label:<11} {len(commits) / args.seconds:8.1f} commits/s  {len(reads) / args.seconds:8.1f} reads/s  '
+              f'commit p50 {percentile(commits, 50):6.1f} ms  p99 {percentile(commits, 99):7.1f} ms  '
+              f'locked: {errors.count("write")} writes, {errors.count("read")} reads')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Generate a large, reproducible dataset for load tests.
+
+Like seed.py, but for any number of users, posts and comments, written in
+chunks through the bulk helpers (so counters and the search index are
+filled in as they would be by the API). The same --seed always produces the
+same rows. Every user is ``user<n>`` with password Password123; post ``i``
+belongs to user ``i % users``; comments favour older posts so that some
+threads are long. Post dates are spread over the past year.
+
+    python -m benchmarks.datagen --database sqlite:///instance/bench.db \\
+        --users 1000000 --posts 5000000 --comments 20000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from bulk import insert_comments, insert_posts, insert_users
+from config import Config
+from hashing import password_hasher
+from models import db
+
+PASSWORD = 'Password123'
+
+# Search scenarios query these words, so every post contains some of them
+WORDS = ('flask', 'react', 'python', 'sqlite', 'index', 'cache', 'query', 'token', 'deploy', 'async',
+         'thread', 'queue', 'worker', 'latency', 'feed', 'cursor', 'schema', 'migration', 'benchmark',
+         'profile', 'comment', 'search', 'bulk', 'json', 'server', 'client', 'api', 'route', 'test',
+         'design', 'blog', 'write', 'read', 'update', 'delete', 'login', 'hash', 'secure', 'scale', 'pool')
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(total, start + size)
+
+
+def generate(users, posts, comments, seed=0, chunk=10000, log=print):
+    """Insert the dataset into the app's database; returns (user ids, post ids)."""
+    rng = random.Random(seed)
+    # One hash shared by every user: hashing millions of passwords would
+    # dominate generation and tells us nothing
+    password_hash = password_hasher.hash(PASSWORD)
+    started = time.perf_counter()
+
+    user_ids = []
+    for start, end in chunks(users, chunk):
+        user_ids += insert_users([
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': password_hash}
+            for i in range(start, end)
+        ])
+        db.session.commit()
+    log(f'{len(user_ids)} users in {time.perf_counter() - started:.1f}s')
+
+    post_ids = []
+    first = datetime.utcnow() - timedelta(days=365)
+    step = timedelta(days=365) / max(posts, 1)
+    for start, end in chunks(posts, chunk):
+        post_ids += insert_posts([
+            {'title': sentence(rng, 4), 'content': ' '.join(sentence(rng, 12) for _ in range(rng.randint(1, 6))),
+             'user_id': user_ids[i % len(user_ids)], 'created_at': first + step * i, 'updated_at': first + step * i}
+            for i in range(start, end)
+        ])
+        db.session.commit()
+    log(f'{len(post_ids)} posts in {time.perf_counter() - started:.1f}s')
+
+    for start, end in chunks(comments, chunk):
+        insert_comments([
+            {'content': sentence(rng, rng.randint(3, 20)), 'user_id': rng.choice(user_ids),
+             'post_id': post_ids[int(len(post_ids) * rng.random() ** 3)]}
+            for _ in range(start, end)
+        ])
+        db.session.commit()
+    log(f'{comments} comments in {time.perf_counter() - started:.1f}s')
+    return user_ids, post_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='sqlite:///bench.db', help='SQLAlchemy URL to fill (tables are recreated)')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--posts', type=int, default=50000)
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk', type=int, default=10000)
+    args = parser.parse_args()
+
+    config = type('Config', (Config,), {'SQLALCHEMY_DATABASE_URI': args.database, 'JOBS_WORKER_THREADS': 0})
+    app = create_app(config)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        generate(args.users, args.posts, args.comments, args.seed, args.chunk)
+
+
+if __name__ == '__main__':
+    main()
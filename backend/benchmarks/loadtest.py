@@ -0,0 +1,178 @@
+"""Run request mixes against the whole API and report latency percentiles.
+
+Each scenario in benchmarks/scenarios.py is driven by --concurrency threads
+of virtual users, each with its own test client and a seeded RNG, against a
+database made by benchmarks.datagen (a fresh one is generated in a temporary
+file unless --database is given). For every request label it prints
+throughput, p50/p95/p99 latency and SQL statements per request.
+
+Results can be saved as a baseline and later gated against it: --check
+fails (exit 1) when a label's p95 grows by more than --tolerance (labels
+with at least --min-requests samples) or its queries per request by more
+than --query-tolerance.
+
+    python -m benchmarks.loadtest --scenarios mixed posts --requests 2000 --save loadtest.json
+    python -m benchmarks.loadtest --database sqlite:///instance/bench.db --check loadtest.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, func
+
+from app import create_app
+from benchmarks.datagen import generate
+from benchmarks.scenarios import SCENARIOS, VirtualUser
+from config import Config
+from models import db, Post, User
+
+_local = threading.local()
+
+
+def _count_query(*args):
+    _local.queries = getattr(_local, 'queries', 0) + 1
+
+
+def build_app(database):
+    config = type('Config', (Config,), {'SQLALCHEMY_DATABASE_URI': database, 'RATELIMIT_ENABLED': False})
+    app = create_app(config)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.logger.setLevel(logging.ERROR)
+    with app.app_context():
+        # Test clients serve each request on the calling thread, so a
+        # thread-local counter attributes every statement to its request
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _count_query)
+    return app
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(seconds for seconds, _, _ in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'rps': len(samples) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'queries_per_request': sum(queries for _, queries, _ in samples) / len(samples),
+    }
+
+
+def run_scenario(app, name, requests, concurrency, seed, users, posts):
+    samples = {}
+    lock = threading.Lock()
+
+    def record(label, send, ok):
+        _local.queries = 0
+        started = time.perf_counter()
+        response = send()
+        elapsed = time.perf_counter() - started
+        with lock:
+            samples.setdefault(label, []).append((elapsed, _local.queries, response.status_code in ok))
+        return response
+
+    operations = SCENARIOS[name]
+    weights = [weight for weight, _ in operations]
+
+    def virtual_user(index):
+        rng = random.Random(f'{seed}:{name}:{index}')
+        user_id = users[rng.randrange(len(users))]
+        with app.app_context():
+            token = create_access_token(identity=user_id)
+        user = VirtualUser(app.test_client(), user_id, token, rng, len(users), posts[0], posts[1], record)
+        for _ in range(requests // concurrency):
+            rng.choices(operations, weights)[0][1](user)
+
+    threads = [threading.Thread(target=virtual_user, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {label: summarize(label_samples, elapsed) for label, label_samples in sorted(samples.items())}
+
+
+def regressions(results, baseline, tolerance, query_tolerance, min_requests):
+    found = []
+    for scenario, labels in baseline.get('scenarios', {}).items():
+        for label, base in labels.items():
+            current = results['scenarios'].get(scenario, {}).get(label)
+            if current is None:
+                continue
+            # A p95 over a handful of requests is mostly noise
+            sampled = min(current['requests'], base['requests']) >= min_requests
+            if sampled and current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                found.append(f"{scenario} {label}: p95 {current['p95_ms']:.2f} ms vs {base['p95_ms']:.2f} ms")
+            if current['queries_per_request'] > base['queries_per_request'] * (1 + query_tolerance):
+                found.append(f"{scenario} {label}: {current['queries_per_request']:.2f} queries/request "
+                             f"vs {base['queries_per_request']:.2f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=1000, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', help='SQLAlchemy URL of a database filled by benchmarks.datagen')
+    parser.add_argument('--users', type=int, default=1000, help='users to generate without --database')
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--comments', type=int, default=50000)
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--check', help='compare against a saved JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative growth of p95')
+    parser.add_argument('--query-tolerance', type=float, default=0.1,
+                        help='allowed relative growth of queries per request')
+    parser.add_argument('--min-requests', type=int, default=100,
+                        help='labels with fewer requests are only gated on queries per request')
+    args = parser.parse_args()
+
+    database = args.database or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loadtest.db')
+    app = build_app(database)
+    with app.app_context():
+        if args.database is None:
+            db.create_all()
+            generate(args.users, args.posts, args.comments, args.seed, log=lambda line: print(f'generated {line}'))
+        users = db.session.scalars(db.select(User.id).order_by(User.id)).all()
+        posts = db.session.query(func.min(Post.id), func.max(Post.id)).one()
+
+    results = {'database': {'users': len(users), 'posts': posts[1] - posts[0] + 1},
+               'concurrency': args.concurrency, 'scenarios': {}}
+    for name in args.scenarios:
+        results['scenarios'][name] = run_scenario(app, name, args.requests, args.concurrency,
+                                                  args.seed, users, posts)
+        print(f'\n{name}')
+        print(f"  {'request':<30} {'n':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+        for label, row in results['scenarios'][name].items():
+            print(f"  {label:<30} {row['requests']:>6} {row['errors']:>4} {row['rps']:>8.1f} {row['p50_ms']:>8.2f} "
+                  f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['queries_per_request']:>8.2f}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.tolerance, args.query_tolerance, args.min_requests)
+        for line in found:
+            print('REGRESSION ' + line)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == '__main__':
+    main()
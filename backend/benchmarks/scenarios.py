@@ -0,0 +1,109 @@
+"""Request mixes for benchmarks.loadtest.
+
+A scenario is a list of ``(weight, operation)``; each step of a virtual user
+picks one operation by weight. Operations make their requests through
+``VirtualUser.call`` so every request is timed under its own label.
+"""
+from benchmarks.datagen import PASSWORD, WORDS
+
+
+class VirtualUser:
+    """One simulated client: a test client, a token and a seeded RNG."""
+
+    def __init__(self, client, user_id, token, rng, users, first_post, last_post, record):
+        self.client = client
+        self.user_id = user_id
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.rng = rng
+        self.users = users
+        self.first_post, self.last_post = first_post, last_post
+        self.own_posts = []
+        self.created = []
+        self.record = record
+
+    def call(self, label, method, path, json=None, auth=True, ok=(200, 201)):
+        return self.record(label, lambda: self.client.open(
+            path, method=method, json=json, headers=self.headers if auth else None), ok)
+
+    def any_post(self):
+        return self.rng.randint(self.first_post, self.last_post)
+
+    def own_post(self):
+        if not self.own_posts:
+            list_posts(self)
+        return self.rng.choice(self.own_posts) if self.own_posts else None
+
+
+def login(user):
+    username = f'user{user.rng.randrange(user.users)}'
+    user.call('POST /api/login', 'POST', '/api/login', {'username': username, 'password': PASSWORD}, auth=False)
+
+
+def list_posts(user):
+    response = user.call('GET /api/posts', 'GET', '/api/posts')
+    if response.status_code == 200:
+        user.own_posts = [post['id'] for post in response.json] + user.created
+
+
+def get_post(user):
+    post_id = user.own_post()
+    if post_id is not None:
+        user.call('GET /api/posts/<id>', 'GET', f'/api/posts/{post_id}')
+
+
+def create_post(user):
+    response = user.call('POST /api/posts', 'POST', '/api/posts',
+                         {'title': f'Load test {user.rng.choice(WORDS)}',
+                          'content': ' '.join(user.rng.choice(WORDS) for _ in range(60))})
+    if response.status_code == 201:
+        user.created.append(response.json['id'])
+        user.own_posts.append(response.json['id'])
+
+
+def update_post(user):
+    post_id = user.own_post()
+    if post_id is not None:
+        user.call('PUT /api/posts/<id>', 'PUT', f'/api/posts/{post_id}',
+                  {'title': f'Edited {user.rng.choice(WORDS)}', 'content': ' '.join(user.rng.choice(WORDS) for _ in range(60))})
+
+
+def delete_post(user):
+    # Only posts made during the run, so the generated data stays intact
+    if not user.created:
+        return create_post(user)
+    post_id = user.created.pop()
+    user.own_posts = [id for id in user.own_posts if id != post_id]
+    user.call('DELETE /api/posts/<id>', 'DELETE', f'/api/posts/{post_id}')
+
+
+def read_thread(user):
+    user.call('GET /api/comments/<post_id>', 'GET', f'/api/comments/{user.any_post()}')
+
+
+def add_comment(user):
+    user.call('POST /api/comments/<post_id>', 'POST', f'/api/comments/{user.any_post()}',
+              {'content': ' '.join(user.rng.choice(WORDS) for _ in range(12))})
+
+
+def search(user):
+    words = ' '.join(user.rng.sample(WORDS, user.rng.randint(1, 2)))
+    user.call('GET /api/search', 'GET', f'/api/search?q={words}')
+
+
+def read_feed(user):
+    user.call('GET /api/feed', 'GET', '/api/feed')
+
+
+def read_profile(user):
+    user.call('GET /api/profile', 'GET', '/api/profile')
+
+
+SCENARIOS = {
+    'login': [(1, login)],
+    'posts': [(5, list_posts), (3, get_post), (1, create_post), (1, update_post), (0.5, delete_post)],
+    'comments': [(6, read_thread), (1, add_comment)],
+    'search': [(1, search)],
+    'mixed': [(4, read_feed), (3, read_thread), (2, list_posts), (2, get_post), (1, read_profile),
+              (1, search), (0.5, create_post), (0.5, add_comment), (0.2, update_post), (0.1, delete_post),
+              (0.1, login)],
+}
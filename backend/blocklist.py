@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from jobs import enqueue, job
+from models import db, TokenBlocklist, TokenGeneration
+
+
+class BlocklistCache:
+    """In-process view of the ``TokenBlocklist`` table keyed by ``jti``.
+
+    Revoked ids are kept in memory, so checking a token is a dict lookup.
+    Rows written by other workers are pulled in at most once every
+    ``JWT_BLOCKLIST_SYNC_SECONDS``: those created since the newest one seen,
+    less ``JWT_BLOCKLIST_SYNC_OVERLAP_SECONDS``. Transactions can commit out
+    of id (and created_at) order, so a row that becomes visible late is still
+    read by a later sync as long as it committed within the overlap.
+    Nothing older than the longest token lifetime is kept: such a token is
+    rejected as expired before the blocklist is consulted.
+
+    The ``TokenGeneration`` log of stateless tokens is mirrored the same way,
+    with the same overlap, as the newest generation per user; a token
+    stamped with an older one is revoked.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._generations = {}
+        self._seen_until = None
+        self._generations_seen_until = None
+        self._synced_at = None
+        self._pruner = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JWT_BLOCKLIST_SYNC_SECONDS', 5)
+        app.config.setdefault('JWT_BLOCKLIST_SYNC_OVERLAP_SECONDS', 60)
+        app.config.setdefault('JWT_BLOCKLIST_PRUNE_SECONDS', 3600)
+        app.config.setdefault('JWT_STATELESS_TOKENS', False)
+        app.config.setdefault('JWT_STATELESS_ACCESS_EXPIRES', timedelta(minutes=15))
+        app.extensions['blocklist'] = self
+        self.app = app
+        self.clear()
+
+    def retention(self):
+        """Longest token lifetime, or None if some tokens never expire."""
+        lifetimes = [self.app.config['JWT_ACCESS_TOKEN_EXPIRES'],
+                     self.app.config['JWT_REFRESH_TOKEN_EXPIRES']]
+        if not all(lifetimes):
+            return None
+        return max(lifetimes)
+
+    def cutoff(self):
+        retention = self.retention()
+        return datetime.utcnow() - retention if retention else None
+
+    def is_revoked(self, jti, user_id=None, generation=None):
+        """Whether the token ``jti`` (stamped with ``generation`` for ``user_id``, if stateless) is revoked."""
+        self._start_pruner()
+        if self._known_revoked(jti, user_id, generation):
+            return True
+        interval = self.app.config['JWT_BLOCKLIST_SYNC_SECONDS']
+        if self._synced_at is None or time.monotonic() - self._synced_at >= interval:
+            self.sync()
+            return self._known_revoked(jti, user_id, generation)
+        return False
+
+    def _known_revoked(self, jti, user_id, generation):
+        if jti in self._revoked:
+            return True
+        return generation is not None and generation < self._generations.get(user_id, (0, None))[0]
+
+    def add(self, jti, created_at=None):
+        """Record a revocation made by this worker without waiting for a sync."""
+        with self._lock:
+            self._revoked[jti] = created_at or datetime.utcnow()
+
+    def add_generation(self, user_id, generation, created_at=None):
+        """Record a generation bump made by this worker without waiting for a sync."""
+        with self._lock:
+            if generation > self._generations.get(user_id, (0, None))[0]:
+                self._generations[user_id] = (generation, created_at or datetime.utcnow())
+
+    def _since(self, seen_until, cutoff):
+        """Oldest ``created_at`` a sync reads: the overlap before the newest row seen, never before ``cutoff``."""
+        if seen_until is None:
+            return cutoff
+        since = seen_until - timedelta(seconds=self.app.config['JWT_BLOCKLIST_SYNC_OVERLAP_SECONDS'])
+        return max(since, cutoff) if cutoff is not None else since
+
+    def sync(self):
+        cutoff = self.cutoff()
+        query = db.session.query(TokenBlocklist.jti, TokenBlocklist.created_at)
+        since = self._since(self._seen_until, cutoff)
+        if since is not None:
+            query = query.filter(TokenBlocklist.created_at >= since)
+        generations = db.session.query(TokenGeneration.user_id, TokenGeneration.generation,
+                                       TokenGeneration.created_at)
+        since = self._since(self._generations_seen_until, cutoff)
+        if since is not None:
+            generations = generations.filter(TokenGeneration.created_at >= since)
+        rows = query.all()
+        generation_rows = generations.all()
+        with self._lock:
+            for row in rows:
+                self._revoked[row.jti] = row.created_at
+                if self._seen_until is None or row.created_at > self._seen_until:
+                    self._seen_until = row.created_at
+            for row in generation_rows:
+                if row.generation > self._generations.get(row.user_id, (0, None))[0]:
+                    self._generations[row.user_id] = (row.generation, row.created_at)
+                if self._generations_seen_until is None or row.created_at > self._generations_seen_until:
+                    self._generations_seen_until = row.created_at
+            self._evict(cutoff)
+            self._synced_at = time.monotonic()
+
+    def prune(self):
+        """Delete blocklist and generation rows whose tokens have expired anyway."""
+        cutoff = self.cutoff()
+        if cutoff is None:
+            return 0
+        deleted = TokenBlocklist.query.filter(TokenBlocklist.created_at < cutoff) \
+            .delete(synchronize_session=False)
+        TokenGeneration.query.filter(TokenGeneration.created_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        with self._lock:
+            self._evict(cutoff)
+        return deleted
+
+    def clear(self):
+        with self._lock:
+            self._revoked.clear()
+            self._generations.clear()
+            self._seen_until = None
+            self._generations_seen_until = None
+            self._synced_at = None
+
+    def _evict(self, cutoff):
+        if cutoff is None:
+            return
+        for jti in [jti for jti, created_at in self._revoked.items() if created_at < cutoff]:
+            del self._revoked[jti]
+        for user_id in [user_id for user_id, (_, created_at) in self._generations.items() if created_at < cutoff]:
+            del self._generations[user_id]
+
+    def _start_pruner(self):
+        # Started on first use rather than at import so forked workers each
+        # get their own thread.
+        interval = self.app.config['JWT_BLOCKLIST_PRUNE_SECONDS']
+        if self._pruner is not None or not interval or self.app.testing:
+            return
+        with self._lock:
+            if self._pruner is not None:
+                return
+            self._pruner = threading.Thread(target=self._prune_forever, args=(interval,),
+                                            name='blocklist-pruner', daemon=True)
+            self._pruner.start()
+
+    def _prune_forever(self, interval):
+        # Every process asks each interval; the key leaves one job per
+        # interval for whichever worker claims it
+        while not self._stop.wait(interval):
+            with self.app.app_context():
+                try:
+                    enqueue('prune_blocklist', key=f'prune_blocklist:{int(time.time() // interval)}')
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('Scheduling the token blocklist prune failed')
+
+
+blocklist = BlocklistCache()
+
+
+@job('prune_blocklist')
+def prune_blocklist_job():
+    blocklist.prune()
@@ -0,0 +1,40 @@
+import re
+from blueprints.auth import auth_bp
+from blueprints.comments import comments_bp
+from blueprints.feed import feed_bp
+from blueprints.posts import posts_bp
+from blueprints.profile import profile_bp
+from blueprints.internal import internal_bp
+
+# Every API route belongs to exactly one of these blueprints
+BLUEPRINTS = (auth_bp, posts_bp, comments_bp, feed_bp, profile_bp, internal_bp)
+
+IGNORED_METHODS = {'HEAD', 'OPTIONS'}
+
+
+class RouteConflictError(RuntimeError):
+    pass
+
+
+def route_conflicts(app):
+    """Find (path, method) pairs that more than one endpoint answers.
+
+    Converter names are ignored, so ``/posts/<int:id>`` and
+    ``/posts/<int:post_id>`` count as the same path.
+    """
+    owners = {}
+    for rule in app.url_map.iter_rules():
+        path = re.sub(r'<(?:[^:>]+:)?[^>]+>', '<>', rule.rule)
+        for method in rule.methods - IGNORED_METHODS:
+            owners.setdefault((path, method), set()).add(rule.endpoint)
+    return {key: endpoints for key, endpoints in owners.items() if len(endpoints) > 1}
+
+
+def register_blueprints(app, url_prefix):
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+    conflicts = route_conflicts(app)
+    if conflicts:
+        details = '; '.join(f"{method} {path}: {', '.join(sorted(endpoints))}"
+                            for (path, method), endpoints in sorted(conflicts.items()))
+        raise RouteConflictError(f'Routes registered more than once: {details}')
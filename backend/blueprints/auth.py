@@ -1,15 +1,19 @@
 from flask import Blueprint, request, make_response
 from flask_restful import Api, Resource
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt, get_jwt_identity
-from flask_limiter.util import get_remote_address
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, get_jwt_identity
+from extensions import limiter
 from models import db, User, TokenBlocklist
+from blocklist import blocklist
+from tokens import access_token_for, revoke_user_tokens, stateless, tokens_for
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 import validators
 
 auth_bp = Blueprint('auth', __name__)
 auth_api = Api(auth_bp)
 
 class RegisterUser(Resource):
-    @auth_bp.limiter.limit("5 per minute", key_func=get_remote_address)
+    @limiter.limit("5 per minute")
     def post(self):
         data = request.get_json()
         username = data.get('username')
@@ -25,30 +29,25 @@ class RegisterUser(Resource):
         if len(password) < 8:
             return make_response({'error': 'Password must be at least 8 characters long'}, 400)
         
-        if User.get_user_by_username(username):
-            return make_response({'error': 'Username already in use'}, 400)
-        
-        if User.query.filter_by(email=email).first():
-            return make_response({'error': 'Email already in use'}, 400)
-        
         new_user = User(username=username, email=email)
         new_user.set_password(password)
         db.session.add(new_user)
-        db.session.commit()
-        
-        access_token = create_access_token(identity=new_user.id)
-        refresh_token = create_refresh_token(identity=new_user.id)
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            field = User.duplicate_field(e)
+            if field is None:
+                raise
+            return make_response({'error': f'{field.capitalize()} already in use'}, 400)
         
         return make_response({
             'message': 'User created successfully',
-            'token': {
-                'access': access_token,
-                'refresh': refresh_token
-            }
+            'token': tokens_for(new_user)
         }, 201)
 
 class LoginUser(Resource):
-    @auth_bp.limiter.limit("5 per minute", key_func=get_remote_address)
+    @limiter.limit("5 per minute")
     def post(self):
         data = request.get_json()
         username = data.get('username')
@@ -61,35 +60,46 @@ class LoginUser(Resource):
         if not user or not user.check_password(password):
             return make_response({'error': 'Invalid username or password'}, 403)
         
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
+        if user.upgrade_password_hash(password):
+            db.session.commit()
         
         return make_response({
             'message': 'Login successful',
-            'token': {
-                'access': access_token,
-                'refresh': refresh_token
-            }
+            'token': tokens_for(user)
         }, 200)
 
 class LogoutUser(Resource):
     @jwt_required(verify_type=False)
-    def post(self):  # Changed to POST for RESTful convention
+    @limiter.limit("5 per minute")
+    def post(self):
         jwt = get_jwt()
         jti = jwt['jti']
         token_type = jwt['type']
         
-        new_jti_obj = TokenBlocklist(jti=jti)
+        if 'gen' in jwt:
+            # Stateless access token: retire its generation
+            bumped = revoke_user_tokens(get_jwt_identity())
+            db.session.commit()
+            if bumped:
+                blocklist.add_generation(bumped.user_id, bumped.generation, bumped.created_at)
+            return make_response({"message": f"{token_type} token revoked successfully"}, 200)
+        
+        new_jti_obj = TokenBlocklist(jti=jti, created_at=datetime.utcnow())
         db.session.add(new_jti_obj)
         db.session.commit()
+        blocklist.add(jti, new_jti_obj.created_at)
         
         return make_response({"message": f"{token_type} token revoked successfully"}, 200)
 
 class RefreshToken(Resource):
     @jwt_required(refresh=True)
-    def post(self):  # Changed to POST for RESTful convention
+    @limiter.limit("5 per minute")
+    def post(self):
         identity = get_jwt_identity()
-        new_access_token = create_access_token(identity=identity)
+        if stateless():
+            new_access_token = access_token_for(User.query.get_or_404(identity))
+        else:
+            new_access_token = create_access_token(identity=identity)
         
         return make_response({'access_token': new_access_token}, 200)
 
@@ -1,19 +1,136 @@
-from flask import Blueprint, request, make_response
+from flask import Blueprint, abort, current_app, g, request, make_response
 from flask_restful import Api, Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Comment, Post
+from sqlalchemy import func, select
+from models import db, Comment, Post, User
+from serializers import comment_thread, row_to_dict, select_thread
+from bulk import batch_items, batch_response, existing_post_ids, insert_comments
+from conditional import conditional
+from cache import response_cache, thread_key
+from pagination import ndjson_response, page_limit, wants_ndjson
+from threads import count_replies, parent_query, reply_counts_query, valid_path, with_reply_counts
 
 comments_bp = Blueprint('comments', __name__)
 comments_api = Api(comments_bp)
 
+def thread_version_query(post_id):
+    # Count catches deletes, max id catches inserts, and the max updated_at
+    # of comments and their authors catches edits and username changes.
+    return select(
+        func.count(Comment.id),
+        func.max(Comment.id),
+        func.max(Comment.updated_at),
+        func.max(User.updated_at),
+    ).select_from(Post) \
+        .outerjoin(Comment, Comment.post_id == Post.id) \
+        .outerjoin(User, Comment.user_id == User.id) \
+        .where(Post.id == post_id).group_by(Post.id)
+
+def thread_version_of(post_id, row):
+    # No Last-Modified: deleting an older comment leaves every date as it was
+    return row and ((post_id, *row), None)
+
+def thread_version(post_id):
+    # Kept for the view: no row means there is no such post
+    g.thread_row = db.session.execute(thread_version_query(post_id)).first()
+    return thread_version_of(post_id, g.thread_row)
+
+def comment_content_error(content):
+    if not content:
+        return 'Content is required'
+    if not isinstance(content, str):
+        return 'Content must be a string'
+    return None
+
+def valid_post_id(post_id):
+    return isinstance(post_id, int) and not isinstance(post_id, bool)
+
+THREAD_ARGS = ('parent', 'depth', 'limit', 'cursor')
+
+def whole_thread_requested():
+    """A plain GET, answered from the cached thread."""
+    return not any(name in request.args for name in THREAD_ARGS) and not wants_ndjson()
+
+def thread_args():
+    """``(parent_id, levels, after)`` from the query string, or an error response."""
+    args = request.args
+    try:
+        parent_id = int(args['parent']) if 'parent' in args else None
+        levels = int(args['depth']) if 'depth' in args else None
+    except ValueError:
+        return None, make_response({'error': 'parent and depth must be integers'}, 400)
+    if levels is not None and levels < 1:
+        return None, make_response({'error': 'depth must be at least 1'}, 400)
+    after = args.get('cursor')
+    if after is not None and not valid_path(after):
+        return None, make_response({'error': 'Invalid cursor'}, 400)
+    return (parent_id, levels, after), None
+
+def thread_statement(post_id, parent, levels, after):
+    """``levels`` counts from the top-level comments, or from ``parent``'s direct replies."""
+    root, first = (parent.path, parent.depth + 1) if parent else (None, 0)
+    return select_thread(post_id, root, first + levels - 1 if levels else None, after)
+
+def thread_page_limit(after):
+    # Unpaginated unless asked: a subtree or a few levels are usually small
+    return page_limit() if 'limit' in request.args or after else None
+
+def thread_page(rows, limit):
+    """``(comments, next_cursor)`` from rows of ``thread_statement(...).add_columns(Comment.path)``."""
+    page = rows[:limit] if limit else rows
+    comments = [row._asdict() for row in page]
+    for comment in comments:
+        del comment['path']
+    more = limit is not None and len(rows) > limit
+    return comments, page[-1].path if more else None
+
+def thread_response(comments, counts, next_cursor):
+    response = make_response(with_reply_counts(comments, counts), 200)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+def partial_thread(post_id):
+    args, error = thread_args()
+    if error:
+        return error
+    parent_id, levels, after = args
+    parent = None
+    if parent_id is not None:
+        parent = db.session.execute(parent_query(post_id, parent_id)).first()
+        if parent is None:
+            return make_response({'error': 'Comment not found'}, 404)
+    stmt = thread_statement(post_id, parent, levels, after)
+
+    if wants_ndjson():
+        if 'limit' in request.args:
+            stmt = stmt.limit(page_limit())
+        return ndjson_response(stmt, row_to_dict)
+
+    limit = thread_page_limit(after)
+    rows = db.session.execute(stmt.add_columns(Comment.path).limit(limit + 1 if limit else None)).all()
+    comments, next_cursor = thread_page(rows, limit)
+    if levels is None and limit is None:
+        counts = count_replies(comments)
+    else:
+        # Replies past the depth limit or on later pages are not in the rows
+        ids = [comment['id'] for comment in comments]
+        counts = dict(db.session.execute(reply_counts_query(ids)).all()) if ids else {}
+    return thread_response(comments, counts, next_cursor)
+
 class CommentEndpoint(Resource):
     @jwt_required()
     def post(self, post_id):
         data = request.get_json()
         content = data.get('content')
+        parent_id = data.get('parent_id')
         
-        if not content:
-            return make_response({'error': 'Content is required'}, 400)
+        error = comment_content_error(content)
+        if error:
+            return make_response({'error': error}, 400)
+        
+        if parent_id is not None and not isinstance(parent_id, int):
+            return make_response({'error': 'parent_id must be an integer'}, 400)
         
         post = Post.query.get_or_404(post_id)
         
@@ -22,16 +139,63 @@ class CommentEndpoint(Resource):
             post_id=post_id,
             user_id=get_jwt_identity()
         )
+        if parent_id is not None:
+            parent = db.session.execute(parent_query(post_id, parent_id)).first()
+            if parent is None:
+                return make_response({'error': 'Parent comment not found'}, 404)
+            max_depth = current_app.config['COMMENT_MAX_DEPTH']
+            if parent.depth + 1 > max_depth:
+                return make_response({'error': f'Replies can be nested at most {max_depth} levels deep'}, 400)
+            # Saves the insert hook a lookup; it appends the new id to the path
+            new_comment.parent_id, new_comment.path, new_comment.depth = parent_id, parent.path, parent.depth + 1
         db.session.add(new_comment)
         db.session.commit()
         
         return make_response(new_comment.to_dict(), 201)
     
     @jwt_required()
+    @conditional(thread_version)
     def get(self, post_id):
-        post = Post.query.get_or_404(post_id)
-        comments = [comment.to_dict() for comment in Comment.query.filter_by(post_id=post_id).all()]
-        return make_response(comments, 200)
+        if g.thread_row is None:
+            abort(404)
+        if not whole_thread_requested():
+            return partial_thread(post_id)
+        version = thread_version_of(post_id, g.thread_row)[0]
+        thread = response_cache.fetch(thread_key(post_id, version), lambda: comment_thread(post_id))
+        return make_response(thread, 200)
+
+class CommentBatchEndpoint(Resource):
+    @jwt_required()
+    def post(self):
+        items, error = batch_items()
+        if error:
+            return error
+        
+        posts = existing_post_ids({item.get('post_id') for item in items if valid_post_id(item.get('post_id'))})
+        user_id = get_jwt_identity()
+        results, rows = [], []
+        for index, item in enumerate(items):
+            content = item.get('content')
+            post_id = item.get('post_id')
+            error = comment_content_error(content)
+            if error is None and not valid_post_id(post_id):
+                error = 'post_id must be an integer'
+            if error:
+                results.append({'index': index, 'status': 400, 'error': error})
+                continue
+            if post_id not in posts:
+                results.append({'index': index, 'status': 404, 'error': 'Post not found'})
+                continue
+            results.append({'index': index, 'status': 201})
+            rows.append({'content': content, 'post_id': post_id, 'user_id': user_id})
+        
+        ids = iter(insert_comments(rows))
+        db.session.commit()
+        
+        for result in results:
+            if result['status'] == 201:
+                result['id'] = next(ids)
+        return batch_response(results)
 
 class CommentEndpointById(Resource):
     @jwt_required()
@@ -46,4 +210,5 @@ class CommentEndpointById(Resource):
         return make_response({'message': 'Deleted successfully'}, 200)
 
 comments_api.add_resource(CommentEndpoint, '/comments/<int:post_id>')
+comments_api.add_resource(CommentBatchEndpoint, '/comments/batch')
 comments_api.add_resource(CommentEndpointById, '/comments/<int:post_id>/<int:id>')
\ No newline at end of file
@@ -0,0 +1,44 @@
+from flask import Blueprint, current_app, make_response, request
+from flask_restful import Api, Resource
+from flask_jwt_extended import jwt_required
+
+from cache import FEED_KEY, response_cache
+from models import Post
+from pagination import after_cursor, encode_cursor, keyset_response, page_limit, wants_ndjson
+from serializers import row_to_dict, select_feed
+
+feed_bp = Blueprint('feed', __name__)
+feed_api = Api(feed_bp)
+
+
+def load_feed_head():
+    # One row past the head tells whether a page cut at its end has more
+    rows = after_cursor(select_feed(), Post, None).limit(current_app.config['FEED_HEAD_SIZE'] + 1).all()
+    return {'posts': [row_to_dict(row) for row in rows],
+            'cursors': [encode_cursor(row.created_at, row.id) for row in rows]}
+
+
+class FeedEndpoint(Resource):
+    @jwt_required()
+    def get(self):
+        """Everyone's posts, newest first.
+
+        Items carry the excerpt, not the body: GET /api/posts/<id> only
+        serves the caller's own posts, so for anyone else's this is all.
+
+        The first page is cut from a cached head of the feed, dropped when
+        this process changes a post and kept RESPONSE_CACHE_FEED_TTL seconds
+        at most; later pages and NDJSON streams go to the database.
+        """
+        limit = page_limit()
+        if 'cursor' in request.args or wants_ndjson() or limit > current_app.config['FEED_HEAD_SIZE']:
+            return keyset_response(select_feed(), Post, row_to_dict)
+
+        head = response_cache.fetch(FEED_KEY, load_feed_head, current_app.config['RESPONSE_CACHE_FEED_TTL'])
+        response = make_response(head['posts'][:limit], 200)
+        if len(head['posts']) > limit:
+            response.headers['X-Next-Cursor'] = head['cursors'][limit - 1]
+        return response
+
+
+feed_api.add_resource(FeedEndpoint, '/feed')
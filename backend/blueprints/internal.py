@@ -0,0 +1,30 @@
+from flask import Blueprint, Response, current_app, make_response, request
+from flask_restful import Api, Resource
+from flask_jwt_extended import jwt_required
+from cache import response_cache
+from metrics import metrics
+
+internal_bp = Blueprint('internal', __name__)
+internal_api = Api(internal_bp)
+
+CACHE_COUNTERS = ('hits', 'misses', 'evictions', 'expirations', 'invalidations')
+
+class CacheStats(Resource):
+    @jwt_required()
+    def get(self):
+        return make_response(response_cache.stats(), 200)
+
+class Metrics(Resource):
+    def get(self):
+        # Scraped from the host itself, so it is not behind JWT; anyone else gets a 404
+        if request.remote_addr not in current_app.config['METRICS_ALLOWED_IPS']:
+            return make_response({'error': 'Resource not found'}, 404)
+        stats = response_cache.stats()
+        extra = [(f'response_cache_{name}_total', 'counter', f'Response cache {name}', stats[name])
+                 for name in CACHE_COUNTERS if name in stats]
+        if 'entries' in stats:
+            extra.append(('response_cache_entries', 'gauge', 'Entries in the response cache', stats['entries']))
+        return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+internal_api.add_resource(CacheStats, '/_cache')
+internal_api.add_resource(Metrics, '/_metrics')
@@ -1,17 +1,30 @@
-from flask import Blueprint, request, make_response
+from flask import Blueprint, g, request, make_response
 from flask_restful import Api, Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import and_
 from models import db, Post
+from pagination import keyset_response, page_limit
+from search import search_posts
+from bulk import batch_ids, batch_items, batch_response, delete_posts, insert_posts
+from conditional import conditional
+from cache import response_cache, post_key
+from serializers import row_to_dict, select_post, select_posts
 
 posts_bp = Blueprint('posts', __name__)
 posts_api = Api(posts_bp)
 
+def post_fields_error(title, content):
+    if not all([title, content]):
+        return 'Title and content are required'
+    if not (isinstance(title, str) and isinstance(content, str)):
+        return 'Title and content must be strings'
+    return None
+
 class PostEndpoint(Resource):
     @jwt_required()
     def get(self):
         user_id = get_jwt_identity()
-        posts = [post.to_dict() for post in Post.query.filter_by(user_id=user_id).all()]
-        return make_response(posts, 200)
+        return keyset_response(select_posts().filter(Post.user_id == user_id), Post, row_to_dict)
     
     @jwt_required()
     def post(self):
@@ -19,8 +32,9 @@ class PostEndpoint(Resource):
         title = data.get('title')
         content = data.get('content')
         
-        if not all([title, content]):
-            return make_response({'error': 'Title and content are required'}, 400)
+        error = post_fields_error(title, content)
+        if error:
+            return make_response({'error': error}, 400)
         
         new_post = Post(
             title=title,
@@ -28,17 +42,72 @@ class PostEndpoint(Resource):
             user_id=get_jwt_identity()
         )
         db.session.add(new_post)
+        db.session.flush()
+        # Serialized before the commit expires it, so the body is not read back
+        post = new_post.to_dict()
+        db.session.commit()
+        
+        return make_response(post, 201)
+
+class PostBatchEndpoint(Resource):
+    @jwt_required()
+    def post(self):
+        items, error = batch_items()
+        if error:
+            return error
+        
+        user_id = get_jwt_identity()
+        results, rows = [], []
+        for index, item in enumerate(items):
+            title = item.get('title')
+            content = item.get('content')
+            error = post_fields_error(title, content)
+            if error:
+                results.append({'index': index, 'status': 400, 'error': error})
+                continue
+            results.append({'index': index, 'status': 201})
+            rows.append({'title': title, 'content': content, 'user_id': user_id})
+        
+        # Indexing a large batch for search would dominate the request
+        ids = iter(insert_posts(rows, defer_index=True))
+        db.session.commit()
+        
+        for result in results:
+            if result['status'] == 201:
+                result['id'] = next(ids)
+        return batch_response(results)
+    
+    @jwt_required()
+    def delete(self):
+        ids, error = batch_ids()
+        if error:
+            return error
+        
+        deleted = delete_posts(and_(Post.id.in_(ids), Post.user_id == get_jwt_identity()))
         db.session.commit()
         
-        return make_response(new_post.to_dict(), 201)
+        return make_response({'deleted': deleted}, 200)
+
+def post_version(id):
+    # Kept for the view: no row means no such post of this user
+    g.post_row = db.session.query(Post.id, Post.updated_at, Post.comment_count) \
+        .filter_by(id=id, user_id=get_jwt_identity()).first()
+    # comment_count changes without touching updated_at, so updated_at is no
+    # Last-Modified: the ETag alone validates
+    return g.post_row and (tuple(g.post_row), None)
+
+def load_post(id):
+    row = select_post(id).first()
+    return row_to_dict(row) if row else None
 
 class PostEndpointById(Resource):
     @jwt_required()
+    @conditional(post_version)
     def get(self, id):
-        post = Post.query.filter_by(id=id, user_id=get_jwt_identity()).first()
+        post = g.post_row and response_cache.fetch(post_key(id, tuple(g.post_row)), lambda: load_post(id))
         if not post:
             return make_response({'error': 'Post not found or unauthorized'}, 404)
-        return make_response(post.to_dict(), 200)
+        return make_response(post, 200)
     
     @jwt_required()
     def put(self, id):
@@ -50,22 +119,22 @@ class PostEndpointById(Resource):
         title = data.get('title')
         content = data.get('content')
         
-        if not all([title, content]):
-            return make_response({'error': 'Title and content are required'}, 400)
+        error = post_fields_error(title, content)
+        if error:
+            return make_response({'error': error}, 400)
         
         post.title = title
         post.content = content
+        db.session.flush()
+        updated = post.to_dict()
         db.session.commit()
         
-        return make_response(post.to_dict(), 200)
+        return make_response(updated, 200)
     
     @jwt_required()
     def delete(self, id):
-        post = Post.query.filter_by(id=id, user_id=get_jwt_identity()).first()
-        if not post:
+        if not delete_posts(and_(Post.id == id, Post.user_id == get_jwt_identity())):
             return make_response({'error': 'Post not found or unauthorized'}, 404)
-        
-        db.session.delete(post)
         db.session.commit()
         
         return make_response({'message': 'Deleted successfully'}, 200)
@@ -74,13 +143,18 @@ class SearchPosts(Resource):
     @jwt_required()
     def get(self):
         query = request.args.get('q', '')
-        user_id = get_jwt_identity()
-        posts = Post.query.filter(
-            Post.user_id == user_id,
-            (Post.title.ilike(f'%{query}%') | Post.content.ilike(f'%{query}%'))
-        ).all()
-        return make_response([post.to_dict() for post in posts], 200)
+        limit = page_limit()
+        page = max(request.args.get('page', 1, type=int), 1)
+        results = search_posts(get_jwt_identity(), query, limit + 1, (page - 1) * limit)
+        return search_response(results, limit, page)
+
+def search_response(results, limit, page):
+    response = make_response(results[:limit], 200)
+    if len(results) > limit:
+        response.headers['X-Next-Page'] = str(page + 1)
+    return response
 
 posts_api.add_resource(PostEndpoint, '/posts')
+posts_api.add_resource(PostBatchEndpoint, '/posts/batch')
 posts_api.add_resource(PostEndpointById, '/posts/<int:id>')
 posts_api.add_resource(SearchPosts, '/search')
\ No newline at end of file
@@ -1,15 +1,52 @@
-from flask import Blueprint, request, make_response
+from flask import Blueprint, g, request, make_response
 from flask_restful import Api, Resource
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from models import db, User, TokenBlocklist
+from blocklist import blocklist
+from bulk import delete_account
 import validators
+from datetime import datetime
+from conditional import conditional
+from tokens import revoke_user_tokens
 
 profile_bp = Blueprint('profile', __name__)
 profile_api = Api(profile_bp)
 
+def profile_version_query(user_id):
+    return select(User.id, User.updated_at, User.post_count, User.comment_count, User.created_at) \
+        .where(User.id == user_id)
+
+def profile_version_of(row):
+    # post_count and comment_count change without touching updated_at: ETag only
+    return row and (tuple(row), None)
+
+def profile_version():
+    # Kept for the view, which with stateless claims needs nothing else
+    g.profile_row = db.session.execute(profile_version_query(get_jwt_identity())).first()
+    return profile_version_of(g.profile_row)
+
+def profile_from_claims(claims, row):
+    """``User.to_dict()`` from stateless token claims and the version row, or None."""
+    if row is None or 'username' not in claims:
+        return None
+    return {
+        'id': row.id,
+        'username': claims['username'],
+        'email': claims['email'],
+        'created_at': row.created_at.isoformat(),
+        'post_count': row.post_count,
+        'comment_count': row.comment_count
+    }
+
 class ProfileEndpoint(Resource):
     @jwt_required()
+    @conditional(profile_version)
     def get(self):
+        profile = profile_from_claims(get_jwt(), g.get('profile_row'))
+        if profile is not None:
+            return make_response(profile, 200)
         user_id = get_jwt_identity()
         user = User.query.get_or_404(user_id)
         return make_response(user.to_dict(), 200)
@@ -29,16 +66,37 @@ class ProfileEndpoint(Resource):
         if not validators.email(email):
             return make_response({'error': 'Invalid email format'}, 400)
         
-        if username != user.username and User.get_user_by_username(username):
-            return make_response({'error': 'Username already in use'}, 400)
-        
-        if email != user.email and User.query.filter_by(email=email).first():
-            return make_response({'error': 'Email already in use'}, 400)
+        # Stateless tokens carry the old claims; retire them so the client refreshes
+        bumped = None
+        if 'gen' in get_jwt() and (username, email) != (user.username, user.email):
+            bumped = revoke_user_tokens(user_id)
         
         user.username = username
         user.email = email
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            field = User.duplicate_field(e)
+            if field is None:
+                raise
+            return make_response({'error': f'{field.capitalize()} already in use'}, 400)
+        if bumped:
+            blocklist.add_generation(bumped.user_id, bumped.generation, bumped.created_at)
         
         return make_response(user.to_dict(), 200)
+    
+    @jwt_required()
+    def delete(self):
+        if not delete_account(get_jwt_identity()):
+            return make_response({'error': 'Resource not found'}, 404)
+        
+        # The token that made the request outlives the account otherwise
+        revoked = TokenBlocklist(jti=get_jwt()['jti'], created_at=datetime.utcnow())
+        db.session.add(revoked)
+        db.session.commit()
+        blocklist.add(revoked.jti, revoked.created_at)
+        
+        return make_response({'message': 'Account deleted'}, 200)
 
 profile_api.add_resource(ProfileEndpoint, '/profile')
\ No newline at end of file
@@ -0,0 +1,133 @@
+from datetime import datetime
+
+from flask import current_app, make_response, request
+from sqlalchemy import delete, exists, insert, or_, select
+from sqlalchemy.orm import aliased
+
+from models import db, Comment, Post, User
+from search import index_posts, unindex_posts
+from cache import FEED_KEY, response_cache
+from jobs import enqueue
+from counters import count_inserted_comments, count_inserted_posts, uncount_comments, uncount_posts
+from threads import complete_paths, in_subtree, place_comments
+from postbody import summarize
+
+
+def insert_rows(model, rows):
+    """INSERT ``rows`` as one executemany and return the new ids in input order."""
+    if not rows:
+        return []
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return db.session.scalars(stmt, rows).all()
+
+
+def insert_users(rows):
+    return insert_rows(User, rows)
+
+
+def insert_posts(rows, defer_index=False):
+    """Insert posts in one statement; with ``defer_index`` a job indexes them for search after commit."""
+    now = datetime.utcnow()
+    rows = [{'created_at': now, 'updated_at': now, **summarize(row['content']), **row} for row in rows]
+    ids = insert_rows(Post, rows)
+    # Bulk inserts skip the mapper events that maintain the search index
+    # and the counters
+    count_inserted_posts(db.session.connection(), rows)
+    response_cache.invalidate(db.session(), (FEED_KEY,))
+    if defer_index:
+        if ids:
+            enqueue('index_posts', {'post_ids': ids})
+        return ids
+    index_posts(db.session.connection(), [
+        {'id': id, 'title': row['title'], 'content': row['content'], 'user_id': row['user_id']}
+        for id, row in zip(ids, rows)
+    ])
+    return ids
+
+
+def insert_comments(rows):
+    """Insert comments (and replies, with ``parent_id``) in one statement plus one path UPDATE."""
+    now = datetime.utcnow()
+    response_cache.invalidate(db.session(), (FEED_KEY,))
+    rows = place_comments(db.session.connection(), [{'created_at': now, 'updated_at': now, **row} for row in rows])
+    ids = insert_rows(Comment, rows)
+    complete_paths(db.session.connection(), ids, rows)
+    count_inserted_comments(db.session.connection(), rows)
+    return ids
+
+
+def delete_posts(condition):
+    """Delete the posts matching ``condition`` together with their comments.
+
+    A fixed number of set-based statements whatever the number of rows:
+    one SELECT for the ids (search index), then DELETE ... IN
+    subqueries. Comments are removed explicitly rather than relying on
+    ON DELETE CASCADE, so databases created before that migration are
+    cleaned up too.
+    """
+    post_ids = db.session.scalars(select(Post.id).where(condition)).all()
+    if not post_ids:
+        return 0
+    # Never correlated, even inside the counter UPDATEs on post
+    targets = select(Post.id).where(condition).correlate(None)
+    uncount_comments(db.session.connection(), Comment.post_id.in_(targets))
+    uncount_posts(db.session.connection(), condition)
+    db.session.execute(delete(Comment).where(Comment.post_id.in_(targets)),
+                       execution_options={'synchronize_session': False})
+    unindex_posts(db.session.connection(), post_ids)
+    deleted = db.session.execute(delete(Post).where(condition),
+                                 execution_options={'synchronize_session': False}).rowcount
+    response_cache.invalidate(db.session(), (FEED_KEY,))
+    return deleted
+
+
+def delete_account(user_id):
+    """Delete a user, their posts (with every comment on them) and their comments (with the replies)."""
+    delete_posts(Post.user_id == user_id)
+    # Other users' replies to them would go through ON DELETE CASCADE
+    # uncounted, so they are part of the set
+    theirs = aliased(Comment)
+    doomed = or_(Comment.user_id == user_id, exists().where(
+        theirs.user_id == user_id, theirs.post_id == Comment.post_id, in_subtree(theirs.path)))
+    uncount_comments(db.session.connection(), doomed)
+    db.session.execute(delete(Comment).where(doomed),
+                       execution_options={'synchronize_session': False})
+    response_cache.invalidate(db.session(), (FEED_KEY,))
+    return db.session.execute(delete(User).where(User.id == user_id),
+                              execution_options={'synchronize_session': False}).rowcount
+
+
+def existing_post_ids(post_ids):
+    if not post_ids:
+        return set()
+    return set(db.session.scalars(select(Post.id).where(Post.id.in_(post_ids))))
+
+
+def batch_items():
+    """The request body as a list of objects, or an error response."""
+    items = request.get_json(silent=True)
+    limit = current_app.config['BATCH_MAX_ITEMS']
+    if not isinstance(items, list) or not items or len(items) > limit:
+        return None, make_response({'error': f'Body must be a JSON array of 1 to {limit} items'}, 400)
+    return [item if isinstance(item, dict) else {} for item in items], None
+
+
+def batch_ids():
+    """The request body as a list of integer ids, or an error response."""
+    ids = request.get_json(silent=True)
+    limit = current_app.config['BATCH_MAX_ITEMS']
+    if (not isinstance(ids, list) or not ids or len(ids) > limit
+            or not all(isinstance(id, int) and not isinstance(id, bool) for id in ids)):
+        return None, make_response({'error': f'Body must be a JSON array of 1 to {limit} ids'}, 400)
+    return ids, None
+
+
+def batch_response(results):
+    """Per-item results: 201 if every item was created, 207 if some were, else 400."""
+    created = sum(1 for result in results if result['status'] == 201)
+    status = 201 if created == len(results) else 207 if created else 400
+    return make_response({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }, status)
@@ -0,0 +1,352 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from conditional import make_etag
+from models import db, Comment, Post, User
+from json_provider import default
+
+DEFAULTS = {
+    # memory:// (per process), sqlite:///path (shared by every worker on the host) or null://
+    'RESPONSE_CACHE_URI': 'memory://',
+    # Upper bound on how long a superseded post or thread version is kept
+    'RESPONSE_CACHE_TTL': 300,
+    # The feed head is invalidated only in the writing process; this bounds
+    # how stale it can be in the others
+    'RESPONSE_CACHE_FEED_TTL': 5,
+    'RESPONSE_CACHE_MAX_ENTRIES': 10000,
+}
+
+
+# Newest page of /api/feed
+FEED_KEY = 'feed:head'
+
+
+# Post and thread keys carry the version the ETag is made from: a change
+# anywhere (any worker, raw SQL) moves it, so a cached body is only ever
+# found under the ETag it was loaded for. Superseded entries age out.
+
+def post_key(post_id, version):
+    return f'post:{post_id}:{make_etag(*version)}'
+
+
+def thread_key(post_id, version):
+    return f'thread:{post_id}:{make_etag(*version)}'
+
+
+class CacheBackend:
+    # Whether get and set do I/O, so async callers run them on a thread
+    blocking = False
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.counters = dict.fromkeys(('hits', 'misses', 'evictions', 'expirations', 'invalidations'), 0)
+
+    def get(self, key):
+        """Return ``(found, value)``."""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Store ``value`` for ``ttl`` seconds (default: the backend's TTL)."""
+        raise NotImplementedError
+
+    def delete(self, keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def _count(self, name, amount=1):
+        self.counters[name] += amount
+
+
+class NullCache(CacheBackend):
+    def get(self, key):
+        self._count('misses')
+        return False, None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class MemoryCache(CacheBackend):
+    """LRU dict with per-entry expiry, private to the process."""
+
+    def __init__(self, ttl, max_entries):
+        super().__init__(ttl, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count('misses')
+                return False, None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._count('expirations')
+                self._count('misses')
+                return False, None
+            self._entries.move_to_end(key)
+            self._count('hits')
+            return True, value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._count('evictions')
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._count('invalidations')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache(CacheBackend):
+    """LRU cache in a local SQLite file shared by every worker on the host.
+
+    Values are stored as JSON (datetimes as ISO strings). Reads are a plain
+    SELECT: a hit refreshes ``used_at`` only once it is ``touch_after``
+    seconds old, so recency is that coarse, and skips it if the database is
+    locked. Expired rows are left to ``set`` and ``trim``; the least recently
+    used rows are trimmed every ``TRIM_EVERY`` writes rather than on each
+    one. Counters are kept per process.
+    """
+
+    TRIM_EVERY = 100
+    blocking = True
+
+    def __init__(self, path, ttl, max_entries, busy_timeout=5000, touch_after=60):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.touch_after = touch_after
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS response_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_used_at ON response_cache (used_at)')
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT value, expires_at, used_at FROM response_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            self._count('misses')
+            return False, None
+        value, expires_at, used_at = row
+        if expires_at <= now:
+            self._count('expirations')
+            self._count('misses')
+            return False, None
+        if now - used_at >= self.touch_after:
+            try:
+                conn.execute('UPDATE response_cache SET used_at = ? WHERE key = ?', (now, key))
+            except sqlite3.OperationalError:  # locked by a writer; recency can wait
+                pass
+        self._count('hits')
+        return True, json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO response_cache (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value, separators=(',', ':'), default=default),
+             now + (self.ttl if ttl is None else ttl), now)
+        )
+        self._writes += 1
+        if self._writes % self.TRIM_EVERY == 0:
+            self.trim()
+
+    def trim(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            deleted = conn.execute(
+                'DELETE FROM response_cache WHERE key IN '
+                '(SELECT key FROM response_cache ORDER BY used_at LIMIT ?)', (excess,)
+            ).rowcount
+            self._count('evictions', deleted)
+
+    def delete(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        deleted = self._connection().execute(
+            f"DELETE FROM response_cache WHERE key IN ({','.join('?' * len(keys))})", keys
+        ).rowcount
+        self._count('invalidations', deleted)
+
+    def clear(self):
+        self._connection().execute('DELETE FROM response_cache')
+
+    def __len__(self):
+        return self._connection().execute('SELECT count(*) FROM response_cache').fetchone()[0]
+
+
+def backend_from_uri(uri, ttl, max_entries):
+    scheme, _, rest = uri.partition('://')
+    if scheme == 'memory':
+        return MemoryCache(ttl, max_entries)
+    if scheme == 'sqlite':
+        if not rest[1:]:
+            raise ValueError('sqlite response cache needs a file path')
+        return SQLiteCache(rest[1:], ttl, max_entries)
+    if scheme == 'null':
+        return NullCache(ttl, max_entries)
+    raise ValueError(f'Unknown RESPONSE_CACHE_URI scheme: {scheme}')
+
+
+class ResponseCache:
+    """Read-through cache of serialized posts, comment threads and the feed head.
+
+    Posts and threads are keyed by version (see ``post_key``). The feed
+    head has no version query: mapper events collect it during flush and it
+    is dropped once the transaction commits, and writes that bypass the ORM
+    (bulk inserts and deletes) call ``invalidate`` themselves. That only
+    reaches this process's cache, so it is also cached for just
+    RESPONSE_CACHE_FEED_TTL seconds, which bounds how stale another
+    worker's copy (or one loaded by a read that raced a commit) can be.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.backend = backend_from_uri(app.config['RESPONSE_CACHE_URI'],
+                                        app.config['RESPONSE_CACHE_TTL'],
+                                        app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        app.extensions['response_cache'] = self
+
+    def fetch(self, key, load, ttl=None):
+        """Return the cached value for ``key``, or ``load()`` and cache it unless None."""
+        found, value = self.backend.get(key)
+        if found:
+            return value
+        value = load()
+        if value is not None:
+            self.backend.set(key, value, ttl)
+        return value
+
+    async def fetch_async(self, key, load, ttl=None):
+        """``fetch`` for the async views, where ``load`` is a coroutine function.
+
+        A blocking backend is called on a worker thread, off the event loop.
+        """
+        found, value = await self._call_async(self.backend.get, key)
+        if found:
+            return value
+        value = await load()
+        if value is not None:
+            await self._call_async(self.backend.set, key, value, ttl)
+        return value
+
+    async def _call_async(self, fn, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def invalidate(self, session, keys):
+        """Drop ``keys`` once ``session`` commits."""
+        session.info.setdefault('response_cache_keys', set()).update(keys)
+
+    def stats(self):
+        if self.backend is None:
+            return {}
+        return {**self.backend.counters, 'entries': len(self.backend),
+                'max_entries': self.backend.max_entries, 'ttl': self.backend.ttl}
+
+
+response_cache = ResponseCache()
+
+
+@event.listens_for(Post, 'after_insert')
+@event.listens_for(Post, 'after_update')
+@event.listens_for(Post, 'after_delete')
+def _post_changed(mapper, connection, target):
+    response_cache.invalidate(object_session(target), (FEED_KEY,))
+
+
+@event.listens_for(Comment, 'after_insert')
+@event.listens_for(Comment, 'after_delete')
+def _comment_counted(mapper, connection, target):
+    # The feed carries each post's comment_count
+    response_cache.invalidate(object_session(target), (FEED_KEY,))
+
+
+@event.listens_for(User, 'after_update')
+def _user_changed(mapper, connection, target):
+    # The feed embeds usernames
+    if db.inspect(target).attrs.username.history.has_changes():
+        response_cache.invalidate(object_session(target), (FEED_KEY,))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    keys = session.info.pop('response_cache_keys', None)
+    if keys and response_cache.backend is not None:
+        response_cache.backend.delete(keys)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('response_cache_keys', None)
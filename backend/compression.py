@@ -0,0 +1,78 @@
+"""Response compression negotiated with ``Accept-Encoding``.
+
+JSON and text bodies of at least COMPRESS_MIN_BYTES are sent as brotli
+(when the brotli package is installed) or gzip, whichever the client
+ranks higher. The ETag of a compressed response is made weak, as the bytes
+differ per encoding; conditional.py compares tags weakly. Streamed (NDJSON)
+responses go out as they are.
+"""
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is used without it
+    brotli = None
+
+DEFAULTS = {
+    'COMPRESS_RESPONSES': True,
+    # Below this a compressed body saves less than it costs
+    'COMPRESS_MIN_BYTES': 1024,
+    # Cheap levels: the body is compressed on every request (gzip 6 costs
+    # about three times 5 for a body a tenth smaller; see bench_content)
+    'COMPRESS_GZIP_LEVEL': 5,
+    'COMPRESS_BROTLI_QUALITY': 4,
+}
+
+
+class ResponseCompression:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        app.extensions['response_compression'] = self
+        app.after_request(self.compress)
+
+    def encodings(self, config):
+        compressors = {'gzip': lambda data: gzip.compress(data, config['COMPRESS_GZIP_LEVEL'], mtime=0)}
+        if brotli is not None:
+            compressors['br'] = lambda data: brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+        return compressors
+
+    def negotiate(self, compressors):
+        """The encoding the client ranks highest (brotli on a tie), or None."""
+        accepted = request.accept_encodings
+        ranked = sorted(compressors, key=lambda name: (accepted.quality(name), name == 'br'), reverse=True)
+        return ranked[0] if accepted.quality(ranked[0]) > 0 else None
+
+    def compress(self, response):
+        config = current_app.config
+        if (not config['COMPRESS_RESPONSES'] or response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype == 'application/json' or (response.mimetype or '').startswith('text/'))):
+            return response
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_BYTES']:
+            return response
+        response.vary.add('Accept-Encoding')
+        compressors = self.encodings(config)
+        encoding = self.negotiate(compressors)
+        if encoding is None:
+            return response
+        compressed = compressors[encoding](data)
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+response_compression = ResponseCompression()
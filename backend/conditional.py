@@ -0,0 +1,65 @@
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+
+def make_etag(*parts):
+    """Strong ETag for a representation identified by ``parts`` (ids, versions)."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def not_modified(etag, last_modified):
+    # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110 13.2.2)
+    if request.if_none_match:
+        # Weak comparison: compression.py sends the tag weak on compressed bodies
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def precondition(current):
+    """``(etag, last_modified, matched)`` for a ``(etag_parts, last_modified)`` version."""
+    etag = make_etag(*current[0])
+    return etag, current[1], not_modified(etag, current[1])
+
+
+def tag(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Responses are per user: let the client keep them, but revalidate
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def conditional(version):
+    """Answer conditional GETs before the view builds its body.
+
+    ``version`` is called with the view's URL arguments and returns
+    ``(etag_parts, last_modified)`` read from a cheap version query, or None
+    to let the view run (e.g. to produce its 404). Return a None
+    ``last_modified`` unless every change to the body moves it; the response
+    is then validated by its ETag only. A matching
+    ``If-None-Match``/``If-Modified-Since`` gets an empty 304; otherwise the
+    view runs and its 200 response is tagged. Works on plain views and on
+    flask-restful ``Resource`` methods; put it below ``jwt_required`` so
+    ``version`` can read the identity.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            current = version(**kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+            etag, last_modified, matched = precondition(current)
+            if matched:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            return tag(response, etag, last_modified)
+        return wrapper
+    return decorator
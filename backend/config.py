@@ -3,8 +3,85 @@ from datetime import timedelta
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///instance/blog.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///blog.db'  # relative to the instance folder
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Optional read replica; GET/HEAD requests read from it (see database.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    # Applied to every new SQLite connection. WAL lets readers run alongside
+    # the single writer, and busy_timeout makes writers queue instead of
+    # failing with "database is locked". foreign_keys makes SQLite honour
+    # ON DELETE CASCADE.
+    SQLITE_PRAGMAS = {
+        'foreign_keys': 'ON',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 268435456,
+    }
+    # Connection pool for PostgreSQL/MySQL
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_TIMEOUT = 30
+    DB_POOL_RECYCLE = 1800
+    DB_POOL_PRE_PING = True
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'your-jwt-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
-    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
\ No newline at end of file
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Revocations made by other workers are picked up within this many seconds
+    JWT_BLOCKLIST_SYNC_SECONDS = 5
+    # Each sync re-reads rows this much older than the newest one seen, to
+    # catch transactions that committed out of order (longer than any write
+    # transaction, plus clock skew between hosts)
+    JWT_BLOCKLIST_SYNC_OVERLAP_SECONDS = 60
+    # How often expired TokenBlocklist rows are deleted (0 disables the pruner)
+    JWT_BLOCKLIST_PRUNE_SECONDS = 3600
+    # Sign username/email and a per-user token generation into tokens so
+    # validation and GET /profile skip the user row (see tokens.py); access
+    # tokens then live JWT_STATELESS_ACCESS_EXPIRES
+    JWT_STATELESS_TOKENS = os.environ.get('JWT_STATELESS_TOKENS', '').lower() in ('1', 'true', 'yes')
+    JWT_STATELESS_ACCESS_EXPIRES = timedelta(minutes=15)
+    # Password hashing (see hashing.py); stored hashes are upgraded on login
+    # when this method or its cost changes
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+    # Rate-limit counters; 'sqlite:///instance/ratelimit.db' shares them between workers
+    # (see ratelimit_storage.py), 'memory://' keeps them per process
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI') or 'memory://'
+    RATELIMIT_DEFAULT = "200 per day;50 per hour"
+    # Keyset pagination for list endpoints
+    POSTS_PAGE_SIZE = 20
+    POSTS_MAX_PAGE_SIZE = 100
+    STREAM_BATCH_SIZE = 500
+    # Post bodies at least this large are stored compressed (see postbody.py):
+    # 'auto' uses zstd when zstandard is installed, else zlib; 'none' stores them plain
+    POST_COMPRESSION = os.environ.get('POST_COMPRESSION') or 'auto'
+    POST_COMPRESS_MIN_BYTES = 1024
+    # Newest posts kept in the response cache for the first page of /api/feed
+    FEED_HEAD_SIZE = 100
+    # Deepest reply allowed (top-level comments are depth 0); Comment.path
+    # holds at most 25 levels
+    COMMENT_MAX_DEPTH = 8
+    # Largest array accepted by the /posts/batch and /comments/batch endpoints
+    BATCH_MAX_ITEMS = 1000
+    # Read-through cache of single posts, comment threads and the feed head
+    # (see cache.py);
+    # sqlite:///path shares one cache between the workers on a host
+    RESPONSE_CACHE_URI = os.environ.get('RESPONSE_CACHE_URI') or 'memory://'
+    RESPONSE_CACHE_TTL = 300
+    RESPONSE_CACHE_FEED_TTL = 5
+    RESPONSE_CACHE_MAX_ENTRIES = 10000
+    # gzip (or brotli, when installed) for JSON responses the client accepts
+    # compressed (see compression.py)
+    COMPRESS_RESPONSES = True
+    COMPRESS_MIN_BYTES = 1024
+    # 'auto' encodes JSON with orjson when it is installed, else the stdlib
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER') or 'auto'
+    # Per-request SQL/latency metrics served at /api/_metrics (see metrics.py)
+    METRICS_ENABLED = True
+    # Only these client addresses may scrape /api/_metrics; behind a proxy on
+    # the same host every client looks local, so narrow this or disable it
+    METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+    # Requests slower than this many seconds are logged with their SQL
+    SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS') or 0.5)
+    # 'auto' picks FTS5 on SQLite and tsvector/GIN on PostgreSQL; 'like' disables the index
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'
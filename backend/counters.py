@@ -0,0 +1,122 @@
+from collections import Counter
+
+import click
+from sqlalchemy import event, func, select, update
+
+from jobs import job
+from models import db, Comment, Post, User
+from threads import in_subtree
+
+# (table, counter column, child table, child foreign key)
+COUNTERS = (
+    (Post, Post.comment_count, Comment, Comment.post_id),
+    (User, User.post_count, Post, Post.user_id),
+    (User, User.comment_count, Comment, Comment.user_id),
+)
+
+
+def _keep_updated_at(table):
+    # Counter changes are not edits; stop onupdate from bumping updated_at
+    return {'updated_at': table.c.updated_at}
+
+
+def adjust(connection, column, amounts):
+    """Add ``amounts`` ({row id: delta}) to a counter column, one UPDATE per row."""
+    amounts = {id: delta for id, delta in amounts.items() if delta}
+    if not amounts:
+        return
+    table = column.class_.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.id == db.bindparam('row_id'))
+        .values({column.key: table.c[column.key] + db.bindparam('delta'), **_keep_updated_at(table)}),
+        [{'row_id': id, 'delta': delta} for id, delta in amounts.items()]
+    )
+
+
+def count_inserted_posts(connection, rows):
+    adjust(connection, User.post_count, Counter(row['user_id'] for row in rows))
+
+
+def count_inserted_comments(connection, rows):
+    adjust(connection, Post.comment_count, Counter(row['post_id'] for row in rows))
+    adjust(connection, User.comment_count, Counter(row['user_id'] for row in rows))
+
+
+def _uncount(connection, column, child_fk, children):
+    # Subtract, from every parent that has rows in ``children``, how many it has
+    parent = column.class_
+    in_set = children.where(child_fk == parent.id).with_only_columns(func.count()).scalar_subquery()
+    connection.execute(
+        update(parent)
+        .where(parent.id.in_(children.with_only_columns(child_fk)))
+        .values({column.key: column - in_set, **_keep_updated_at(parent.__table__)})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def uncount_comments(connection, condition):
+    """Decrement post and user comment counts for the comments matching ``condition``."""
+    comments = select(Comment.id).where(condition)
+    _uncount(connection, Post.comment_count, Comment.post_id, comments)
+    _uncount(connection, User.comment_count, Comment.user_id, comments)
+
+
+def uncount_posts(connection, condition):
+    """Decrement user post counts for the posts matching ``condition``."""
+    _uncount(connection, User.post_count, Post.user_id, select(Post.id).where(condition))
+
+
+def reconcile():
+    """Recompute every counter from the child tables; returns rows repaired per counter."""
+    repaired = {}
+    for parent, column, child, child_fk in COUNTERS:
+        actual = select(func.count()).where(child_fk == parent.id).scalar_subquery()
+        result = db.session.execute(
+            update(parent).where(column != actual).values({column.key: actual, **_keep_updated_at(parent.__table__)})
+            .execution_options(synchronize_session=False)
+        )
+        repaired[f'{parent.__tablename__}.{column.key}'] = result.rowcount
+    db.session.commit()
+    return repaired
+
+
+@job('reconcile_counts')
+def reconcile_job():
+    reconcile()
+
+
+@click.command('reconcile-counts')
+def reconcile_command():
+    """Repair drift in the denormalized post and comment counters."""
+    for counter, rows in reconcile().items():
+        click.echo(f'{counter}: {rows} rows repaired')
+
+
+@event.listens_for(Post, 'after_insert')
+def _post_inserted(mapper, connection, target):
+    adjust(connection, User.post_count, {target.user_id: 1})
+
+
+@event.listens_for(Post, 'before_delete')
+def _post_deleting(mapper, connection, target):
+    # Comments go with the post through ON DELETE CASCADE, so count them first
+    uncount_comments(connection, Comment.post_id == target.id)
+    adjust(connection, User.post_count, {target.user_id: -1})
+
+
+@event.listens_for(Comment, 'after_insert')
+def _comment_inserted(mapper, connection, target):
+    count_inserted_comments(connection, [{'post_id': target.post_id, 'user_id': target.user_id}])
+
+
+@event.listens_for(Comment, 'before_delete')
+def _comment_deleting(mapper, connection, target):
+    # Its replies go with it through ON DELETE CASCADE, so count them first
+    uncount_comments(connection, (Comment.post_id == target.post_id) & in_subtree(target.path))
+
+
+@event.listens_for(Comment, 'after_delete')
+def _comment_deleted(mapper, connection, target):
+    adjust(connection, Post.comment_count, {target.post_id: -1})
+    adjust(connection, User.comment_count, {target.user_id: -1})
@@ -0,0 +1,70 @@
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND = 'replica'
+READ_METHODS = {'GET', 'HEAD'}
+
+
+def pool_options(config):
+    """QueuePool settings for server databases; SQLite keeps SQLAlchemy's defaults."""
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def set_sqlite_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return on_connect
+
+
+def configure_engines(app):
+    """Fill in ``SQLALCHEMY_ENGINE_OPTIONS`` and the replica bind; call before ``db.init_app``.
+
+    Options already present in the config win over the profile.
+    """
+    config = app.config
+    if not is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {**pool_options(config), **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    replica = config.get('DATABASE_REPLICA_URL')
+    if replica:
+        options = {} if is_sqlite(replica) else pool_options(config)
+        config['SQLALCHEMY_BINDS'] = {**config.get('SQLALCHEMY_BINDS', {}), REPLICA_BIND: {'url': replica, **options}}
+
+
+def attach_pragmas(app, db):
+    """Run ``SQLITE_PRAGMAS`` on every new connection of each SQLite engine."""
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite' and pragmas:
+                event.listen(engine, 'connect', set_sqlite_pragmas(pragmas))
+
+
+class RoutingSession(Session):
+    """Sends reads made while serving GET/HEAD requests to the replica bind.
+
+    Only active when ``DATABASE_REPLICA_URL`` is set. Flushes always go to
+    the primary, so a GET handler that writes still works, but it will not
+    see its own uncommitted rows on the replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and request.method in READ_METHODS:
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,12 @@
+from flask_cors import CORS
+from flask_jwt_extended import JWTManager
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from flask_migrate import Migrate
+
+# Extensions are created unbound and attached to an app in create_app(), so
+# importing them (from blueprints, tests or the CLI) does no work.
+migrate = Migrate()
+cors = CORS()
+jwt = JWTManager()
+limiter = Limiter(get_remote_address)  # default limits come from RATELIMIT_DEFAULT
@@ -0,0 +1,83 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULTS = {
+    # Werkzeug method string, including the cost parameters
+    'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1',
+    # Size of the hashing process pool; 0 hashes on the calling thread
+    'PASSWORD_HASH_WORKERS': 2,
+}
+
+
+class PasswordHasher:
+    """Runs password hashing in a small process pool.
+
+    Request threads block on the result but the CPU work happens in at most
+    ``PASSWORD_HASH_WORKERS`` processes, so a burst of logins cannot occupy
+    every core a worker has for serving reads.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._prefixes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        app.extensions['password_hasher'] = self
+
+    def _config(self, key):
+        if has_app_context():
+            return current_app.config.get(key, DEFAULTS[key])
+        return DEFAULTS[key]
+
+    @property
+    def method(self):
+        return self._config('PASSWORD_HASH_METHOD')
+
+    def _run(self, fn, *args):
+        workers = self._config('PASSWORD_HASH_WORKERS')
+        if not workers:
+            return fn(*args)
+        # The pool is created on first use so forked server workers each
+        # start their own.
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=workers)
+                    self._pid = os.getpid()
+        return self._executor.submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self._prefix(self.method)
+
+    def _prefix(self, method):
+        # Werkzeug stores shorthands expanded ('scrypt' as 'scrypt:32768:8:1'),
+        # so compare with what the method actually writes; hashed once per method
+        if method not in self._prefixes:
+            self._prefixes[method] = generate_password_hash('', method).split('$', 1)[0]
+        return self._prefixes[method]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+            self._pid = None
+
+
+password_hasher = PasswordHasher()
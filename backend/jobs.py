@@ -0,0 +1,329 @@
+import json
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import and_, event, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import db, Job
+
+DEFAULTS = {
+    # Worker threads started in each app process on its first request; set 0
+    # and run ``flask jobs work`` to keep job execution out of web processes
+    'JOBS_WORKER_THREADS': 1,
+    # How long an idle worker sleeps before polling again (a commit that
+    # enqueues in the same process wakes it immediately)
+    'JOBS_POLL_SECONDS': 1.0,
+    'JOBS_MAX_ATTEMPTS': 5,
+    # Retry n waits JOBS_RETRY_BASE_SECONDS * 2**(n - 1)
+    'JOBS_RETRY_BASE_SECONDS': 2,
+    # A job claimed longer ago than this is assumed to have lost its worker
+    'JOBS_LEASE_SECONDS': 300,
+}
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+# Job name -> handler, filled in by @job in the modules that own the work
+HANDLERS = {}
+
+DIALECT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def job(name):
+    """Register the decorated function as the handler for jobs called ``name``.
+
+    The handler receives the payload as keyword arguments and runs in an app
+    context; whatever it leaves in the session is committed with the job's
+    ``done`` status.
+    """
+    def register(fn):
+        HANDLERS[name] = fn
+        return fn
+    return register
+
+
+def enqueue(name, payload=None, key=None, delay=0, max_attempts=None):
+    """Spool a job in the current transaction; it becomes visible when the caller commits.
+
+    With ``key``, a job whose key is already spooled (in any status) is not
+    added again. Returns False in that case.
+    """
+    if name not in HANDLERS:
+        raise ValueError(f'Unknown job: {name}')
+    values = {
+        'name': name,
+        'payload': payload or {},
+        'idempotency_key': key,
+        'status': QUEUED,
+        'attempts': 0,
+        'max_attempts': max_attempts or current_app.config['JOBS_MAX_ATTEMPTS'],
+        'run_at': datetime.utcnow() + timedelta(seconds=delay),
+        'created_at': datetime.utcnow(),
+    }
+    dialect_insert = DIALECT_INSERTS.get(db.session.get_bind(Job.__mapper__).dialect.name)
+    if key is None:
+        stmt = insert(Job).values(values)
+    elif dialect_insert is not None:
+        stmt = dialect_insert(Job).values(values).on_conflict_do_nothing(index_elements=['idempotency_key'])
+    else:
+        if db.session.scalar(select(Job.id).where(Job.idempotency_key == key)) is not None:
+            return False
+        stmt = insert(Job).values(values)
+    added = db.session.execute(stmt).rowcount == 1
+    if added:
+        db.session.info['jobs_enqueued'] = True
+    return added
+
+
+class Worker:
+    """Claims due jobs one at a time and runs them.
+
+    A claim is a single conditional UPDATE, so any number of workers, in
+    threads or separate processes, can share the spool table.
+    """
+
+    def __init__(self, app, name=None):
+        self.app = app
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+
+    def claim(self):
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.app.config['JOBS_LEASE_SECONDS'])
+        # A worker lost during the last attempt leaves nothing to retry
+        db.session.execute(
+            update(Job).where(Job.status == RUNNING, Job.locked_at < stale, Job.attempts >= Job.max_attempts)
+            .values(status=FAILED, finished_at=now, locked_by=None, locked_at=None,
+                    last_error='Lease expired on the final attempt; lost worker ' + Job.locked_by)
+            .execution_options(synchronize_session=False)
+        )
+        due = or_(
+            and_(Job.status == QUEUED, Job.run_at <= now),
+            and_(Job.status == RUNNING, Job.locked_at < stale, Job.attempts < Job.max_attempts),
+        )
+        candidate = select(Job.id).where(due).order_by(Job.run_at, Job.id).limit(1) \
+            .correlate(None).scalar_subquery()
+        job_id = db.session.scalar(
+            update(Job).where(Job.id == candidate, due)
+            .values(status=RUNNING, attempts=Job.attempts + 1, locked_by=self.name, locked_at=now)
+            .returning(Job.id)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return db.session.get(Job, job_id) if job_id is not None else None
+
+    def run_once(self):
+        """Run the next due job; returns False when there was none."""
+        with self.app.app_context():
+            job = self.claim()
+            if job is None:
+                return False
+            job_id, name, payload = job.id, job.name, dict(job.payload)
+            try:
+                HANDLERS[name](**payload)
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('Job %s (%s) failed', job_id, name)
+                self._failed(job_id, traceback.format_exc())
+            else:
+                db.session.execute(update(Job).where(Job.id == job_id)
+                                   .values(status=DONE, finished_at=datetime.utcnow(), last_error=None))
+                db.session.commit()
+            return True
+
+    def _failed(self, job_id, error):
+        job = db.session.get(Job, job_id)
+        if job.attempts >= job.max_attempts:
+            job.status, job.finished_at = FAILED, datetime.utcnow()
+        else:
+            delay = self.app.config['JOBS_RETRY_BASE_SECONDS'] * 2 ** (job.attempts - 1)
+            job.status, job.run_at = QUEUED, datetime.utcnow() + timedelta(seconds=delay)
+        job.last_error = error
+        job.locked_by = job.locked_at = None
+        db.session.commit()
+
+    def drain(self):
+        """Run due jobs until none are left; returns how many ran."""
+        ran = 0
+        while self.run_once():
+            ran += 1
+        return ran
+
+    def run(self, stop, wake):
+        while not stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception:
+                self.app.logger.exception('Job worker %s could not claim a job', self.name)
+            wake.wait(self.app.config['JOBS_POLL_SECONDS'])
+            wake.clear()
+
+
+class JobQueue:
+    """Starts in-process workers and wakes them when a commit spools a job."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._threads = []
+        self.stop = threading.Event()
+        self.wake = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        app.extensions['jobs'] = self
+        if app.config['JOBS_WORKER_THREADS'] and not app.testing:
+            app.before_request(lambda: self.start(app))
+
+    def start(self, app, threads=None):
+        # Started on the first request rather than at import so forked
+        # workers each get their own threads
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(threads or app.config['JOBS_WORKER_THREADS']):
+                worker = Worker(app, f'{socket.gethostname()}:{os.getpid()}:{i}')
+                thread = threading.Thread(target=worker.run, args=(self.stop, self.wake),
+                                          name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+
+job_queue = JobQueue()
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop('jobs_enqueued', False):
+        job_queue.wake.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_wakeup(session):
+    session.info.pop('jobs_enqueued', None)
+
+
+@click.group('jobs')
+def jobs_cli():
+    """Inspect and run background jobs."""
+
+
+@jobs_cli.command('work')
+@click.option('--threads', default=1, show_default=True, help='Worker threads in this process.')
+@click.option('--once', is_flag=True, help='Run the jobs that are due now, then exit.')
+@with_appcontext
+def work_command(threads, once):
+    """Run jobs until interrupted."""
+    app = current_app._get_current_object()
+    if once:
+        click.echo(f'{Worker(app).drain()} jobs run')
+        return
+    job_queue.start(app, threads)
+    click.echo(f'{threads} job workers running; Ctrl+C to stop')
+    try:
+        while any(thread.is_alive() for thread in job_queue._threads):
+            job_queue.stop.wait(1)
+    except KeyboardInterrupt:
+        job_queue.stop.set()
+
+
+@jobs_cli.command('stats')
+@with_appcontext
+def stats_command():
+    """Count jobs by status."""
+    rows = db.session.execute(select(Job.status, func.count()).group_by(Job.status)).all()
+    counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED), 0)
+    counts.update(dict(rows))
+    for status, count in counts.items():
+        click.echo(f'{status}: {count}')
+
+
+@jobs_cli.command('list')
+@click.option('--status', type=click.Choice([QUEUED, RUNNING, DONE, FAILED]))
+@click.option('--name')
+@click.option('--limit', default=20, show_default=True)
+@with_appcontext
+def list_command(status, name, limit):
+    """Show the most recent jobs."""
+    query = Job.query
+    if status:
+        query = query.filter(Job.status == status)
+    if name:
+        query = query.filter(Job.name == name)
+    for job in query.order_by(Job.id.desc()).limit(limit):
+        error = job.last_error.strip().splitlines()[-1] if job.last_error else ''
+        click.echo(f'{job.id:>6}  {job.status:<7}  {job.attempts}/{job.max_attempts}  '
+                   f'{job.run_at:%Y-%m-%d %H:%M:%S}  {job.name}  {error}')
+
+
+@jobs_cli.command('show')
+@click.argument('job_id', type=int)
+@with_appcontext
+def show_command(job_id):
+    """Print one job, including its last traceback."""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        raise click.ClickException(f'No job {job_id}')
+    details = job.to_dict()
+    error = details.pop('last_error')
+    click.echo(json.dumps(details, indent=2))
+    if error:
+        click.echo(error)
+
+
+@jobs_cli.command('retry')
+@click.argument('job_ids', type=int, nargs=-1)
+@click.option('--failed', 'all_failed', is_flag=True, help='Retry every failed job.')
+@with_appcontext
+def retry_command(job_ids, all_failed):
+    """Queue failed jobs again with a fresh set of attempts."""
+    condition = Job.status == FAILED if all_failed else and_(Job.id.in_(job_ids), Job.status == FAILED)
+    retried = db.session.execute(
+        update(Job).where(condition)
+        .values(status=QUEUED, attempts=0, run_at=datetime.utcnow(), finished_at=None)
+    ).rowcount
+    db.session.commit()
+    job_queue.wake.set()
+    click.echo(f'{retried} jobs queued')
+
+
+@jobs_cli.command('enqueue')
+@click.argument('name')
+@click.option('--payload', default='{}', help='Handler keyword arguments as a JSON object.')
+@click.option('--key', help='Idempotency key.')
+@with_appcontext
+def enqueue_command(name, payload, key):
+    """Spool a job by name."""
+    try:
+        added = enqueue(name, json.loads(payload), key=key)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo('queued' if added else f'a job with key {key} already exists')
+
+
+@jobs_cli.command('purge')
+@click.option('--older-than', default=7, show_default=True, help='Days since the job finished.')
+@with_appcontext
+def purge_command(older_than):
+    """Delete finished jobs (done or failed), freeing their idempotency keys."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than)
+    deleted = db.session.execute(
+        Job.__table__.delete().where(Job.status.in_((DONE, FAILED)), Job.finished_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    click.echo(f'{deleted} jobs purged')
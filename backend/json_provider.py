@@ -0,0 +1,55 @@
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider, JSONProvider, _default as flask_default
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib provider is used instead
+    orjson = None
+
+
+def default(o):
+    # Rows are handed over with their datetime columns untouched; both
+    # providers render them as ISO 8601, the format to_dict() uses
+    if isinstance(o, date):
+        return o.isoformat()
+    return flask_default(o)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    default = staticmethod(default)
+
+
+class ORJSONProvider(JSONProvider):
+    """Encodes with orjson and builds responses straight from its bytes."""
+
+    mimetype = 'application/json'
+
+    def __init__(self, app):
+        if orjson is None:
+            raise RuntimeError('JSON_PROVIDER = "orjson" needs the orjson package installed')
+        super().__init__(app)
+        self.option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=default, option=self.option),
+                                        mimetype=self.mimetype)
+
+
+def json_provider(app):
+    """The provider named by ``JSON_PROVIDER``: 'orjson', 'stdlib' or 'auto' (orjson if installed)."""
+    name = app.config.get('JSON_PROVIDER', 'auto')
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'stdlib'
+    if name == 'orjson':
+        return ORJSONProvider(app)
+    if name == 'stdlib':
+        return StdlibJSONProvider(app)
+    raise ValueError(f'Unknown JSON_PROVIDER: {name}')
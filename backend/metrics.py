@@ -0,0 +1,187 @@
+import threading
+import time
+
+from flask import g, has_request_context, request, request_finished, request_started
+from flask.json.provider import JSONProvider
+from sqlalchemy import event
+
+DEFAULTS = {
+    'METRICS_ENABLED': True,
+    'METRICS_ALLOWED_IPS': ('127.0.0.1', '::1'),
+    # Requests slower than this are logged with their SQL (0 disables)
+    'SLOW_REQUEST_SECONDS': 0.5,
+}
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Statements kept per request for the slow-request log
+MAX_LOGGED_STATEMENTS = 50
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+HISTOGRAMS = (
+    ('http_request_duration_seconds', 'Wall time spent handling the request', 'total', LATENCY_BUCKETS),
+    ('http_request_db_seconds', 'Time spent executing SQL', 'db_time', LATENCY_BUCKETS),
+    ('http_request_serialize_seconds', 'Time spent encoding JSON bodies', 'serialize_time', LATENCY_BUCKETS),
+    ('http_request_queries', 'SQL statements executed', 'queries', QUERY_BUCKETS),
+)
+
+
+def current_request_stats():
+    if has_request_context():
+        return g.get('request_stats')
+    return None
+
+
+class TimedJSONProvider(JSONProvider):
+    """Wraps the app's JSON provider and charges encoding time to the request."""
+
+    def __init__(self, app, inner):
+        super().__init__(app)
+        self.inner = inner
+
+    def _timed(self, fn, *args, **kwargs):
+        stats = current_request_stats()
+        if stats is None:
+            return fn(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stats['serialize_time'] += time.perf_counter() - started
+
+    def dumps(self, obj, **kwargs):
+        return self._timed(self.inner.dumps, obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return self.inner.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        return self._timed(self.inner.response, *args, **kwargs)
+
+
+class RequestMetrics:
+    """Per-endpoint request counts and latency, SQL and JSON histograms.
+
+    SQL is timed with cursor-execute events on every engine of ``db``, and
+    JSON encoding by wrapping ``app.json``; both are charged to the request
+    being served. Everything is kept in process memory, so with several
+    workers each scrape sees one worker (label it with the instance).
+    """
+
+    def __init__(self, app=None, db=None):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.histograms = {}
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        app.extensions['metrics'] = self
+        self.reset()
+        if not app.config['METRICS_ENABLED']:
+            return
+        app.json = TimedJSONProvider(app, app.json)
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+        with app.app_context():
+            for engine in db.engines.values():
+                self.watch(engine)
+
+    def watch(self, engine):
+        """Charge the SQL run on ``engine`` to the request being served."""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+            self.histograms.clear()
+
+    def _request_started(self, sender, **extra):
+        g.request_stats = {'started': time.perf_counter(), 'queries': 0, 'db_time': 0.0,
+                           'serialize_time': 0.0, 'statements': []}
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        stats = current_request_stats()
+        if stats is None:
+            return
+        stats['queries'] += 1
+        stats['db_time'] += elapsed
+        if len(stats['statements']) < MAX_LOGGED_STATEMENTS:
+            stats['statements'].append((elapsed, statement))
+
+    def _request_finished(self, sender, response, **extra):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return
+        stats['total'] = time.perf_counter() - stats['started']
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            key = (endpoint, request.method, response.status_code)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for name, _, field, buckets in HISTOGRAMS:
+                histogram = self.histograms.get((name, endpoint))
+                if histogram is None:
+                    histogram = self.histograms[(name, endpoint)] = Histogram(buckets)
+                histogram.observe(stats[field])
+
+        threshold = sender.config['SLOW_REQUEST_SECONDS']
+        if threshold and stats['total'] >= threshold:
+            sql = ''.join(f'\n  {elapsed * 1000:7.1f} ms  {" ".join(statement.split())}'
+                          for elapsed, statement in stats['statements'])
+            sender.logger.warning(
+                'Slow request %s %s -> %s: %.0f ms total, %d queries in %.0f ms, %.0f ms serializing%s',
+                request.method, request.path, response.status_code, stats['total'] * 1000,
+                stats['queries'], stats['db_time'] * 1000, stats['serialize_time'] * 1000, sql)
+
+    def render(self, extra=()):
+        """Prometheus text exposition of everything recorded so far.
+
+        ``extra`` is an iterable of ``(name, type, help, value)`` samples
+        appended as-is, e.g. cache counters.
+        """
+        lines = ['# HELP http_requests_total Requests handled, by endpoint, method and status',
+                 '# TYPE http_requests_total counter']
+        with self._lock:
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+            for name, help, _, _ in HISTOGRAMS:
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, endpoint), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram.total}')
+                    lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{endpoint="{endpoint}"}} {histogram.total}')
+        for name, kind, help, value in extra:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = RequestMetrics()
@@ -90,13 +90,28 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the search index (search.py) is managed by hand, not by the models
+    def include_name(name, type_, parent_names):
+        if type_ == 'table':
+            return not name.startswith('post_search')
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_name", include_name)
 
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # Batch mode rebuilds SQLite tables by copy, drop and rename; with
+        # foreign keys enforced (SQLITE_PRAGMAS) dropping a parent table
+        # would fail or cascade. The pragma is ignored inside a transaction,
+        # so end the one it autobegins before alembic opens its own.
+        if connection.dialect.name == 'sqlite':
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -0,0 +1,31 @@
+"""add case-insensitive unique indexes on username and email
+
+Revision ID: 3b7d2e8f6a14
+Revises: e1e6567507c7
+Create Date: 2026-10-18 19:58:12.416305
+
+Fails if existing accounts differ only by case; rename or merge them first:
+SELECT lower(username), count(*) FROM "user" GROUP BY 1 HAVING count(*) > 1
+(and the same for email).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7d2e8f6a14'
+down_revision = 'e1e6567507c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_username_lower', [sa.text('lower(username)')], unique=True)
+        batch_op.create_index('ix_user_email_lower', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_email_lower')
+        batch_op.drop_index('ix_user_username_lower')
@@ -0,0 +1,48 @@
+"""thread comments by materialized path
+
+Revision ID: 4fdc45567014
+Revises: 3b7d2e8f6a14
+Create Date: 2026-10-18 19:52:31.228868
+
+Existing comments are all top-level: their path is their own zero-padded
+id (threads.PATH_DIGITS wide) and their depth 0.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4fdc45567014'
+down_revision = '3b7d2e8f6a14'
+branch_labels = None
+depends_on = None
+
+PARENT_FK = 'fk_comment_parent_id_comment'
+
+
+def upgrade():
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('parent_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('path', sa.String(length=255), server_default='', nullable=False))
+        batch_op.add_column(sa.Column('depth', sa.Integer(), server_default='0', nullable=False))
+        batch_op.drop_index(batch_op.f('ix_comment_post_id_created_at'))
+        batch_op.create_index(batch_op.f('ix_comment_parent_id'), ['parent_id'], unique=False)
+        batch_op.create_foreign_key(PARENT_FK, 'comment', ['parent_id'], ['id'], ondelete='CASCADE')
+
+    op.execute("UPDATE comment SET path = "
+               "substr('0000000000' || CAST(id AS TEXT), length(CAST(id AS TEXT)) + 1)")
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.create_index('ix_comment_post_id_path', ['post_id', 'path'], unique=False)
+
+
+def downgrade():
+    # Replies lose their place and become top-level comments
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_comment_post_id_path')
+        batch_op.drop_constraint(PARENT_FK, type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_comment_parent_id'))
+        batch_op.create_index(batch_op.f('ix_comment_post_id_created_at'), ['post_id', 'created_at'], unique=False)
+        batch_op.drop_column('depth')
+        batch_op.drop_column('path')
+        batch_op.drop_column('parent_id')
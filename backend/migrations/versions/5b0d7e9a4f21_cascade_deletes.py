@@ -0,0 +1,51 @@
+"""cascade deletes from users and posts
+
+Revision ID: 5b0d7e9a4f21
+Revises: e83f5a62c1d9
+Create Date: 2026-10-18 21:26:04.913512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0d7e9a4f21'
+down_revision = 'e83f5a62c1d9'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table); the initial schema left these unnamed
+FOREIGN_KEYS = (
+    ('post', 'user_id', 'user'),
+    ('comment', 'user_id', 'user'),
+    ('comment', 'post_id', 'post'),
+)
+# Lets batch mode on SQLite name the reflected, unnamed constraints
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def constraint_name(table, column, referred):
+    if op.get_bind().dialect.name == 'sqlite':
+        return f'fk_{table}_{column}_{referred}'
+    # PostgreSQL's default name for an unnamed foreign key
+    return f'{table}_{column}_fkey'
+
+
+def replace_foreign_keys(ondelete):
+    for table in ('post', 'comment'):
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for fk_table, column, referred in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                name = constraint_name(table, column, referred)
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
@@ -0,0 +1,63 @@
+"""store post bodies compressed with excerpts
+
+Revision ID: 5e7bfebc48d3
+Revises: 4fdc45567014
+Create Date: 2026-10-18 19:59:19.524699
+
+Every post is rewritten once, a batch at a time: its excerpt and length
+filled in and, except on PostgreSQL (which keeps the column as text), its
+body stored as postbody.CompressedText writes it under the app's
+POST_COMPRESSION settings.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import postbody
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7bfebc48d3'
+down_revision = '4fdc45567014'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def rewrite_posts(columns, convert):
+    bind = op.get_bind()
+    update = sa.text(f"UPDATE post SET {', '.join(f'{name} = :{name}' for name in columns)} WHERE id = :id")
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text('SELECT id, content FROM post WHERE id > :last_id ORDER BY id LIMIT :limit'),
+                            {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            return
+        bind.execute(update, [{'id': row.id, **convert(postbody.decode(row.content))} for row in rows])
+        last_id = rows[-1].id
+
+
+def upgrade():
+    plain = op.get_bind().dialect.name == 'postgresql'
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('excerpt', sa.String(length=281), server_default='', nullable=False))
+        batch_op.add_column(sa.Column('content_length', sa.Integer(), server_default='0', nullable=False))
+        if not plain:
+            batch_op.alter_column('content', existing_type=sa.TEXT(), type_=sa.LargeBinary(), existing_nullable=False)
+
+    if plain:
+        rewrite_posts(('excerpt', 'content_length'), postbody.summarize)
+    else:
+        rewrite_posts(('content', 'excerpt', 'content_length'),
+                      lambda text: {'content': postbody.encode(text), **postbody.summarize(text)})
+
+
+def downgrade():
+    plain = op.get_bind().dialect.name == 'postgresql'
+    if not plain:
+        rewrite_posts(('content',), lambda text: {'content': text})
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        if not plain:
+            batch_op.alter_column('content', existing_type=sa.LargeBinary(), type_=sa.TEXT(), existing_nullable=False)
+        batch_op.drop_column('content_length')
+        batch_op.drop_column('excerpt')
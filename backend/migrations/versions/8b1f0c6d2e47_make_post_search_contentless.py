@@ -0,0 +1,55 @@
+"""make the sqlite post search index contentless
+
+Revision ID: 8b1f0c6d2e47
+Revises: 5e7bfebc48d3
+Create Date: 2026-10-18 21:04:37.126509
+
+The FTS5 table kept its own copy of every title and body; it is rebuilt
+holding only the index. Bodies are read through postbody.decode, as they
+may be stored compressed.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import postbody
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1f0c6d2e47'
+down_revision = '5e7bfebc48d3'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def rebuild(create, columns):
+    bind = op.get_bind()
+    op.execute('DROP TABLE post_search')
+    op.execute(create)
+    insert = sa.text(f"INSERT INTO post_search (rowid, {', '.join(columns)}) "
+                     f"VALUES (:id, {', '.join(f':{name}' for name in columns)})")
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text('SELECT id, title, content, user_id FROM post '
+                                    'WHERE id > :last_id ORDER BY id LIMIT :limit'),
+                            {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+        if not rows:
+            return
+        bind.execute(insert, [{'id': row.id, 'title': row.title, 'content': postbody.decode(row.content),
+                               'user_id': row.user_id} for row in rows])
+        last_id = rows[-1].id
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        rebuild("CREATE VIRTUAL TABLE post_search "
+                "USING fts5(title, content, content='', tokenize='porter unicode61')",
+                ('title', 'content'))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        rebuild("CREATE VIRTUAL TABLE post_search "
+                "USING fts5(title, content, user_id UNINDEXED, tokenize='porter unicode61')",
+                ('title', 'content', 'user_id'))
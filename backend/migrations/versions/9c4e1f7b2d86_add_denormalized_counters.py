@@ -0,0 +1,41 @@
+"""add denormalized post and comment counters
+
+Revision ID: 9c4e1f7b2d86
+Revises: 5b0d7e9a4f21
+Create Date: 2026-10-18 22:03:51.207734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4e1f7b2d86'
+down_revision = '5b0d7e9a4f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute('UPDATE post SET comment_count = '
+               '(SELECT count(*) FROM comment WHERE comment.post_id = post.id)')
+    op.execute('UPDATE "user" SET post_count = '
+               '(SELECT count(*) FROM post WHERE post.user_id = "user".id)')
+    op.execute('UPDATE "user" SET comment_count = '
+               '(SELECT count(*) FROM comment WHERE comment.user_id = "user".id)')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('post_count')
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
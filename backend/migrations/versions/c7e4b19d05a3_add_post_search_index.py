@@ -0,0 +1,47 @@
+"""add post search index
+
+Revision ID: c7e4b19d05a3
+Revises: a2d68bf8e9f7
+Create Date: 2026-10-18 19:32:10.418273
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e4b19d05a3'
+down_revision = 'a2d68bf8e9f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE post_search "
+            "USING fts5(title, content, user_id UNINDEXED, tokenize='porter unicode61')"
+        )
+        op.execute(
+            'INSERT INTO post_search (rowid, title, content, user_id) '
+            'SELECT id, title, content, user_id FROM post'
+        )
+    elif dialect == 'postgresql':
+        op.execute(
+            'CREATE TABLE post_search ('
+            'post_id INTEGER PRIMARY KEY REFERENCES post (id) ON DELETE CASCADE, '
+            'user_id INTEGER NOT NULL, '
+            'document TSVECTOR NOT NULL)'
+        )
+        op.execute('CREATE INDEX ix_post_search_document ON post_search USING GIN (document)')
+        op.execute(
+            'INSERT INTO post_search (post_id, user_id, document) '
+            "SELECT id, user_id, setweight(to_tsvector('english', title), 'A') || "
+            "setweight(to_tsvector('english', content), 'B') FROM post"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name in ('sqlite', 'postgresql'):
+        op.execute('DROP TABLE post_search')
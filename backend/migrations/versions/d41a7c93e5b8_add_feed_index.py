@@ -0,0 +1,26 @@
+"""add post (created_at, id) index for the global feed
+
+Revision ID: d41a7c93e5b8
+Revises: 9c4e1f7b2d86
+Create Date: 2026-10-18 23:10:12.481920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a7c93e5b8'
+down_revision = '9c4e1f7b2d86'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_created_at_id', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_created_at_id')
@@ -0,0 +1,32 @@
+"""add updated_at columns
+
+Revision ID: e83f5a62c1d9
+Revises: c7e4b19d05a3
+Create Date: 2026-10-18 20:41:37.582190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e83f5a62c1d9'
+down_revision = 'c7e4b19d05a3'
+branch_labels = None
+depends_on = None
+
+TABLES = ('user', 'post', 'comment')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        # Existing rows have never been edited as far as anyone can tell
+        op.execute(sa.text(f'UPDATE "{table}" SET updated_at = created_at'))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
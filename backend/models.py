@@ -1,13 +1,40 @@
+import re
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import func
+from sqlalchemy.orm import deferred, validates
 from datetime import datetime
+from hashing import password_hasher
+from postbody import EXCERPT_CHARS, CompressedText, summarize
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class TokenBlocklist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), nullable=False, unique=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class TokenGeneration(db.Model):
+    """One row per bump of a user's token generation (see tokens.py).
+
+    Not a foreign key: the row has to outlive a deleted account until the
+    tokens it revokes have expired.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    generation = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+# Unique indexes and constraints on user -> the field they guard
+USER_UNIQUE_FIELDS = {
+    'ix_user_username_lower': 'username',
+    'ix_user_email_lower': 'email',
+    'user_username_key': 'username',
+    'user_email_key': 'email',
+    'user.username': 'username',
+    'user.email': 'email',
+}
+SQLITE_UNIQUE_FAILED = re.compile(r"UNIQUE constraint failed: (?:index )?'?([\w.]+)'?$")
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,52 +42,123 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every change; drives the profile ETag and Last-Modified
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Maintained by counters.py; repair drift with ``flask reconcile-counts``
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Stamped into stateless tokens; bumping it revokes every token issued before
+    token_generation = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Deleting rows is left to ON DELETE CASCADE; the ORM never loads children to do it
+    posts = db.relationship('Post', backref='author', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    comments = db.relationship('Comment', backref='author', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
-    posts = db.relationship('Post', backref='author', lazy=True)
-    comments = db.relationship('Comment', backref='author', lazy=True)
+    # "Alice" and "alice" are the same account; writes rely on these instead
+    # of checking first (see duplicate_field)
+    __table_args__ = (
+        db.Index('ix_user_username_lower', func.lower(username), unique=True),
+        db.Index('ix_user_email_lower', func.lower(email), unique=True),
+    )
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def upgrade_password_hash(self, password):
+        """Re-hash with the configured method if the stored hash predates it."""
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+            return True
+        return False
     
     def to_dict(self):
         return {
             'id': self.id,
             'username': self.username,
             'email': self.email,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at.isoformat(),
+            'post_count': self.post_count,
+            'comment_count': self.comment_count
         }
 
     @staticmethod
     def get_user_by_username(username):
         return User.query.filter_by(username=username).first()
 
+    @staticmethod
+    def duplicate_field(error):
+        """'username' or 'email' if an IntegrityError from a user write broke its uniqueness, else None."""
+        # PostgreSQL names the constraint; SQLite names the index, or the
+        # table and column of a column constraint, at the end of the message
+        name = getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+        if name is None:
+            match = SQLITE_UNIQUE_FAILED.search(str(error.orig))
+            name = match and match.group(1)
+        return USER_UNIQUE_FIELDS.get(name)
+
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text, nullable=False)
+    # Compressed when large (see postbody.py) and only loaded when accessed;
+    # lists serve excerpt and content_length, kept in step by set_content
+    content = deferred(db.Column(CompressedText, nullable=False))
+    excerpt = db.Column(db.String(EXCERPT_CHARS + 1), nullable=False, default='', server_default='')
+    content_length = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
-    comments = db.relationship('Comment', backref='post', lazy=True)
+    comments = db.relationship('Comment', backref='post', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+
+    # Serves "a user's posts, newest first" (PostEndpoint.get, SearchPosts.get)
+    # and "everyone's posts, newest first" (FeedEndpoint.get)
+    __table_args__ = (
+        db.Index('ix_post_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_post_created_at_id', 'created_at', 'id'),
+    )
+
+    @validates('content')
+    def set_content(self, key, content):
+        if content is not None:
+            for name, value in summarize(content).items():
+                setattr(self, name, value)
+        return content
 
     def to_dict(self):
         return {
             'id': self.id,
             'title': self.title,
-            'content': self.content,
+            'excerpt': self.excerpt,
+            'content_length': self.content_length,
             'created_at': self.created_at.isoformat(),
-            'user_id': self.user_id
+            'user_id': self.user_id,
+            'comment_count': self.comment_count,
+            'content': self.content
         }
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), nullable=False)
+    # Replies go with the comment they answer
+    parent_id = db.Column(db.Integer, db.ForeignKey('comment.id', ondelete='CASCADE'), index=True)
+    # Ancestors' ids and its own, zero-padded, and how many ancestors; set on
+    # insert by threads.py
+    path = db.Column(db.String(255), nullable=False, default='', server_default='')
+    depth = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Serves "a post's thread in order" and "one comment's replies"
+    # (CommentEndpoint.get) as a single range scan
+    __table_args__ = (
+        db.Index('ix_comment_post_id_path', 'post_id', 'path'),
+    )
 
     def to_dict(self):
         return {
@@ -69,5 +167,44 @@ class Comment(db.Model):
             'created_at': self.created_at.isoformat(),
             'user_id': self.user_id,
             'post_id': self.post_id,
-            'username': self.author.username
-        }
\ No newline at end of file
+            'username': self.author.username,
+            'parent_id': self.parent_id,
+            'depth': self.depth
+        }
+class Job(db.Model):
+    """A unit of background work spooled by jobs.enqueue() and run by a jobs.Worker."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # A second enqueue with the same key is ignored while this row exists
+    idempotency_key = db.Column(db.String(200), unique=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(80))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    # Serves the worker's "next due job" claim
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'payload': self.payload,
+            'idempotency_key': self.idempotency_key,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat(),
+            'locked_by': self.locked_by,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,102 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import Response, current_app, make_response, request, stream_with_context
+from sqlalchemy import Select, and_, or_
+
+from models import db
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, id):
+    """Build an opaque next-page token from the last row's sort key."""
+    raw = json.dumps([created_at.isoformat(), id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def after_cursor(query, model, cursor):
+    """Restrict an ``(created_at DESC, id DESC)`` ordered query to rows past ``cursor``."""
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if cursor is None:
+        return query
+    created_at, id = cursor
+    return query.filter(or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id < id)
+    ))
+
+
+def page_limit():
+    default = current_app.config['POSTS_PAGE_SIZE']
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, current_app.config['POSTS_MAX_PAGE_SIZE']))
+
+
+def wants_ndjson():
+    return request.args.get('format') == 'ndjson' or \
+        request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def ndjson_response(query, serialize):
+    """Stream ``query`` (a Query or a select()) one JSON document per line without buffering the result set."""
+    dumps = current_app.json.dumps
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+
+    def generate():
+        if isinstance(query, Select):
+            rows = db.session.execute(query.execution_options(yield_per=batch_size))
+        else:
+            rows = query.yield_per(batch_size)
+        for row in rows:
+            yield dumps(serialize(row)) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def keyset_response(query, model, serialize=None):
+    """Serve ``query`` a page at a time, keyed on ``(created_at, id)``.
+
+    The body stays a plain JSON array; the token for the following page is
+    returned in the ``X-Next-Cursor`` header and omitted on the last page.
+    Clients asking for NDJSON get every remaining row streamed instead.
+    """
+    serialize = serialize or (lambda row: row.to_dict())
+    try:
+        token = request.args.get('cursor')
+        cursor = decode_cursor(token) if token else None
+    except InvalidCursor as e:
+        return make_response({'error': str(e)}, 400)
+
+    query = after_cursor(query, model, cursor)
+    if wants_ndjson():
+        if 'limit' in request.args:
+            query = query.limit(page_limit())
+        return ndjson_response(query, serialize)
+
+    limit = page_limit()
+    return page_response(query.limit(limit + 1).all(), limit, serialize)
+
+
+def page_response(rows, limit, serialize):
+    """A page from up to ``limit + 1`` rows; the extra row only signals a next page."""
+    response = make_response([serialize(row) for row in rows[:limit]], 200)
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        response.headers['X-Next-Cursor'] = encode_cursor(last.created_at, last.id)
+    return response
@@ -0,0 +1,116 @@
+"""How post bodies are stored.
+
+``Post.content`` is a ``CompressedText`` column: bodies of at least
+POST_COMPRESS_MIN_BYTES are written compressed (zstd when the zstandard
+package is installed, else zlib), shorter ones as plain UTF-8. A
+compressed value starts with a byte that never begins UTF-8 text, followed
+by the codec, so rows written under any setting read back the same way.
+PostgreSQL keeps the column as text: it already compresses large values
+(TOAST) and its search needs the words.
+
+List endpoints read ``Post.excerpt`` and ``Post.content_length``, written
+alongside the body (``summarize``), and never the body itself.
+"""
+import zlib
+
+from flask import current_app, has_app_context
+from sqlalchemy import LargeBinary, Text
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is used without it
+    zstandard = None
+
+DEFAULTS = {
+    # 'auto' (zstd if installed, else zlib), 'zstd', 'zlib' or 'none'
+    'POST_COMPRESSION': 'auto',
+    # Shorter bodies gain too little to pay for the decompression
+    'POST_COMPRESS_MIN_BYTES': 1024,
+}
+
+# Characters kept in Post.excerpt, before the ellipsis
+EXCERPT_CHARS = 280
+
+COMPRESSED = b'\xff'
+CODECS = {
+    'zlib': (b'z', lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+if zstandard is not None:
+    CODECS['zstd'] = (b's', lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+                      lambda data: zstandard.ZstdDecompressor().decompress(data))
+DECOMPRESSORS = {tag: decompress for tag, _, decompress in CODECS.values()}
+
+
+def _config(key):
+    if has_app_context():
+        return current_app.config.get(key, DEFAULTS[key])
+    return DEFAULTS[key]
+
+
+def codec():
+    """The configured codec's name, or None when bodies are stored plain."""
+    name = _config('POST_COMPRESSION')
+    if name == 'auto':
+        return 'zstd' if 'zstd' in CODECS else 'zlib'
+    if name == 'none':
+        return None
+    if name not in CODECS:
+        raise ValueError(f'POST_COMPRESSION={name!r} is not available')
+    return name
+
+
+def encode(text):
+    data = text.encode()
+    name = codec()
+    if name is None or len(data) < _config('POST_COMPRESS_MIN_BYTES'):
+        return data
+    tag, compress, _ = CODECS[name]
+    packed = COMPRESSED + tag + compress(data)
+    return packed if len(packed) < len(data) else data
+
+
+def decode(value):
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value.startswith(COMPRESSED):
+        return value.decode()
+    tag = value[1:2]
+    if tag not in DECOMPRESSORS:
+        raise ValueError('post body compressed with a codec that is not installed (zstandard?)')
+    return DECOMPRESSORS[tag](value[2:]).decode()
+
+
+def excerpt(text):
+    """The start of ``text``, cut at a word boundary when it is longer than EXCERPT_CHARS."""
+    if len(text) <= EXCERPT_CHARS:
+        return text
+    cut = text[:EXCERPT_CHARS]
+    space = max(cut.rfind(' '), cut.rfind('\n'))
+    if space > EXCERPT_CHARS // 2:
+        cut = cut[:space]
+    return cut.rstrip() + '…'
+
+
+def summarize(text):
+    """The columns stored alongside a body, for inserts that bypass the ORM."""
+    return {'excerpt': excerpt(text), 'content_length': len(text)}
+
+
+class CompressedText(TypeDecorator):
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(Text())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == 'postgresql':
+            return value
+        return encode(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decode(value)
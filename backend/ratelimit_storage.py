@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import threading
+import time
+
+from limits.errors import ConfigurationError
+from limits.storage import Storage
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window rate-limit counters in a local SQLite file.
+
+    Every worker on the host opens the same WAL-mode database, so limits
+    hold across processes without a network round trip. Each hit is a single
+    ``INSERT ... ON CONFLICT ... RETURNING`` statement, which SQLite applies
+    atomically. Enable with ``RATELIMIT_STORAGE_URI = 'sqlite:///path/to.db'``.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+    # Expired windows are swept after this many hits
+    SWEEP_EVERY = 1000
+
+    def __init__(self, uri, wrap_exceptions=False, busy_timeout=5000, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri.split('://', 1)[1][1:]
+        if not self.path:
+            raise ConfigurationError('sqlite rate-limit storage needs a file path')
+        self.busy_timeout = int(busy_timeout)
+        self._local = threading.local()
+        self._hits = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS ratelimit ('
+                'key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        row = self._connection().execute(
+            'INSERT INTO ratelimit (key, count, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END, '
+            'expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END '
+            'RETURNING count',
+            (key, amount, now + expiry, now, now)
+        ).fetchone()
+        self._hits += 1
+        if self._hits % self.SWEEP_EVERY == 0:
+            self._connection().execute('DELETE FROM ratelimit WHERE expires_at <= ?', (now,))
+        return row[0]
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT count FROM ratelimit WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connection().execute(
+            'SELECT expires_at FROM ratelimit WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._connection().execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection().execute('DELETE FROM ratelimit').rowcount
+
+    def clear(self, key):
+        self._connection().execute('DELETE FROM ratelimit WHERE key = ?', (key,))
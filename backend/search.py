@@ -0,0 +1,313 @@
+import html
+import re
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, exists, inspect, literal_column, select, table, text
+
+from jobs import job
+from models import db, Post
+from postbody import CompressedText
+from serializers import POST_SUMMARY_COLUMNS
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+# Words kept around the first match in the content highlight
+SNIPPET_TOKENS = 24
+
+# Typing for the text() queries below so created_at comes back as a datetime
+POST_RESULT_COLUMNS = {
+    'id': db.Integer,
+    'title': db.String,
+    'excerpt': db.String,
+    'content_length': db.Integer,
+    'created_at': db.DateTime,
+    'user_id': db.Integer,
+    'comment_count': db.Integer,
+    'content': CompressedText,
+}
+
+
+def terms(query):
+    """Split free text into word tokens; punctuation never reaches the engine."""
+    return re.findall(r'\w+', query.lower())
+
+
+def highlight(value, words, around=None):
+    """``value`` HTML-escaped, with words starting with one of ``words`` marked.
+
+    The markers are added after escaping, so they are the only markup in
+    the result. With ``around``, only that many words from just before the
+    first match are kept, with '…' where the text was cut.
+    """
+    tokens = list(re.finditer(r'\w+', value))
+    matches = [token for token in tokens if words and token.group().lower().startswith(tuple(words))]
+    start, end = 0, len(value)
+    if around is not None and tokens:
+        first = tokens.index(matches[0]) if matches else 0
+        lo = max(0, first - 4)
+        hi = min(len(tokens), lo + around)
+        if lo:
+            start = tokens[lo].start()
+        if hi < len(tokens):
+            end = tokens[hi - 1].end()
+    parts, position = ['…' if start else ''], start
+    for token in matches:
+        if token.start() < start or token.end() > end:
+            continue
+        parts += [html.escape(value[position:token.start()]), HIGHLIGHT_START,
+                  html.escape(token.group()), HIGHLIGHT_END]
+        position = token.end()
+    parts += [html.escape(value[position:end]), '…' if end < len(value) else '']
+    return ''.join(parts)
+
+
+class SearchBackend:
+    """Keeps a search index of posts and answers ranked queries against it.
+
+    Index maintenance runs on the flushing connection, so it commits or
+    rolls back together with the post itself.
+    """
+
+    def setup(self, connection):
+        pass
+
+    def teardown(self, connection):
+        pass
+
+    def index(self, connection, rows):
+        """Add or replace posts given as dicts of id, title, content and user_id."""
+        pass
+
+    def remove(self, connection, post_ids):
+        pass
+
+    def statement(self, user_id, words, limit, offset):
+        """The ranked query, returning POST_RESULT_COLUMNS; see ``result_row``."""
+        raise NotImplementedError
+
+    def _text(self, sql, params):
+        return text(sql).columns(**POST_RESULT_COLUMNS).bindparams(**params)
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Contentless FTS5 table keyed by post id, ranked with bm25.
+
+    The table holds only the index, not a copy of each post. FTS5 drops a
+    row of a contentless table when given the text it was indexed from, so
+    ``remove`` reads it from the post table and has to run before the post
+    changes.
+    """
+
+    def setup(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS post_search "
+            "USING fts5(title, content, content='', tokenize='porter unicode61')"
+        ))
+
+    def teardown(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS post_search'))
+
+    def index(self, connection, rows):
+        if not rows:
+            return
+        self.remove(connection, [row['id'] for row in rows])
+        connection.execute(text(
+            'INSERT INTO post_search (rowid, title, content) VALUES (:id, :title, :content)'
+        ), rows)
+
+    def remove(self, connection, post_ids):
+        if not post_ids:
+            return
+        # Correlated, so FTS5 looks each rowid up rather than scanning the index
+        indexed = exists().select_from(table('post_search')).where(literal_column('post_search.rowid') == Post.id)
+        rows = connection.execute(
+            select(Post.id, Post.title, Post.content).where(Post.id.in_(post_ids), indexed)
+        ).mappings().all()
+        if rows:
+            connection.execute(text(
+                "INSERT INTO post_search (post_search, rowid, title, content) "
+                "VALUES ('delete', :id, :title, :content)"
+            ), [dict(row) for row in rows])
+
+    def statement(self, user_id, words, limit, offset):
+        match = ' '.join(f'"{word}"*' for word in words)
+        return self._text(
+            "SELECT post.id, post.title, post.excerpt, post.content_length, post.created_at, post.user_id, "
+            "post.comment_count, post.content "
+            "FROM post_search JOIN post ON post.id = post_search.rowid "
+            "WHERE post_search MATCH :match AND post.user_id = :user_id "
+            "ORDER BY bm25(post_search, 10.0, 1.0), post.id DESC "
+            "LIMIT :limit OFFSET :offset",
+            {'match': match, 'user_id': user_id, 'limit': limit, 'offset': offset}
+        )
+
+
+class PostgresFTSBackend(SearchBackend):
+    """Weighted tsvector per post behind a GIN index, ranked with ts_rank."""
+
+    DOCUMENT = ("setweight(to_tsvector('english', :title), 'A') || "
+                "setweight(to_tsvector('english', :content), 'B')")
+
+    def setup(self, connection):
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS post_search ('
+            'post_id INTEGER PRIMARY KEY REFERENCES post (id) ON DELETE CASCADE, '
+            'user_id INTEGER NOT NULL, '
+            'document TSVECTOR NOT NULL)'
+        ))
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_post_search_document ON post_search USING GIN (document)'
+        ))
+
+    def teardown(self, connection):
+        connection.execute(text('DROP TABLE IF EXISTS post_search'))
+
+    def index(self, connection, rows):
+        if not rows:
+            return
+        connection.execute(text(
+            'INSERT INTO post_search (post_id, user_id, document) '
+            f'VALUES (:id, :user_id, {self.DOCUMENT}) '
+            'ON CONFLICT (post_id) DO UPDATE '
+            'SET user_id = EXCLUDED.user_id, document = EXCLUDED.document'
+        ), rows)
+
+    def remove(self, connection, post_ids):
+        connection.execute(text('DELETE FROM post_search WHERE post_id = ANY(:ids)'),
+                           {'ids': list(post_ids)})
+
+    def statement(self, user_id, words, limit, offset):
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        return self._text(
+            "SELECT post.id, post.title, post.excerpt, post.content_length, post.created_at, post.user_id, "
+            "post.comment_count, post.content "
+            "FROM post_search JOIN post ON post.id = post_search.post_id, "
+            "to_tsquery('english', :tsquery) AS q "
+            "WHERE post_search.user_id = :user_id AND post_search.document @@ q "
+            "ORDER BY ts_rank(post_search.document, q) DESC, post.id DESC "
+            "LIMIT :limit OFFSET :offset",
+            {'tsquery': tsquery, 'user_id': user_id, 'limit': limit, 'offset': offset}
+        )
+
+
+class LikeSearchBackend(SearchBackend):
+    """Unindexed substring match, for databases without a full-text engine.
+
+    Matches titles and excerpts only: bodies may be stored compressed (see
+    postbody.py), so only their first EXCERPT_CHARS are searchable here.
+    """
+
+    def statement(self, user_id, words, limit, offset):
+        stmt = select(*POST_SUMMARY_COLUMNS, Post.content).where(Post.user_id == user_id)
+        for word in words:
+            pattern = f'%{word}%'
+            stmt = stmt.where(Post.title.ilike(pattern) | Post.excerpt.ilike(pattern))
+        return stmt.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit).offset(offset)
+
+
+BACKENDS = {
+    'fts5': SQLiteFTSBackend,
+    'postgres': PostgresFTSBackend,
+    'like': LikeSearchBackend,
+}
+
+DIALECT_BACKENDS = {
+    'sqlite': 'fts5',
+    'postgresql': 'postgres',
+}
+
+
+def backend_for(dialect_name):
+    name = 'auto'
+    if has_app_context():
+        name = current_app.config.get('SEARCH_BACKEND', 'auto')
+    if name == 'auto':
+        name = DIALECT_BACKENDS.get(dialect_name, 'like')
+    return BACKENDS[name]()
+
+
+def index_posts(connection, rows):
+    """Index posts written without the ORM unit of work (bulk inserts)."""
+    backend_for(connection.dialect.name).index(connection, rows)
+
+
+def unindex_posts(connection, post_ids):
+    """Drop posts deleted without the ORM unit of work (bulk deletes)."""
+    backend_for(connection.dialect.name).remove(connection, post_ids)
+
+
+@job('index_posts')
+def index_posts_job(post_ids):
+    """Index posts from their stored rows; ids deleted in the meantime are skipped."""
+    rows = db.session.execute(
+        select(Post.id, Post.title, Post.content, Post.user_id).where(Post.id.in_(post_ids))
+    ).mappings()
+    index_posts(db.session.connection(), [dict(row) for row in rows])
+
+
+def search_statement(user_id, query, limit, offset, dialect_name):
+    """Ranked, highlighted matches for ``query`` among one user's posts.
+
+    An empty query matches everything, newest first, as the old ILIKE did.
+    """
+    words = terms(query)
+    backend = backend_for(dialect_name) if words else LikeSearchBackend()
+    return backend.statement(user_id, words, limit, offset)
+
+
+def result_row(row, words):
+    """A result for the client: the summary columns plus escaped, marked highlights."""
+    post = row._asdict()
+    post['highlight'] = {'title': highlight(post['title'], words),
+                         'content': highlight(post.pop('content'), words, SNIPPET_TOKENS)}
+    return post
+
+
+def search_posts(user_id, query, limit, offset):
+    stmt = search_statement(user_id, query, limit, offset, db.engine.dialect.name)
+    words = terms(query)
+    return [result_row(row, words) for row in db.session.execute(stmt)]
+
+
+# Keep the index in step with the post table
+
+def _fields(post):
+    return {'id': post.id, 'title': post.title, 'content': post.content, 'user_id': post.user_id}
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    backend_for(connection.dialect.name).setup(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    backend_for(connection.dialect.name).teardown(connection)
+
+
+@event.listens_for(Post, 'after_insert')
+def _index_new_post(mapper, connection, post):
+    index_posts(connection, [_fields(post)])
+
+
+def _text_changed(post):
+    state = inspect(post)
+    return state.attrs.title.history.has_changes() or state.attrs.content.history.has_changes()
+
+
+# Removal runs before the row changes; see SQLiteFTSBackend
+@event.listens_for(Post, 'before_update')
+def _unindex_changed_post(mapper, connection, post):
+    if _text_changed(post):
+        unindex_posts(connection, [post.id])
+
+
+@event.listens_for(Post, 'after_update')
+def _reindex_post(mapper, connection, post):
+    if _text_changed(post):
+        index_posts(connection, [_fields(post)])
+
+
+@event.listens_for(Post, 'before_delete')
+def _unindex_post(mapper, connection, post):
+    unindex_posts(connection, [post.id])
@@ -1,14 +1,7 @@
-from flask import Flask
-from config import Config
-from models import db, User, Post, Comment
-from datetime import datetime
-from werkzeug.security import generate_password_hash
-
-def create_app():
-    app = Flask(__name__)
-    app.config.from_object(Config)
-    db.init_app(app)
-    return app
+from app import create_app
+from models import db
+from bulk import insert_users, insert_posts, insert_comments
+from hashing import password_hasher
 
 def seed_data():
     app = create_app()
@@ -22,41 +15,33 @@ def seed_data():
             {'username': 'alice_wonder', 'email': 'alice@example.com', 'password': 'Password789'}
         ]
 
-        for user_data in users:
-            if not User.query.filter_by(username=user_data['username']).first():
-                user = User(username=user_data['username'], email=user_data['email'])
-                user.set_password(user_data['password'])
-                db.session.add(user)
-        db.session.commit()
+        # The tables were just recreated, so there is nothing to check for
+        # duplicates: each table is written with a single executemany.
+        user_ids = insert_users([
+            {'username': u['username'], 'email': u['email'], 'password_hash': password_hasher.hash(u['password'])}
+            for u in users
+        ])
+        john, jane, alice = user_ids
 
         posts = [
-            {'title': 'My First Blog Post', 'content': 'This is the content of my first blog post. Exciting times!', 'user_id': 1},
-            {'title': 'Learning Flask', 'content': 'Flask is a great framework for building APIs.', 'user_id': 1},
-            {'title': 'React Tips', 'content': 'Here are some tips for building better React applications.', 'user_id': 2},
-            {'title': 'Why I Love Coding', 'content': 'Coding is my passion because it solves real problems.', 'user_id': 3},
-            {'title': 'JWT Authentication', 'content': 'Understanding JWT for secure APIs is crucial.', 'user_id': 2}
+            {'title': 'My First Blog Post', 'content': 'This is the content of my first blog post. Exciting times!', 'user_id': john},
+            {'title': 'Learning Flask', 'content': 'Flask is a great framework for building APIs.', 'user_id': john},
+            {'title': 'React Tips', 'content': 'Here are some tips for building better React applications.', 'user_id': jane},
+            {'title': 'Why I Love Coding', 'content': 'Coding is my passion because it solves real problems.', 'user_id': alice},
+            {'title': 'JWT Authentication', 'content': 'Understanding JWT for secure APIs is crucial.', 'user_id': jane}
         ]
-
-        for post_data in posts:
-            if not Post.query.filter_by(title=post_data['title']).first():
-                post = Post(title=post_data['title'], content=post_data['content'], user_id=post_data['user_id'], created_at=datetime.utcnow())
-                db.session.add(post)
-        db.session.commit()
+        post_ids = insert_posts(posts)
 
         comments = [
-            {'content': 'Great post! Really enjoyed reading it.', 'user_id': 2, 'post_id': 1},
-            {'content': 'Thanks for the Flask tips!', 'user_id': 3, 'post_id': 2},
-            {'content': 'Can you share more React examples?', 'user_id': 1, 'post_id': 3},
-            {'content': 'JWT is tricky but this helped!', 'user_id': 3, 'post_id': 5}
+            {'content': 'Great post! Really enjoyed reading it.', 'user_id': jane, 'post_id': post_ids[0]},
+            {'content': 'Thanks for the Flask tips!', 'user_id': alice, 'post_id': post_ids[1]},
+            {'content': 'Can you share more React examples?', 'user_id': john, 'post_id': post_ids[2]},
+            {'content': 'JWT is tricky but this helped!', 'user_id': alice, 'post_id': post_ids[4]}
         ]
-
-        for comment_data in comments:
-            if not Comment.query.filter_by(content=comment_data['content']).first():
-                comment = Comment(content=comment_data['content'], user_id=comment_data['user_id'], post_id=comment_data['post_id'], created_at=datetime.utcnow())
-                db.session.add(comment)
+        insert_comments(comments)
         db.session.commit()
 
         print("Database seeded successfully!")
 
 if __name__ == '__main__':
-    seed_data()
\ No newline at end of file
+    seed_data()
@@ -0,0 +1,72 @@
+from sqlalchemy import select
+from models import db, Comment, Post, User
+from threads import count_replies, in_subtree, with_reply_counts
+
+# Column projections whose labels match the keys of Post.to_dict() and
+# Comment.to_dict(). Rows are turned into dicts with Row._asdict() and
+# datetimes are left for the JSON provider, so a page of results goes from
+# the cursor to bytes without building model objects.
+# Lists of posts carry the stored excerpt; only a single post reads the body
+POST_SUMMARY_COLUMNS = (
+    Post.id,
+    Post.title,
+    Post.excerpt,
+    Post.content_length,
+    Post.created_at,
+    Post.user_id,
+    Post.comment_count,
+)
+
+POST_COLUMNS = POST_SUMMARY_COLUMNS + (Post.content,)
+
+# The author is joined in rather than lazy-loaded per row
+COMMENT_COLUMNS = (
+    Comment.id,
+    Comment.content,
+    Comment.created_at,
+    Comment.user_id,
+    Comment.post_id,
+    User.username,
+    Comment.parent_id,
+    Comment.depth,
+)
+
+# A post in the global feed also names its author
+FEED_COLUMNS = POST_SUMMARY_COLUMNS + (User.username,)
+
+def row_to_dict(row):
+    return row._asdict()
+
+def select_posts():
+    return db.session.query(*POST_SUMMARY_COLUMNS)
+
+def select_post(id):
+    return db.session.query(*POST_COLUMNS).filter(Post.id == id)
+
+def select_feed():
+    return db.session.query(*FEED_COLUMNS).join(User, Post.user_id == User.id)
+
+def select_thread(post_id, root=None, max_depth=None, after=None):
+    """A post's comments in thread order (depth first, see threads.py).
+
+    ``root`` (a comment's path) keeps only the replies below that comment,
+    ``max_depth`` caps ``Comment.depth`` and ``after`` (a path) continues a
+    paginated read.
+    """
+    stmt = (
+        select(*COMMENT_COLUMNS)
+        .join(User, Comment.user_id == User.id)
+        .where(Comment.post_id == post_id)
+    )
+    if root is not None:
+        stmt = stmt.where(in_subtree(root))
+    if max_depth is not None:
+        stmt = stmt.where(Comment.depth <= max_depth)
+    if after is not None:
+        stmt = stmt.where(Comment.path > after)
+    return stmt.order_by(Comment.path)
+
+def comment_thread(post_id):
+    """Serialize every comment on a post, with reply counts, from a single SELECT."""
+    rows = [row._asdict() for row in db.session.execute(select_thread(post_id))]
+    return with_reply_counts(rows, count_replies(rows))
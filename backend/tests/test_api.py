@@ -1,13 +1,22 @@
+import gzip
+import json
+import re
 import pytest
-from flask import Flask
+from sqlalchemy import event
 from config import Config
-from models import db, User
-from app import app as flask_app
+from datetime import datetime, timedelta
+from models import db, User, Post, Comment, TokenBlocklist, TokenGeneration
+from blocklist import blocklist
+from app import create_app
+from jobs import Worker
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
 
 @pytest.fixture
 def app():
-    flask_app.config['TESTING'] = True
-    flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    flask_app = create_app(TestConfig)
     with flask_app.app_context():
         db.create_all()
         yield flask_app
@@ -75,4 +84,856 @@ def test_create_post(client):
         'content': 'This is a test post.'
     }, headers={'Authorization': f'Bearer {token}'})
     assert response.status_code == 201
-    assert response.json['title'] == 'Test Post'
\ No newline at end of file
+    assert response.json['title'] == 'Test Post'
+
+def auth_headers(client, username='testuser'):
+    response = client.post('/api/register', json={
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': 'Test12345'
+    })
+    return {'Authorization': f"Bearer {response.json['token']['access']}"}
+
+def test_duplicate_username_and_email_rejected_without_lookups(client):
+    auth_headers(client, 'alice')
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.post('/api/register', json={
+            'username': 'ALICE', 'email': 'other@example.com', 'password': 'Test12345'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert (response.status_code, response.json) == (400, {'error': 'Username already in use'})
+    assert [s.split()[0] for s in statements] == ['INSERT']
+
+    response = client.post('/api/register', json={
+        'username': 'bob', 'email': 'Alice@Example.com', 'password': 'Test12345'})
+    assert (response.status_code, response.json) == (400, {'error': 'Email already in use'})
+
+    bob = auth_headers(client, 'bob')
+    response = client.put('/api/profile', json={'username': 'Alice', 'email': 'bob@example.com'}, headers=bob)
+    assert (response.status_code, response.json) == (400, {'error': 'Username already in use'})
+    assert client.get('/api/profile', headers=bob).json['username'] == 'bob'
+    assert client.put('/api/profile', json={'username': 'Bob', 'email': 'bob@example.com'},
+                      headers=bob).status_code == 200
+
+def test_list_posts_keyset_pagination(client):
+    headers = auth_headers(client)
+    for i in range(5):
+        client.post('/api/posts', json={'title': f'Post {i}', 'content': 'Body'}, headers=headers)
+
+    first = client.get('/api/posts?limit=2', headers=headers)
+    assert first.status_code == 200
+    assert [p['title'] for p in first.json] == ['Post 4', 'Post 3']
+    cursor = first.headers['X-Next-Cursor']
+
+    second = client.get(f'/api/posts?limit=2&cursor={cursor}', headers=headers)
+    assert [p['title'] for p in second.json] == ['Post 2', 'Post 1']
+
+    last = client.get(f"/api/posts?limit=2&cursor={second.headers['X-Next-Cursor']}", headers=headers)
+    assert [p['title'] for p in last.json] == ['Post 0']
+    assert 'X-Next-Cursor' not in last.headers
+
+def test_listings_longer_than_a_page_continue_past_it(client, app):
+    headers = auth_headers(client)
+    page_size = app.config['POSTS_PAGE_SIZE']
+    client.post('/api/posts/batch', json=[{'title': f'Post {i}', 'content': 'Flask'} for i in range(page_size + 5)],
+                headers=headers)
+    Worker(app).drain()
+
+    seen, url = [], '/api/posts'
+    while url:
+        response = client.get(url, headers=headers)
+        seen += [p['title'] for p in response.json]
+        cursor = response.headers.get('X-Next-Cursor')
+        url = cursor and f'/api/posts?cursor={cursor}'
+    assert len(seen) == len(set(seen)) == page_size + 5
+
+    first = client.get('/api/search?q=flask', headers=headers)
+    assert len(first.json) == page_size and first.headers['X-Next-Page'] == '2'
+    second = client.get('/api/search?q=flask&page=2', headers=headers)
+    assert len(second.json) == 5 and 'X-Next-Page' not in second.headers
+
+def test_list_posts_invalid_cursor(client):
+    headers = auth_headers(client)
+    response = client.get('/api/posts?cursor=not-a-cursor', headers=headers)
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid cursor'
+
+def test_list_posts_ndjson_stream(client):
+    headers = auth_headers(client)
+    for i in range(3):
+        client.post('/api/posts', json={'title': f'Post {i}', 'content': 'Body'}, headers=headers)
+
+    response = client.get('/api/posts', headers={**headers, 'Accept': 'application/x-ndjson'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['title'] for line in lines] == ['Post 2', 'Post 1', 'Post 0']
+
+def test_comment_thread_query_count_is_constant(client, app):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Thread', 'content': 'Body'}, headers=headers).json['id']
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def queries_for_thread():
+        statements.clear()
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            response = client.get(f'/api/comments/{post_id}', headers=headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        assert response.status_code == 200
+        return len(statements), response.json
+
+    client.post(f'/api/comments/{post_id}', json={'content': 'First'}, headers=headers)
+    short_count, short_thread = queries_for_thread()
+
+    for i in range(10):
+        commenter = User(username=f'commenter{i}', email=f'commenter{i}@example.com', password_hash='x')
+        db.session.add(commenter)
+        db.session.flush()
+        db.session.add(Comment(content=f'Reply {i}', user_id=commenter.id, post_id=post_id))
+    db.session.commit()
+    long_count, long_thread = queries_for_thread()
+
+    assert len(short_thread) == 1
+    assert len(long_thread) == 11
+    assert long_thread[-1]['username'] == 'commenter9'
+    assert long_count == short_count
+
+def test_threaded_comments_read_as_ranges(client, app):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Thread', 'content': 'Body'}, headers=headers).json['id']
+    url = f'/api/comments/{post_id}'
+
+    def comment(content, parent_id=None):
+        response = client.post(url, json={'content': content, 'parent_id': parent_id}, headers=headers)
+        assert response.status_code == 201, response.json
+        return response.json['id']
+
+    a = comment('a')
+    b = comment('b')
+    a1 = comment('a1', a)
+    a1x = comment('a1x', a1)
+    a2 = comment('a2', a)
+    b1 = comment('b1', b)
+
+    thread = client.get(url, headers=headers).json
+    assert [c['content'] for c in thread] == ['a', 'a1', 'a1x', 'a2', 'b', 'b1']
+    assert [(c['depth'], c['parent_id'], c['reply_count']) for c in thread[:3]] == [(0, None, 2), (1, a, 1), (2, a1, 0)]
+
+    top = client.get(f'{url}?depth=1', headers=headers).json
+    assert [(c['content'], c['reply_count']) for c in top] == [('a', 2), ('b', 1)]
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        subtree = client.get(f'{url}?parent={a}', headers=headers).json
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert [c['content'] for c in subtree] == ['a1', 'a1x', 'a2']
+    assert len([s for s in statements if 'comment' in s]) == 3  # version, parent, subtree
+
+    first = client.get(f'{url}?parent={a}&depth=1&limit=1', headers=headers)
+    assert [c['content'] for c in first.json] == ['a1'] and first.json[0]['reply_count'] == 1
+    second = client.get(f"{url}?parent={a}&depth=1&limit=1&cursor={first.headers['X-Next-Cursor']}", headers=headers)
+    assert [c['content'] for c in second.json] == ['a2'] and 'X-Next-Cursor' not in second.headers
+
+    streamed = client.get(f'{url}?parent={b}', headers={**headers, 'Accept': 'application/x-ndjson'})
+    assert [json.loads(line)['id'] for line in streamed.data.decode().splitlines()] == [b1]
+
+    assert client.get(f'{url}?parent=999', headers=headers).status_code == 404
+    assert client.get(f'{url}?cursor=nope', headers=headers).status_code == 400
+    assert client.post(url, json={'content': 'x', 'parent_id': 999}, headers=headers).status_code == 404
+    app.config['COMMENT_MAX_DEPTH'] = 2
+    response = client.post(url, json={'content': 'too deep', 'parent_id': a1x}, headers=headers)
+    assert (response.status_code, response.json) == (400, {'error': 'Replies can be nested at most 2 levels deep'})
+
+def test_partial_thread_of_a_missing_post_is_404(client):
+    headers = auth_headers(client)
+    whole = client.get('/api/comments/999', headers=headers)
+    assert whole.status_code == 404
+    for query in ('depth=1', 'parent=1', 'limit=5', 'cursor=0000000001', 'format=ndjson'):
+        response = client.get(f'/api/comments/999?{query}', headers=headers)
+        assert (response.status_code, response.json) == (404, whole.json)
+
+def test_deleting_a_comment_takes_its_replies_and_counts(client, app):
+    from counters import reconcile
+    alice, bob = auth_headers(client, 'alice'), auth_headers(client, 'bob')
+    post_id = client.post('/api/posts', json={'title': 'Thread', 'content': 'Body'}, headers=alice).json['id']
+    url = f'/api/comments/{post_id}'
+    root = client.post(url, json={'content': 'root'}, headers=alice).json['id']
+    reply = client.post(url, json={'content': 'reply', 'parent_id': root}, headers=bob).json['id']
+    client.post(url, json={'content': 'nested', 'parent_id': reply}, headers=alice)
+    keep = client.post(url, json={'content': 'keep'}, headers=bob).json['id']
+
+    assert client.delete(f'{url}/{reply}', headers=bob).status_code == 200
+    assert [c['content'] for c in client.get(url, headers=alice).json] == ['root', 'keep']
+    assert client.get(f'/api/posts/{post_id}', headers=alice).json['comment_count'] == 2
+
+    # Bob's account goes, and Alice's reply to his comment with it
+    client.post(url, json={'content': 'to bob', 'parent_id': keep}, headers=alice)
+    assert client.delete('/api/profile', headers=bob).status_code == 200
+    assert [c['content'] for c in client.get(url, headers=alice).json] == ['root']
+    assert client.get('/api/profile', headers=alice).json['comment_count'] == 1
+    assert set(reconcile().values()) == {0}
+
+def test_logout_revokes_token(client):
+    headers = auth_headers(client)
+    assert client.get('/api/profile', headers=headers).status_code == 200
+    assert client.post('/api/logout', headers=headers).status_code == 200
+    response = client.get('/api/profile', headers=headers)
+    assert response.status_code == 401
+
+def test_blocklist_check_served_from_cache(client):
+    headers = auth_headers(client)
+    client.get('/api/profile', headers=headers)
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        for _ in range(3):
+            assert client.get('/api/profile', headers=headers).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert not [s for s in statements if 'token_blocklist' in s]
+
+def test_blocklist_prune_drops_expired_rows(app):
+    old = datetime.utcnow() - app.config['JWT_REFRESH_TOKEN_EXPIRES'] - timedelta(minutes=1)
+    db.session.add(TokenBlocklist(jti='expired', created_at=old))
+    db.session.add(TokenBlocklist(jti='current', created_at=datetime.utcnow()))
+    db.session.commit()
+    blocklist.add('expired', old)
+
+    assert blocklist.prune() == 1
+    assert [t.jti for t in TokenBlocklist.query.all()] == ['current']
+    assert not blocklist.is_revoked('expired')
+    assert blocklist.is_revoked('current')
+
+def test_blocklist_sync_sees_revocations_committed_out_of_order(app):
+    now = datetime.utcnow()
+    db.session.add(TokenBlocklist(id=2, jti='committed-first', created_at=now))
+    db.session.commit()
+    blocklist.sync()
+    assert blocklist.is_revoked('committed-first')
+
+    # A lower id (and an earlier created_at) from a transaction that committed later
+    db.session.add(TokenBlocklist(id=1, jti='committed-late', created_at=now - timedelta(seconds=2)))
+    db.session.commit()
+    blocklist.sync()
+    assert blocklist.is_revoked('committed-late')
+
+def test_generation_sync_sees_bumps_committed_out_of_order(app):
+    alice = User(username='alice', email='alice@example.com', password_hash='x')
+    bob = User(username='bob', email='bob@example.com', password_hash='x')
+    db.session.add_all([alice, bob])
+    db.session.commit()
+    now = datetime.utcnow()
+    db.session.add(TokenGeneration(id=2, user_id=bob.id, generation=1, created_at=now))
+    db.session.commit()
+    blocklist.sync()
+    assert blocklist.is_revoked('bob-token', bob.id, 0)
+
+    db.session.add(TokenGeneration(id=1, user_id=alice.id, generation=1, created_at=now - timedelta(seconds=2)))
+    db.session.commit()
+    blocklist.sync()
+    assert blocklist.is_revoked('alice-token', alice.id, 0)
+    assert not blocklist.is_revoked('alice-new-token', alice.id, 1)
+
+@pytest.fixture
+def stateless_client(app):
+    app.config['JWT_STATELESS_TOKENS'] = True
+    return app.test_client()
+
+def test_stateless_tokens_serve_profile_from_claims(stateless_client):
+    client = stateless_client
+    tokens = client.post('/api/register', json={
+        'username': 'testuser', 'email': 'testuser@example.com', 'password': 'Test12345'
+    }).json['token']
+    headers = {'Authorization': f"Bearer {tokens['access']}"}
+    client.get('/api/profile', headers=headers)
+
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get('/api/profile', headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.json['username'] == 'testuser'
+    assert response.json['email'] == 'testuser@example.com'
+    assert len(statements) == 1 and 'password_hash' not in statements[0]
+
+    # Renaming retires the token carrying the old claims; a refresh mints new ones
+    client.put('/api/profile', json={'username': 'renamed', 'email': 'renamed@example.com'}, headers=headers)
+    assert client.get('/api/profile', headers=headers).status_code == 401
+    refreshed = client.post('/api/refresh', headers={'Authorization': f"Bearer {tokens['refresh']}"})
+    headers = {'Authorization': f"Bearer {refreshed.json['access_token']}"}
+    assert client.get('/api/profile', headers=headers).json['username'] == 'renamed'
+
+    assert client.post('/api/logout', headers=headers).status_code == 200
+    assert client.get('/api/profile', headers=headers).status_code == 401
+
+def test_stateless_revocations_from_other_workers_apply_after_sync(app, stateless_client):
+    headers = auth_headers(stateless_client)
+    assert stateless_client.get('/api/profile', headers=headers).status_code == 200
+
+    user = User.query.one()
+    user.token_generation = 1
+    db.session.add(TokenGeneration(user_id=user.id, generation=1, created_at=datetime.utcnow()))
+    db.session.commit()
+    assert stateless_client.get('/api/profile', headers=headers).status_code == 200
+    blocklist.sync()
+    assert stateless_client.get('/api/profile', headers=headers).status_code == 401
+    # Fresh logins carry the new generation
+    login = stateless_client.post('/api/login', json={'username': 'testuser', 'password': 'Test12345'})
+    fresh = {'Authorization': f"Bearer {login.json['token']['access']}"}
+    assert stateless_client.get('/api/profile', headers=fresh).status_code == 200
+
+def test_search_ranks_and_highlights(client):
+    headers = auth_headers(client)
+    client.post('/api/posts', json={'title': 'Gardening', 'content': 'Notes about flask of tea'}, headers=headers)
+    client.post('/api/posts', json={'title': 'Flask tips', 'content': 'Blueprints in Flask'}, headers=headers)
+    client.post('/api/posts', json={'title': 'Cooking', 'content': 'Nothing relevant'}, headers=headers)
+
+    response = client.get('/api/search?q=flask', headers=headers)
+    assert response.status_code == 200
+    assert [p['title'] for p in response.json] == ['Flask tips', 'Gardening']
+    assert response.json[0]['highlight']['title'] == '<mark>Flask</mark> tips'
+
+    paged = client.get('/api/search?q=flask&limit=1', headers=headers)
+    assert len(paged.json) == 1
+    assert paged.headers['X-Next-Page'] == '2'
+
+def test_search_index_follows_updates_and_deletes(client):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Draft', 'content': 'alpha'}, headers=headers).json['id']
+    assert len(client.get('/api/search?q=alpha', headers=headers).json) == 1
+
+    client.put(f'/api/posts/{post_id}', json={'title': 'Draft', 'content': 'beta'}, headers=headers)
+    assert client.get('/api/search?q=alpha', headers=headers).json == []
+    assert len(client.get('/api/search?q=beta', headers=headers).json) == 1
+
+    client.delete(f'/api/posts/{post_id}', headers=headers)
+    assert client.get('/api/search?q=beta', headers=headers).json == []
+
+def test_search_highlights_are_escaped(client):
+    headers = auth_headers(client)
+    client.post('/api/posts', json={'title': '<script>alert(1)</script> flask',
+                                    'content': 'Use <b>flask</b> & friends'}, headers=headers)
+
+    highlight = client.get('/api/search?q=flask', headers=headers).json[0]['highlight']
+    assert highlight['title'] == '&lt;script&gt;alert(1)&lt;/script&gt; <mark>flask</mark>'
+    assert highlight['content'] == 'Use &lt;b&gt;<mark>flask</mark>&lt;/b&gt; &amp; friends'
+
+def test_search_index_keeps_no_copy_of_posts(client, app):
+    headers = auth_headers(client)
+    long_body = 'gamma ' + 'filler words ' * 200 + 'delta'
+    post_id = client.post('/api/posts', json={'title': 'Long', 'content': long_body}, headers=headers).json['id']
+    if db.engine.dialect.name == 'sqlite':
+        assert db.session.execute(db.text('SELECT title, content FROM post_search')).all() == [(None, None)]
+
+    content = client.get('/api/search?q=delta', headers=headers).json[0]['highlight']['content']
+    assert content.startswith('…') and content.endswith('<mark>delta</mark>')
+    client.put(f'/api/posts/{post_id}', json={'title': 'Long', 'content': 'epsilon'}, headers=headers)
+    assert client.get('/api/search?q=gamma', headers=headers).json == []
+    assert len(client.get('/api/search?q=epsilon', headers=headers).json) == 1
+
+def test_like_search_matches_titles_and_excerpts(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'SEARCH_BACKEND', 'like')
+    headers = auth_headers(client)
+    body = 'Brewing with a kettle. ' + 'filler words ' * 200 + 'teapot'
+    client.post('/api/posts', json={'title': 'Tea', 'content': body}, headers=headers)
+
+    results = client.get('/api/search?q=kettle', headers=headers).json
+    assert [p['title'] for p in results] == ['Tea']
+    assert results[0]['highlight']['content'].startswith('Brewing with a <mark>kettle</mark>.')
+    # Past the excerpt the body is compressed and not searched
+    assert client.get('/api/search?q=teapot', headers=headers).json == []
+
+def test_login_upgrades_password_hash(client, app, monkeypatch):
+    auth_headers(client)
+    assert User.query.filter_by(username='testuser').one().password_hash.startswith('scrypt:')
+
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    credentials = {'username': 'testuser', 'password': 'Test12345'}
+    assert client.post('/api/login', json=credentials).status_code == 200
+    db.session.expire_all()
+    assert User.query.filter_by(username='testuser').one().password_hash.startswith('pbkdf2:sha256:1000$')
+    assert client.post('/api/login', json=credentials).status_code == 200
+
+def test_shorthand_hash_methods_do_not_rehash_every_login(client, app, monkeypatch):
+    auth_headers(client)
+    credentials = {'username': 'testuser', 'password': 'Test12345'}
+    # Stored expanded, as 'scrypt:32768:8:1'
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'scrypt')
+    stored = User.query.filter_by(username='testuser').one().password_hash
+    assert client.post('/api/login', json=credentials).status_code == 200
+    db.session.expire_all()
+    assert User.query.filter_by(username='testuser').one().password_hash == stored
+
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    assert client.post('/api/login', json=credentials).status_code == 200
+    db.session.expire_all()
+    upgraded = User.query.filter_by(username='testuser').one().password_hash
+    assert upgraded.startswith('pbkdf2:sha256:')
+    assert client.post('/api/login', json=credentials).status_code == 200
+    db.session.expire_all()
+    assert User.query.filter_by(username='testuser').one().password_hash == upgraded
+
+def test_create_app_does_not_touch_database(tmp_path):
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path}/blog.db'
+
+    flask_app = create_app(FileConfig)
+    assert not (tmp_path / 'blog.db').exists()
+
+    result = flask_app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0
+    with flask_app.app_context():
+        assert 'user' in db.inspect(db.engine).get_table_names()
+
+def test_each_route_is_registered_once(app):
+    from blueprints import route_conflicts
+    assert route_conflicts(app) == {}
+    methods = {rule.rule: rule.methods for rule in app.url_map.iter_rules()}
+    assert {'GET', 'POST'} <= methods['/api/posts']
+    assert {'POST'} <= methods['/api/register']
+
+def test_duplicate_route_is_reported_at_startup(monkeypatch):
+    import blueprints
+    from flask import Blueprint
+    from flask_restful import Api
+    from blueprints.posts import PostEndpoint
+
+    duplicate_bp = Blueprint('duplicate', __name__)
+    Api(duplicate_bp).add_resource(PostEndpoint, '/posts')
+    monkeypatch.setattr(blueprints, 'BLUEPRINTS', blueprints.BLUEPRINTS + (duplicate_bp,))
+    with pytest.raises(blueprints.RouteConflictError, match='/api/posts'):
+        create_app(TestConfig)
+
+def test_batch_create_posts(client):
+    headers = auth_headers(client)
+    response = client.post('/api/posts/batch', json=[
+        {'title': 'One', 'content': 'first'},
+        {'title': 'Two'},
+        {'title': 'Three', 'content': 'third'},
+    ], headers=headers)
+    assert response.status_code == 207
+    assert response.json['created'] == 2
+    results = response.json['results']
+    assert [r['status'] for r in results] == [201, 400, 201]
+    assert results[1]['error'] == 'Title and content are required'
+
+    titles = {p['id']: p['title'] for p in client.get('/api/posts', headers=headers).json}
+    assert titles == {results[0]['id']: 'One', results[2]['id']: 'Three'}
+    # Search indexing of a batch is left to a job
+    Worker(client.application).drain()
+    assert len(client.get('/api/search?q=third', headers=headers).json) == 1
+
+def test_large_post_bodies_stored_compressed_and_listed_as_excerpts(client):
+    headers = auth_headers(client)
+    body = 'Flask and SQLAlchemy. ' * 300
+    post_id = client.post('/api/posts', json={'title': 'Long', 'content': body}, headers=headers).json['id']
+    client.post('/api/posts/batch', json=[{'title': 'Short', 'content': 'Brief'}], headers=headers)
+
+    stored = dict(db.session.execute(db.text('SELECT title, content FROM post')).all())
+    assert stored['Short'] == b'Brief'
+    assert stored['Long'].startswith(b'\xff') and len(stored['Long']) < len(body) // 10
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        listed = client.get('/api/posts', headers=headers).json
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert not any(re.search(r'post\.content\b', s) for s in statements)
+    assert [(p['title'], p['content_length'], 'content' in p) for p in listed] == \
+        [('Short', 5, False), ('Long', len(body), False)]
+    excerpt = listed[1]['excerpt']
+    assert excerpt.endswith(' and…') and body.startswith(excerpt[:-1]) and len(excerpt) <= 281
+    assert listed[0]['excerpt'] == 'Brief'
+    assert client.get('/api/search?q=sqlalchemy', headers=headers).json[0]['excerpt'] == listed[1]['excerpt']
+
+    assert client.get(f'/api/posts/{post_id}', headers=headers).json['content'] == body
+    updated = client.put(f'/api/posts/{post_id}', json={'title': 'Long', 'content': 'Now short'}, headers=headers).json
+    assert (updated['excerpt'], updated['content_length'], updated['content']) == ('Now short', 9, 'Now short')
+
+def test_post_title_and_content_must_be_strings(client):
+    headers = auth_headers(client)
+    for body in ({'title': 'T', 'content': 5}, {'title': 'T', 'content': ['a']}, {'title': 7, 'content': 'Body'}):
+        response = client.post('/api/posts', json=body, headers=headers)
+        assert (response.status_code, response.json) == (400, {'error': 'Title and content must be strings'})
+
+    post_id = client.post('/api/posts', json={'title': 'T', 'content': 'Body'}, headers=headers).json['id']
+    assert client.put(f'/api/posts/{post_id}', json={'title': 'T', 'content': {'a': 1}}, headers=headers).status_code == 400
+    assert client.get(f'/api/posts/{post_id}', headers=headers).json['content'] == 'Body'
+
+    response = client.post('/api/posts/batch', json=[{'title': 'T', 'content': 5}, {'title': 'U', 'content': 'ok'}],
+                           headers=headers)
+    assert [(r['status'], r.get('error')) for r in response.json['results']] == \
+        [(400, 'Title and content must be strings'), (201, None)]
+
+def test_batch_create_comments(client):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Thread', 'content': 'Body'}, headers=headers).json['id']
+    response = client.post('/api/comments/batch', json=[
+        {'post_id': post_id, 'content': 'a'},
+        {'post_id': post_id, 'content': 'b'},
+        {'post_id': 999, 'content': 'c'},
+    ], headers=headers)
+    assert response.status_code == 207
+    assert [r['status'] for r in response.json['results']] == [201, 201, 404]
+    thread = client.get(f'/api/comments/{post_id}', headers=headers).json
+    assert [c['content'] for c in thread] == ['a', 'b']
+
+def test_batch_comments_validate_item_types(client):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Thread', 'content': 'Body'}, headers=headers).json['id']
+    response = client.post('/api/comments/batch', json=[
+        {'post_id': [post_id], 'content': 'a'},
+        {'post_id': True, 'content': 'b'},
+        {'post_id': post_id, 'content': {'a': 1}},
+        {'post_id': post_id, 'content': 123},
+        {'post_id': post_id, 'content': 'ok'},
+    ], headers=headers)
+    assert response.status_code == 207
+    assert [(r['status'], r.get('error')) for r in response.json['results']] == [
+        (400, 'post_id must be an integer'), (400, 'post_id must be an integer'),
+        (400, 'Content must be a string'), (400, 'Content must be a string'), (201, None)]
+    assert [c['content'] for c in client.get(f'/api/comments/{post_id}', headers=headers).json] == ['ok']
+
+    response = client.post(f'/api/comments/{post_id}', json={'content': 123}, headers=headers)
+    assert (response.status_code, response.json) == (400, {'error': 'Content must be a string'})
+
+def test_batch_rejects_non_array(client):
+    headers = auth_headers(client)
+    response = client.post('/api/posts/batch', json={'title': 'One'}, headers=headers)
+    assert response.status_code == 400
+
+def test_conditional_get_post(client, app):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=headers).json['id']
+    first = client.get(f'/api/posts/{post_id}', headers=headers)
+    etag = first.headers['ETag']
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            cached = client.get(f'/api/posts/{post_id}', headers={**headers, 'If-None-Match': etag})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+    assert cached.status_code == 304
+    assert cached.data == b''
+    # Only the version lookup runs; the content column is never read
+    assert len(statements) == 1 and 'content' not in statements[0]
+
+
+    with app.app_context():
+        db.session.execute(db.update(Post).where(Post.id == post_id).values(updated_at=datetime(2100, 1, 1)))
+        db.session.commit()
+    changed = client.get(f'/api/posts/{post_id}', headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+def test_counter_changes_are_never_answered_304_by_date(client):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=headers).json['id']
+    post = client.get(f'/api/posts/{post_id}', headers=headers)
+    profile = client.get('/api/profile', headers=headers)
+    # updated_at stays put when only a counter moves, so it is not sent
+    assert 'Last-Modified' not in post.headers and 'Last-Modified' not in profile.headers
+
+    client.post(f'/api/comments/{post_id}', json={'content': 'Nice'}, headers=headers)
+    client.post('/api/posts', json={'title': 'Second', 'content': 'Post'}, headers=headers)
+    since = {**headers, 'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}
+    assert client.get(f'/api/posts/{post_id}', headers=since).json['comment_count'] == 1
+    assert client.get('/api/profile', headers=since).json['post_count'] == 2
+    assert client.get('/api/profile', headers={**headers, 'If-None-Match': profile.headers['ETag']}).status_code == 200
+
+def test_conditional_get_comments_and_profile(client):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=headers).json['id']
+    etag = client.get(f'/api/comments/{post_id}', headers=headers).headers['ETag']
+    assert client.get(f'/api/comments/{post_id}', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    comment_id = client.post(f'/api/comments/{post_id}', json={'content': 'Nice'}, headers=headers).json['id']
+    after_insert = client.get(f'/api/comments/{post_id}', headers={**headers, 'If-None-Match': etag})
+    assert after_insert.status_code == 200
+    client.delete(f'/api/comments/{post_id}/{comment_id}', headers=headers)
+    after_delete = client.get(f'/api/comments/{post_id}', headers={**headers, 'If-None-Match': after_insert.headers['ETag']})
+    assert after_delete.status_code == 200
+    assert client.get('/api/comments/999', headers={**headers, 'If-None-Match': etag}).status_code == 404
+
+    profile = client.get('/api/profile', headers=headers)
+    assert client.get('/api/profile', headers={**headers, 'If-None-Match': profile.headers['ETag']}).status_code == 304
+    client.put('/api/profile', json={'username': 'renamed', 'email': 'renamed@example.com'}, headers=headers)
+    assert client.get('/api/profile', headers={**headers, 'If-None-Match': profile.headers['ETag']}).status_code == 200
+
+def test_responses_compressed_when_the_client_accepts_it(client):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Long', 'content': 'word ' * 1000}, headers=headers).json['id']
+    url = f'/api/posts/{post_id}'
+    plain = client.get(url, headers=headers)
+    assert 'Content-Encoding' not in plain.headers
+
+    packed = client.get(url, headers={**headers, 'Accept-Encoding': 'gzip, deflate'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in packed.headers['Vary']
+    assert int(packed.headers['Content-Length']) < len(plain.data) // 10
+    assert json.loads(gzip.decompress(packed.data)) == plain.json
+    # Same tag, weak, and it still revalidates
+    assert packed.headers['ETag'] == f"W/{plain.headers['ETag']}"
+    assert client.get(url, headers={**headers, 'Accept-Encoding': 'gzip',
+                                    'If-None-Match': packed.headers['ETag']}).status_code == 304
+
+    assert 'Content-Encoding' not in client.get(url, headers={**headers, 'Accept-Encoding': 'gzip;q=0'}).headers
+    assert 'Content-Encoding' not in client.get('/api/profile', headers={**headers, 'Accept-Encoding': 'gzip'}).headers
+
+def test_deleting_an_older_comment_is_not_answered_304_by_date(client):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=headers).json['id']
+    url = f'/api/comments/{post_id}'
+    first = client.post(url, json={'content': 'First'}, headers=headers).json['id']
+    client.post(url, json={'content': 'Second'}, headers=headers)
+    assert 'Last-Modified' not in client.get(url, headers=headers).headers
+
+    client.delete(f'{url}/{first}', headers=headers)
+    since = client.get(url, headers={**headers, 'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert since.status_code == 200
+    assert [c['content'] for c in since.json] == ['Second']
+
+def test_post_and_thread_reads_are_cached_until_written(client, app):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=headers).json['id']
+    client.post(f'/api/comments/{post_id}', json={'content': 'First'}, headers=headers)
+    client.get(f'/api/posts/{post_id}', headers=headers)
+    client.get(f'/api/comments/{post_id}', headers=headers)
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        assert client.get(f'/api/posts/{post_id}', headers=headers).json['title'] == 'Hello'
+        assert len(client.get(f'/api/comments/{post_id}', headers=headers).json) == 1
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    # Only the two conditional-GET version lookups reach the database
+    assert len(statements) == 2
+
+    client.put(f'/api/posts/{post_id}', json={'title': 'Edited', 'content': 'World'}, headers=headers)
+    assert client.get(f'/api/posts/{post_id}', headers=headers).json['title'] == 'Edited'
+    client.post('/api/comments/batch', json=[{'post_id': post_id, 'content': 'Second'}], headers=headers)
+    assert len(client.get(f'/api/comments/{post_id}', headers=headers).json) == 2
+
+    stats = client.get('/api/_cache', headers=headers).json
+    assert (stats['hits'], stats['misses']) == (2, 4)
+
+def test_cached_bodies_follow_changes_made_elsewhere(client):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=headers).json['id']
+    client.post(f'/api/comments/{post_id}', json={'content': 'First'}, headers=headers)
+    post = client.get(f'/api/posts/{post_id}', headers=headers)
+    thread = client.get(f'/api/comments/{post_id}', headers=headers)
+
+    # As another worker (or a read racing this commit) would see it: no
+    # invalidation reaches this process's cache
+    db.session.execute(db.text("UPDATE post SET title = 'Raw', updated_at = :now WHERE id = :id"),
+                       {'now': datetime.utcnow() + timedelta(seconds=1), 'id': post_id})
+    db.session.execute(db.text("UPDATE comment SET content = 'Edited', updated_at = :now"),
+                       {'now': datetime.utcnow() + timedelta(seconds=1)})
+    db.session.commit()
+
+    response = client.get(f'/api/posts/{post_id}', headers={**headers, 'If-None-Match': post.headers['ETag']})
+    assert (response.status_code, response.json['title']) == (200, 'Raw')
+    response = client.get(f'/api/comments/{post_id}', headers={**headers, 'If-None-Match': thread.headers['ETag']})
+    assert (response.status_code, response.json[0]['content']) == (200, 'Edited')
+
+def test_cached_post_is_still_private(client):
+    owner = auth_headers(client, 'owner')
+    post_id = client.post('/api/posts', json={'title': 'Mine', 'content': 'Secret'}, headers=owner).json['id']
+    client.get(f'/api/posts/{post_id}', headers=owner)
+    other = auth_headers(client, 'other')
+    assert client.get(f'/api/posts/{post_id}', headers=other).status_code == 404
+
+def test_rolled_back_writes_do_not_invalidate(app):
+    from cache import response_cache, FEED_KEY
+    user = User(username='u', email='u@example.com', password_hash='x')
+    post = Post(title='t', content='c', author=user)
+    db.session.add(post)
+    db.session.commit()
+    key = FEED_KEY
+    response_cache.backend.set(key, {'posts': []})
+
+    post.title = 'changed'
+    db.session.flush()
+    db.session.rollback()
+    assert response_cache.backend.get(key)[0]
+
+    post.title = 'changed'
+    db.session.commit()
+    assert not response_cache.backend.get(key)[0]
+
+def test_metrics_report_queries_and_latency_per_endpoint(client):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=headers).json['id']
+    client.get(f'/api/comments/{post_id}', headers=headers)
+
+    body = client.get('/api/_metrics').get_data(as_text=True)
+    assert 'http_requests_total{endpoint="comments.commentendpoint",method="GET",status="200"} 1' in body
+    assert 'http_request_queries_count{endpoint="comments.commentendpoint"} 1' in body
+    assert 'http_request_duration_seconds_bucket{endpoint="posts.postendpoint",le="+Inf"} 1' in body
+    assert 'http_request_serialize_seconds_sum{endpoint="comments.commentendpoint"}' in body
+    assert 'response_cache_misses_total' in body
+
+    remote = client.get('/api/_metrics', environ_base={'REMOTE_ADDR': '203.0.113.9'})
+    assert remote.status_code == 404
+
+def test_slow_requests_are_logged_with_sql(client, app, caplog):
+    headers = auth_headers(client)
+    app.config['SLOW_REQUEST_SECONDS'] = 1e-9
+    with caplog.at_level('WARNING'):
+        client.get('/api/posts', headers=headers)
+    record = next(r for r in caplog.records if r.getMessage().startswith('Slow request GET /api/posts'))
+    assert 'FROM post' in record.getMessage()
+
+def test_deleting_a_post_removes_its_comments_in_bounded_statements(client, app):
+    headers = auth_headers(client)
+    post_id = client.post('/api/posts', json={'title': 'Busy', 'content': 'Thread'}, headers=headers).json['id']
+    client.post('/api/comments/batch', json=[{'post_id': post_id, 'content': f'c{i}'} for i in range(500)], headers=headers)
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        assert client.delete(f'/api/posts/{post_id}', headers=headers).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert len(statements) <= 8
+    assert Comment.query.filter_by(post_id=post_id).count() == 0
+    assert client.get('/api/search?q=busy', headers=headers).json == []
+    assert client.delete(f'/api/posts/{post_id}', headers=headers).status_code == 404
+
+def test_database_cascades_post_deletes(app):
+    user = User(username='u', email='u@example.com', password_hash='x')
+    post = Post(title='t', content='c', author=user)
+    db.session.add(Comment(content='c', author=user, post=post))
+    db.session.commit()
+    db.session.execute(db.text('DELETE FROM post'))
+    assert db.session.execute(db.text('SELECT count(*) FROM comment')).scalar() == 0
+
+def test_batch_delete_only_removes_own_posts(client):
+    owner = auth_headers(client, 'owner')
+    other = auth_headers(client, 'other')
+    mine = client.post('/api/posts/batch', json=[{'title': 'a', 'content': 'a'}, {'title': 'b', 'content': 'b'}], headers=owner).json
+    theirs = client.post('/api/posts', json={'title': 'c', 'content': 'c'}, headers=other).json['id']
+    ids = [r['id'] for r in mine['results']] + [theirs]
+
+    response = client.delete('/api/posts/batch', json=ids, headers=owner)
+    assert response.json == {'deleted': 2}
+    assert client.get(f'/api/posts/{theirs}', headers=other).status_code == 200
+    assert client.delete('/api/posts/batch', json=['x'], headers=owner).status_code == 400
+
+def test_delete_account_removes_posts_comments_and_token(client):
+    leaving = auth_headers(client, 'leaving')
+    staying = auth_headers(client, 'staying')
+    own_post = client.post('/api/posts', json={'title': 'Mine', 'content': 'x'}, headers=leaving).json['id']
+    other_post = client.post('/api/posts', json={'title': 'Theirs', 'content': 'y'}, headers=staying).json['id']
+    client.post(f'/api/comments/{own_post}', json={'content': 'reply'}, headers=staying)
+    client.post(f'/api/comments/{other_post}', json={'content': 'hello'}, headers=leaving)
+    client.get(f'/api/comments/{other_post}', headers=staying)
+
+    assert client.delete('/api/profile', headers=leaving).status_code == 200
+    assert client.get('/api/profile', headers=leaving).status_code == 401
+    assert User.query.filter_by(username='leaving').count() == 0
+    assert db.session.get(Post, own_post) is None
+    assert Comment.query.count() == 0
+    assert client.get(f'/api/comments/{other_post}', headers=staying).json == []
+
+def test_counters_follow_inserts_and_deletes(client):
+    alice = auth_headers(client, 'alice')
+    bob = auth_headers(client, 'bob')
+    post_id = client.post('/api/posts', json={'title': 'Hello', 'content': 'World'}, headers=alice).json['id']
+    client.post('/api/posts/batch', json=[{'title': 'a', 'content': 'a'}, {'title': 'b', 'content': 'b'}], headers=alice)
+    comment_id = client.post(f'/api/comments/{post_id}', json={'content': 'one'}, headers=bob).json['id']
+    client.post('/api/comments/batch', json=[{'post_id': post_id, 'content': 'two'},
+                                             {'post_id': post_id, 'content': 'three'}], headers=bob)
+
+    assert client.get(f'/api/posts/{post_id}', headers=alice).json['comment_count'] == 3
+    assert [p['comment_count'] for p in client.get('/api/posts', headers=alice).json] == [0, 0, 3]
+    profile = client.get('/api/profile', headers=alice).json
+    assert (profile['post_count'], profile['comment_count']) == (3, 0)
+    assert client.get('/api/profile', headers=bob).json['comment_count'] == 3
+
+    client.delete(f'/api/comments/{post_id}/{comment_id}', headers=bob)
+    assert client.get(f'/api/posts/{post_id}', headers=alice).json['comment_count'] == 2
+    client.delete(f'/api/posts/{post_id}', headers=alice)
+    assert client.get('/api/profile', headers=alice).json['post_count'] == 2
+    assert client.get('/api/profile', headers=bob).json['comment_count'] == 0
+
+def test_reconcile_counts_repairs_drift(app):
+    user = User(username='u', email='u@example.com', password_hash='x')
+    post = Post(title='t', content='c', author=user)
+    db.session.add_all([Comment(content='c', author=user, post=post), Comment(content='d', author=user, post=post)])
+    db.session.commit()
+    assert (post.comment_count, user.post_count, user.comment_count) == (2, 1, 2)
+
+    db.session.execute(db.text('UPDATE post SET comment_count = 7'))
+    db.session.execute(db.text('UPDATE user SET post_count = 0'))
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['reconcile-counts'])
+    assert 'post.comment_count: 1 rows repaired' in result.output
+    assert 'user.post_count: 1 rows repaired' in result.output
+    db.session.expire_all()
+    assert (post.comment_count, user.post_count) == (2, 1)
+
+def test_feed_merges_every_author_newest_first(client):
+    alice = auth_headers(client, 'alice')
+    bob = auth_headers(client, 'bob')
+    for i in range(3):
+        client.post('/api/posts', json={'title': f'Alice {i}', 'content': 'Body'}, headers=alice)
+        client.post('/api/posts', json={'title': f'Bob {i}', 'content': 'Body'}, headers=bob)
+
+    first = client.get('/api/feed?limit=4', headers=alice)
+    assert first.status_code == 200
+    assert [p['title'] for p in first.json] == ['Bob 2', 'Alice 2', 'Bob 1', 'Alice 1']
+    assert first.json[0]['username'] == 'bob'
+
+    rest = client.get(f"/api/feed?limit=4&cursor={first.headers['X-Next-Cursor']}", headers=alice)
+    assert [p['title'] for p in rest.json] == ['Bob 0', 'Alice 0']
+    assert 'X-Next-Cursor' not in rest.headers
+
+def test_feed_head_is_cached_until_a_post_changes(client):
+    alice = auth_headers(client, 'alice')
+    bob = auth_headers(client, 'bob')
+    post_id = client.post('/api/posts', json={'title': 'First', 'content': 'Body'}, headers=alice).json['id']
+    assert [p['title'] for p in client.get('/api/feed', headers=bob).json] == ['First']
+    assert client.get('/api/_cache', headers=bob).json['hits'] == 0
+    client.get('/api/feed?limit=1', headers=bob)
+    assert client.get('/api/_cache', headers=bob).json['hits'] == 1
+
+    client.post('/api/posts', json={'title': 'Second', 'content': 'Body'}, headers=bob)
+    assert [p['title'] for p in client.get('/api/feed', headers=bob).json] == ['Second', 'First']
+    client.post(f'/api/comments/{post_id}', json={'content': 'Hi'}, headers=bob)
+    assert client.get('/api/feed', headers=bob).json[1]['comment_count'] == 1
+    client.delete('/api/posts/batch', json=[post_id], headers=alice)
+    assert [p['title'] for p in client.get('/api/feed', headers=bob).json] == ['Second']
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+import pytest
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('greenlet')
+
+from asgi import AsyncApp
+from blocklist import blocklist
+from cache import response_cache
+from app import create_app
+from config import Config
+from models import db
+
+class FileConfig(Config):
+    TESTING = True
+    RATELIMIT_ENABLED = False
+
+@pytest.fixture
+def apps(tmp_path):
+    config = type('Config', (FileConfig,), {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/blog.db'})
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+    return app, AsyncApp(app)
+
+def call(asgi_app, method, path, body=None, headers=None):
+    """Drive one request through the ASGI app; returns (status, headers, body)."""
+    path, _, query = path.partition('?')
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'http_version': '1.1', 'headers': [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]}
+    payload = json.dumps(body).encode() if body is not None else b''
+    if body is not None:
+        scope['headers'].append((b'content-type', b'application/json'))
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': payload}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi_app(scope, receive, send))
+    start = messages[0]
+    return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, \
+        b''.join(m.get('body', b'') for m in messages[1:])
+
+def test_async_reads_match_the_wsgi_contract(apps):
+    app, asgi_app = apps
+    status, _, body = call(asgi_app, 'POST', '/api/register',
+                           {'username': 'testuser', 'email': 'test@example.com', 'password': 'Test12345'})
+    assert status == 201
+    headers = {'Authorization': f"Bearer {json.loads(body)['token']['access']}"}
+    for i in range(3):
+        status, _, _ = call(asgi_app, 'POST', '/api/posts', {'title': f'Post {i}', 'content': 'Body'}, headers)
+        assert status == 201
+    call(asgi_app, 'POST', '/api/comments/1', {'content': 'First'}, headers)
+    for content in ('Reply', 'Another'):
+        call(asgi_app, 'POST', '/api/comments/1', {'content': content, 'parent_id': 1}, headers)
+
+    client = app.test_client()
+    for path in ('/api/posts?limit=2', '/api/comments/1', '/api/comments/1?depth=1', '/api/comments/1?parent=1&limit=1',
+                 '/api/comments/1?parent=9', '/api/profile', '/api/search?q=post'):
+        expected = client.get(path, headers=headers)
+        status, response_headers, body = call(asgi_app, 'GET', path, headers=headers)
+        assert (status, json.loads(body)) == (expected.status_code, expected.json), path
+        for name in ('X-Next-Cursor', 'ETag'):
+            assert response_headers.get(name.lower()) == expected.headers.get(name), (path, name)
+
+    _, response_headers, _ = call(asgi_app, 'GET', '/api/comments/1', headers=headers)
+    status, _, body = call(asgi_app, 'GET', '/api/comments/1',
+                           headers={**headers, 'If-None-Match': response_headers['etag']})
+    assert (status, body) == (304, b'')
+
+    status, _, body = call(asgi_app, 'GET', '/api/posts', headers={**headers, 'Accept': 'application/x-ndjson'})
+    assert [json.loads(line)['title'] for line in body.decode().splitlines()] == ['Post 2', 'Post 1', 'Post 0']
+
+def test_async_reads_reject_bad_requests_like_wsgi(apps):
+    _, asgi_app = apps
+    status, _, body = call(asgi_app, 'GET', '/api/posts')
+    assert (status, json.loads(body)) == (401, {'error': 'Missing token'})
+    status, _, body = call(asgi_app, 'GET', '/api/comments/99', headers={'Authorization': 'Bearer nope'})
+    assert (status, json.loads(body)) == (401, {'error': 'Invalid token'})
+
+def test_async_reads_keep_blocking_calls_off_the_event_loop(tmp_path, monkeypatch):
+    config = type('Config', (FileConfig,), {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/blog.db',
+                                            'RESPONSE_CACHE_URI': f'sqlite:///{tmp_path}/cache.db',
+                                            'JWT_BLOCKLIST_SYNC_SECONDS': 0})
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+    asgi_app = AsyncApp(app)
+    status, _, body = call(asgi_app, 'POST', '/api/register',
+                           {'username': 'testuser', 'email': 'test@example.com', 'password': 'Test12345'})
+    headers = {'Authorization': f"Bearer {json.loads(body)['token']['access']}"}
+    call(asgi_app, 'POST', '/api/posts', {'title': 'Post', 'content': 'Body'}, headers)
+
+    threads = []
+    record = lambda original: lambda *args: threads.append(threading.current_thread()) or original(*args)
+    monkeypatch.setattr(blocklist, 'sync', record(blocklist.sync))
+    backend = response_cache.backend
+    monkeypatch.setattr(backend, 'get', record(backend.get))
+    monkeypatch.setattr(backend, 'set', record(backend.set))
+    for _ in range(2):
+        status, _, _ = call(asgi_app, 'GET', '/api/comments/1', headers=headers)
+        assert status == 200
+    assert len(threads) == 5
+    assert threading.main_thread() not in threads
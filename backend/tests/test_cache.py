@@ -0,0 +1,79 @@
+import sqlite3
+import time
+from cache import MemoryCache, SQLiteCache, backend_from_uri
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(ttl=60, max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == (True, 1)
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.counters['evictions'] == 1
+    assert cache.counters['hits'] == 2 and cache.counters['misses'] == 1
+
+def test_memory_cache_expires_entries():
+    cache = MemoryCache(ttl=0, max_entries=10)
+    cache.set('a', 1)
+    assert cache.get('a') == (False, None)
+    assert cache.counters['expirations'] == 1
+
+def test_entries_can_expire_before_the_backend_ttl(tmp_path):
+    for cache in (MemoryCache(ttl=60, max_entries=10), SQLiteCache(f'{tmp_path}/cache.db', ttl=60, max_entries=10)):
+        cache.set('short', 1, ttl=0)
+        cache.set('long', 2)
+        assert cache.get('short') == (False, None)
+        assert cache.get('long') == (True, 2)
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    uri = f'sqlite:///{tmp_path}/cache.db'
+    worker_a = backend_from_uri(uri, 60, 100)
+    worker_b = backend_from_uri(uri, 60, 100)
+    assert isinstance(worker_a, SQLiteCache)
+
+    worker_a.set('thread:1', [{'id': 1, 'content': 'hi'}])
+    assert worker_b.get('thread:1') == (True, [{'id': 1, 'content': 'hi'}])
+    worker_b.delete(['thread:1'])
+    assert worker_a.get('thread:1') == (False, None)
+
+def test_sqlite_cache_trims_to_max_entries(tmp_path):
+    cache = SQLiteCache(f'{tmp_path}/cache.db', ttl=60, max_entries=3, touch_after=0)
+    for i in range(5):
+        cache.set(f'k{i}', i)
+        time.sleep(0.001)
+    cache.get('k0')
+    cache.trim()
+    assert len(cache) == 3
+    assert cache.get('k0') == (True, 0)
+    assert cache.get('k1') == (False, None)
+    assert cache.counters['evictions'] == 2
+
+def test_sqlite_cache_reads_do_not_write(tmp_path):
+    cache = SQLiteCache(f'{tmp_path}/cache.db', ttl=60, max_entries=10, busy_timeout=10)
+    cache.set('fresh', 1)
+    cache.set('stale', 2)
+    cache._connection().execute('UPDATE response_cache SET used_at = 0 WHERE key = ?', ('stale',))
+    used_at = lambda key: cache._connection().execute(
+        'SELECT used_at FROM response_cache WHERE key = ?', (key,)).fetchone()[0]
+    set_at = used_at('fresh')
+
+    # A writer holding the lock neither blocks nor fails reads
+    writer = sqlite3.connect(f'{tmp_path}/cache.db', isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    assert cache.get('fresh') == (True, 1)
+    assert cache.get('stale') == (True, 2)
+    writer.execute('ROLLBACK')
+
+    assert used_at('fresh') == set_at
+    assert cache.get('stale') == (True, 2)
+    assert used_at('stale') > 0
+
+def test_sqlite_cache_expired_reads_leave_the_row_to_trim(tmp_path):
+    cache = SQLiteCache(f'{tmp_path}/cache.db', ttl=0, max_entries=10)
+    cache.set('a', 1)
+    assert cache.get('a') == (False, None)
+    assert cache.counters['expirations'] == 1
+    assert len(cache) == 1
+    cache.trim()
+    assert len(cache) == 0
@@ -0,0 +1,116 @@
+import threading
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from app import create_app
+from config import Config
+from database import REPLICA_BIND, configure_engines
+from models import db, User
+
+class FileConfig(Config):
+    TESTING = True
+
+def make_app(tmp_path, **overrides):
+    config = type('Config', (FileConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/primary.db', **overrides
+    })
+    return create_app(config)
+
+def test_sqlite_connections_use_the_pragma_profile(tmp_path):
+    app = make_app(tmp_path)
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+
+def test_server_databases_get_pool_options():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(SQLALCHEMY_DATABASE_URI='postgresql://localhost/blog', DB_POOL_SIZE=7,
+                      SQLALCHEMY_ENGINE_OPTIONS={'pool_recycle': 60})
+    configure_engines(app)
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    assert options['pool_size'] == 7 and options['pool_pre_ping']
+    assert options['pool_recycle'] == 60
+
+@pytest.fixture
+def replica_app(tmp_path):
+    yield make_app(tmp_path, DATABASE_REPLICA_URL=f'sqlite:///{tmp_path}/replica.db')
+    # init_app registered an empty metadata for the bind on the shared db;
+    # later apps without the bind would fail in create_all()
+    db.metadatas.pop(REPLICA_BIND, None)
+
+def test_get_requests_read_from_the_replica(replica_app):
+    app = replica_app
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines['replica'])
+    client = app.test_client()
+    token = client.post('/api/register', json={
+        'username': 'reader', 'email': 'reader@example.com', 'password': 'Password123'
+    }).json['token']['access']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    # The write went to the primary only, so the replica does not know the user yet
+    assert client.get('/api/profile', headers=headers).status_code == 404
+    with app.app_context():
+        user = db.session.execute(db.select(User.__table__)).one()
+        with db.engines['replica'].begin() as conn:
+            conn.execute(User.__table__.insert().values(**user._mapping))
+    assert client.get('/api/profile', headers=headers).json['username'] == 'reader'
+
+def test_concurrent_registrations_of_one_name_make_one_account(tmp_path):
+    app = make_app(tmp_path, RATELIMIT_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+    barrier = threading.Barrier(8)
+    results = []
+
+    def register(i):
+        client = app.test_client()
+        barrier.wait()
+        response = client.post('/api/register', json={
+            'username': 'racer' if i % 2 else 'RACER', 'email': f'racer{i}@example.com', 'password': 'Password123'})
+        results.append((response.status_code, response.json.get('error')))
+
+    threads = [threading.Thread(target=register, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results, key=str) == [(201, None)] + [(400, 'Username already in use')] * 7
+    with app.app_context():
+        assert db.session.query(User).count() == 1
+
+@pytest.mark.parametrize('message, diag_name, field', [
+    ("UNIQUE constraint failed: index 'ix_user_username_lower'", None, 'username'),
+    ("UNIQUE constraint failed: index 'ix_user_email_lower'", None, 'email'),
+    ('UNIQUE constraint failed: user.username', None, 'username'),
+    ('UNIQUE constraint failed: user.email', None, 'email'),
+    # The duplicate value in a PostgreSQL message may name the other field
+    ('Key (lower(username))=(email) already exists.', 'ix_user_username_lower', 'username'),
+    ('Key (lower(email))=(username@example.com) already exists.', 'ix_user_email_lower', 'email'),
+    ('Key (username)=(email) already exists.', 'user_username_key', 'username'),
+    ('Key (email)=(username@example.com) already exists.', 'user_email_key', 'email'),
+    ('NOT NULL constraint failed: user.email', None, None),
+    ('Key (post_id)=(1) is not present in table "post".', 'comment_post_id_fkey', None),
+])
+def test_duplicate_field_is_read_from_the_constraint_name(message, diag_name, field):
+    orig = Exception(message)
+    if diag_name is not None:
+        orig.diag = type('Diag', (), {'constraint_name': diag_name})()
+    assert User.duplicate_field(IntegrityError('INSERT', {}, orig)) == field
+
+def test_duplicates_of_each_user_field_are_reported(tmp_path):
+    config = type('Config', (Config,), {'TESTING': True, 'RATELIMIT_ENABLED': False,
+                                        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/blog.db'})
+    client = create_app(config).test_client()
+    with client.application.app_context():
+        db.create_all()
+    register = lambda username, email: client.post('/api/register', json={
+        'username': username, 'email': email, 'password': 'Test12345'})
+    assert register('email', 'username@example.com').status_code == 201
+    assert register('Email', 'other@example.com').json == {'error': 'Username already in use'}
+    assert register('other', 'USERNAME@example.com').json == {'error': 'Email already in use'}
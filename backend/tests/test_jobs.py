@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import update
+from app import create_app
+from config import Config
+from jobs import FAILED, DONE, QUEUED, RUNNING, Worker, enqueue, job, jobs_cli
+from models import db, Job
+
+calls = []
+
+@job('test_record')
+def record(value, fail_times=0):
+    calls.append(value)
+    if calls.count(value) <= fail_times:
+        raise RuntimeError(f'failing {value}')
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    JOBS_RETRY_BASE_SECONDS = 0
+
+@pytest.fixture
+def app():
+    calls.clear()
+    flask_app = create_app(TestConfig)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.drop_all()
+
+def test_jobs_are_spooled_with_the_transaction(app):
+    enqueue('test_record', {'value': 'kept'})
+    db.session.commit()
+    enqueue('test_record', {'value': 'dropped'})
+    db.session.rollback()
+
+    assert Worker(app).drain() == 1
+    assert calls == ['kept']
+    assert Job.query.one().status == DONE
+
+def test_idempotency_key_spools_a_job_once(app):
+    assert enqueue('test_record', {'value': 'a'}, key='once')
+    assert not enqueue('test_record', {'value': 'b'}, key='once')
+    db.session.commit()
+    Worker(app).drain()
+    assert not enqueue('test_record', {'value': 'c'}, key='once')
+    assert calls == ['a']
+
+def test_failed_jobs_retry_until_max_attempts(app):
+    enqueue('test_record', {'value': 'flaky', 'fail_times': 1})
+    enqueue('test_record', {'value': 'broken', 'fail_times': 9}, max_attempts=2)
+    db.session.commit()
+
+    Worker(app).drain()
+    flaky, broken = Job.query.order_by(Job.id).all()
+    assert (flaky.status, flaky.attempts) == (DONE, 2)
+    assert (broken.status, broken.attempts) == (FAILED, 2)
+    assert 'failing broken' in broken.last_error
+
+    result = app.test_cli_runner().invoke(jobs_cli, ['retry', '--failed'])
+    assert '1 jobs queued' in result.output
+    db.session.expire_all()
+    assert (broken.status, broken.attempts) == (QUEUED, 0)
+
+def test_jobs_lost_on_their_final_attempt_fail(app):
+    enqueue('test_record', {'value': 'lost'}, max_attempts=2)
+    enqueue('test_record', {'value': 'retried'}, max_attempts=2)
+    db.session.commit()
+    # Both claimed by a worker that died; one was on its last attempt
+    expired = datetime.utcnow() - timedelta(seconds=app.config['JOBS_LEASE_SECONDS'] + 1)
+    db.session.execute(update(Job).values(status=RUNNING, locked_by='gone:1', locked_at=expired))
+    db.session.execute(update(Job).where(Job.payload['value'].as_string() == 'lost').values(attempts=2))
+    db.session.execute(update(Job).where(Job.payload['value'].as_string() == 'retried').values(attempts=1))
+    db.session.commit()
+
+    assert Worker(app).drain() == 1
+    assert calls == ['retried']
+    lost, retried = Job.query.order_by(Job.id).all()
+    assert (lost.status, lost.locked_by) == (FAILED, None)
+    assert 'gone:1' in lost.last_error and lost.finished_at is not None
+    assert (retried.status, retried.attempts) == (DONE, 2)
+
+    result = app.test_cli_runner().invoke(jobs_cli, ['retry', '--failed'])
+    assert '1 jobs queued' in result.output
+
+def test_batch_created_posts_are_indexed_by_a_job(app):
+    client = app.test_client()
+    token = client.post('/api/register', json={
+        'username': 'testuser', 'email': 'test@example.com', 'password': 'Test12345'
+    }).json['token']['access']
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/posts/batch', json=[{'title': 'Deferred', 'content': 'Indexed later'}], headers=headers)
+    assert client.get('/api/search?q=deferred', headers=headers).json == []
+
+    assert Worker(app).drain() == 1
+    assert [p['title'] for p in client.get('/api/search?q=deferred', headers=headers).json] == ['Deferred']
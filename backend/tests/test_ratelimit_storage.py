@@ -0,0 +1,26 @@
+import time
+from limits.storage import storage_from_string
+from ratelimit_storage import SQLiteStorage
+
+def test_counters_are_shared_between_instances(tmp_path):
+    uri = f'sqlite:///{tmp_path}/ratelimit.db'
+    worker_a = storage_from_string(uri)
+    worker_b = storage_from_string(uri)
+    assert isinstance(worker_a, SQLiteStorage)
+
+    assert worker_a.incr('login', 60) == 1
+    assert worker_b.incr('login', 60) == 2
+    assert worker_a.get('login') == 2
+    assert worker_b.get_expiry('login') > time.time()
+
+    worker_b.clear('login')
+    assert worker_a.get('login') == 0
+
+def test_window_restarts_after_expiry(tmp_path):
+    storage = SQLiteStorage(f'sqlite:///{tmp_path}/ratelimit.db')
+    storage.incr('key', 1, amount=3)
+    assert storage.get('key') == 3
+    time.sleep(1.1)
+    assert storage.get('key') == 0
+    assert storage.incr('key', 1) == 1
+    assert storage.reset() == 1
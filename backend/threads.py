@@ -0,0 +1,107 @@
+"""Materialized paths for comment threads.
+
+Every comment stores ``path``: its ancestors' ids and its own, each
+zero-padded to PATH_DIGITS. Sorting a post's comments by path lists the
+thread depth first (replies right after what they answer, siblings oldest
+first), and one comment's replies are the paths that extend its own, so
+with ``ix_comment_post_id_path`` a whole thread or a subtree is a single
+ordered index range scan. ``depth`` (0 for top-level comments) bounds how
+far down a read goes.
+
+The id is only known after the INSERT, so a new comment is written with its
+parent's path and completed by an UPDATE in the same flush (one executemany
+for bulk inserts).
+"""
+import re
+from collections import Counter
+
+from sqlalchemy import and_, bindparam, event, func, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import Comment
+
+PATH_DIGITS = 10
+# Sorts after every digit, so a subtree is [path, path + SUBTREE_END)
+SUBTREE_END = ':'
+PATH_PATTERN = re.compile(f'(?:[0-9]{{{PATH_DIGITS}}})+')
+
+
+def segment(id):
+    return f'{id:0{PATH_DIGITS}d}'
+
+
+def valid_path(path):
+    return bool(PATH_PATTERN.fullmatch(path))
+
+
+def in_subtree(path, column=Comment.path):
+    """Comments below the one at ``path``, not including it."""
+    return and_(column > path, column < path + SUBTREE_END)
+
+
+def parent_query(post_id, parent_id):
+    return select(Comment.path, Comment.depth).where(Comment.id == parent_id, Comment.post_id == post_id)
+
+
+def place_comments(connection, rows):
+    """``rows`` with ``parent_id``, ``depth`` and their parent's ``path``, ready for insert_rows.
+
+    Every parent must exist; callers validate ``parent_id`` first.
+    """
+    parent_ids = {row['parent_id'] for row in rows if row.get('parent_id')}
+    parents = {}
+    if parent_ids:
+        parents = {row.id: row for row in connection.execute(
+            select(Comment.id, Comment.path, Comment.depth).where(Comment.id.in_(parent_ids)))}
+    placed = []
+    for row in rows:
+        parent = parents[row['parent_id']] if row.get('parent_id') else None
+        placed.append({**row, 'parent_id': parent and parent.id,
+                       'path': parent.path if parent else '', 'depth': parent.depth + 1 if parent else 0})
+    return placed
+
+
+def complete_paths(connection, ids, rows):
+    """Append each new comment's own id to the parent path it was inserted with."""
+    if not ids:
+        return
+    table = Comment.__table__
+    connection.execute(
+        update(table).where(table.c.id == bindparam('row_id'))
+        # Not an edit: keep onupdate away from updated_at
+        .values(path=bindparam('full_path'), updated_at=table.c.updated_at),
+        [{'row_id': id, 'full_path': row['path'] + segment(id)} for id, row in zip(ids, rows)]
+    )
+
+
+def reply_counts_query(ids):
+    return select(Comment.parent_id, func.count()).where(Comment.parent_id.in_(ids)).group_by(Comment.parent_id)
+
+
+def count_replies(rows):
+    """Reply counts taken from the rows themselves, for reads that returned every descendant."""
+    return Counter(row['parent_id'] for row in rows)
+
+
+def with_reply_counts(rows, counts):
+    for row in rows:
+        row['reply_count'] = counts.get(row['id'], 0)
+    return rows
+
+
+@event.listens_for(Comment, 'before_insert')
+def _place_comment(mapper, connection, target):
+    # CommentEndpoint has the parent loaded and sets path and depth itself
+    if target.path is not None:
+        return
+    parent = None
+    if target.parent_id is not None:
+        parent = connection.execute(select(Comment.path, Comment.depth).where(Comment.id == target.parent_id)).first()
+    target.path = parent.path if parent else ''
+    target.depth = parent.depth + 1 if parent else 0
+
+
+@event.listens_for(Comment, 'after_insert')
+def _complete_path(mapper, connection, target):
+    complete_paths(connection, [target.id], [{'path': target.path}])
+    set_committed_value(target, 'path', target.path + segment(target.id))
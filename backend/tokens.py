@@ -0,0 +1,55 @@
+"""Issuing JWTs, and the stateless mode (``JWT_STATELESS_TOKENS``).
+
+In that mode access tokens are short-lived and carry the user's
+``username``, ``email`` and token generation (``gen``). Validation is a
+signature check plus two dict lookups in the blocklist cache, and the
+profile is answered from the claims and the version query without loading
+the user. Logging out, or changing the username or email, bumps
+``User.token_generation``; every access token stamped with an older
+generation is then rejected (by other workers after their next blocklist
+sync) and the client refreshes it. Refresh tokens stay revocable by ``jti``.
+"""
+from datetime import datetime
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token
+from sqlalchemy import update
+
+from models import db, TokenGeneration, User
+
+
+def stateless():
+    return current_app.config['JWT_STATELESS_TOKENS']
+
+
+def claims_for(user):
+    return {'username': user.username, 'email': user.email, 'gen': user.token_generation or 0}
+
+
+def access_token_for(user):
+    if not stateless():
+        return create_access_token(identity=user.id)
+    return create_access_token(identity=user.id, additional_claims=claims_for(user),
+                               expires_delta=current_app.config['JWT_STATELESS_ACCESS_EXPIRES'])
+
+
+def tokens_for(user):
+    """``{'access', 'refresh'}`` for a login or registration."""
+    return {'access': access_token_for(user), 'refresh': create_refresh_token(identity=user.id)}
+
+
+def revoke_user_tokens(user_id):
+    """Bump ``user_id``'s token generation, revoking the stateless access tokens issued so far.
+
+    Runs in the caller's transaction; call ``blocklist.add_generation`` with
+    the result after committing, as for ``TokenBlocklist`` rows.
+    """
+    generation = db.session.execute(
+        update(User).where(User.id == user_id).values(token_generation=User.token_generation + 1)
+        .returning(User.token_generation),
+        execution_options={'synchronize_session': 'fetch'}).scalar()
+    if generation is None:
+        return None
+    row = TokenGeneration(user_id=user_id, generation=generation, created_at=datetime.utcnow())
+    db.session.add(row)
+    return row
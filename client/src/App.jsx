@@ -14,6 +14,8 @@ const App = () => {
   const [loading, setLoading] = useState(false);
   const [isAuthenticated, setIsAuthenticated] = useState(!!localStorage.getItem('access_token'));
   const [searchQuery, setSearchQuery] = useState('');
+  // Query string for the next page (X-Next-Cursor / X-Next-Page), null on the last one
+  const [nextPage, setNextPage] = useState(null);
 
   useEffect(() => {
     if (isAuthenticated) {
@@ -54,10 +56,11 @@ const App = () => {
     return response;
   };
 
-  const fetchPosts = async (query = '') => {
+  const fetchPosts = async (query = '', page = null) => {
     setLoading(true);
     try {
-      const url = query ? `http://localhost:5000/api/search?q=${encodeURIComponent(query)}` : 'http://localhost:5000/api/posts';
+      let url = query ? `http://localhost:5000/api/search?q=${encodeURIComponent(query)}` : 'http://localhost:5000/api/posts';
+      if (page) url += `${query ? '&' : '?'}${page}`;
       const response = await apiRequest(url, {
         headers: {
           'Authorization': `Bearer ${localStorage.getItem('access_token')}`,
@@ -65,7 +68,10 @@ const App = () => {
       });
       if (!response.ok) throw new Error('Failed to fetch posts');
       const data = await response.json();
-      setPosts(data);
+      setPosts(posts => (page ? [...posts, ...data] : data));
+      const cursor = response.headers.get('X-Next-Cursor');
+      const nextNumber = response.headers.get('X-Next-Page');
+      setNextPage(cursor ? `cursor=${encodeURIComponent(cursor)}` : nextNumber ? `page=${nextNumber}` : null);
       setError(null);
     } catch (error) {
       setError('Failed to fetch posts. Please try again.');
@@ -121,6 +127,26 @@ const App = () => {
     }
   };
 
+  // Lists carry an excerpt; the full body comes from the single-post endpoint
+  const fetchPost = async (id) => {
+    try {
+      const response = await apiRequest(`http://localhost:5000/api/posts/${id}`, {
+        headers: {
+          'Authorization': `Bearer ${localStorage.getItem('access_token')}`,
+        },
+      });
+      if (!response.ok) throw new Error('Failed to fetch post');
+      const post = await response.json();
+      setPosts(posts => posts.map(p => (p.id === id ? { ...p, ...post } : p)));
+      setError(null);
+      return post;
+    } catch (error) {
+      setError('Failed to load the post. Please try again.');
+      console.error('Error fetching post:', error);
+      return null;
+    }
+  };
+
   const deletePost = async (id) => {
     setLoading(true);
     try {
@@ -187,7 +213,17 @@ const App = () => {
               isAuthenticated ? (
                 <>
                   <BlogForm onSubmit={createPost} loading={loading} />
-                  <BlogList posts={posts} onUpdate={updatePost} onDelete={deletePost} />
+                  <BlogList posts={posts} onUpdate={updatePost} onDelete={deletePost} onExpand={fetchPost} />
+                  {nextPage && (
+                    <button
+                      onClick={() => fetchPosts(searchQuery, nextPage)}
+                      disabled={loading}
+                      className="blog-form-button"
+                      aria-label="Load more posts"
+                    >
+                      Load more
+                    </button>
+                  )}
                 </>
               ) : (
                 <Navigate to="/login" />
@@ -2,11 +2,20 @@
 import { useState } from 'react';
 import CommentSection from './CommentSection';
 
-const BlogPost = ({ post, onUpdate, onDelete }) => {
+const BlogPost = ({ post, onUpdate, onDelete, onExpand }) => {
   const [isEditing, setIsEditing] = useState(false);
   const [title, setTitle] = useState(post.title);
-  const [content, setContent] = useState(post.content);
+  const [content, setContent] = useState(post.content ?? '');
   const [error, setError] = useState('');
+  // Posts from the list only have an excerpt until expanded
+  const isFull = post.content !== undefined;
+
+  const startEditing = async () => {
+    const full = isFull ? post : await onExpand(post.id);
+    if (!full) return;
+    setContent(full.content);
+    setIsEditing(true);
+  };
 
   const handleUpdate = () => {
     if (!title.trim() || !content.trim()) {
@@ -53,7 +62,7 @@ const BlogPost = ({ post, onUpdate, onDelete }) => {
               onClick={() => {
                 setIsEditing(false);
                 setTitle(post.title);
-                setContent(post.content);
+                setContent(post.content ?? '');
                 setError('');
               }}
               className="blog-post-cancel"
@@ -66,10 +75,19 @@ const BlogPost = ({ post, onUpdate, onDelete }) => {
       ) : (
         <div>
           <h3 className="blog-post-title">{post.title}</h3>
-          <p className="blog-post-content">{post.content}</p>
+          <p className="blog-post-content">{isFull ? post.content : post.excerpt}</p>
           <div className="blog-post-buttons">
+            {!isFull && post.content_length > post.excerpt.length && (
+              <button
+                onClick={() => onExpand(post.id)}
+                className="blog-post-edit-btn"
+                aria-label={`Read all of ${post.title}`}
+              >
+                Read more
+              </button>
+            )}
             <button
-              onClick={() => setIsEditing(true)}
+              onClick={startEditing}
               className="blog-post-edit-btn"
               aria-label={`Edit post ${post.title}`}
             >